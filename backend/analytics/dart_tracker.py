@@ -0,0 +1,172 @@
+import numpy as np
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import List, Optional, Sequence
+import time
+
+from src.scoring.regions import MISS, region_name
+
+class ThrowEventType(Enum):
+    DART_LANDED = "dart_landed"
+    TURN_COMPLETE = "turn_complete"
+    DARTS_REMOVED = "darts_removed"
+
+@dataclass
+class ThrowEvent:
+    type: ThrowEventType
+    timestamp: float
+    dart_number: int = 0
+    points: int = 0
+    region: int = MISS  # region code, see src.scoring.regions
+    confidence: float = 0.0
+    position: tuple = (0.0, 0.0)
+    turn_total: int = 0
+    darts: List[dict] = field(default_factory=list)
+
+    def to_dict(self) -> dict:
+        return {
+            'type': self.type.value,
+            'timestamp': self.timestamp,
+            'dart_number': self.dart_number,
+            'points': self.points,
+            'region': region_name(self.region),
+            'region_code': self.region,
+            'confidence': self.confidence,
+            'position': list(self.position),
+            'turn_total': self.turn_total,
+            'darts': self.darts
+        }
+
+@dataclass
+class _Track:
+    track_id: int
+    position: np.ndarray
+    points: int
+    region: int
+    confidence: float
+    last_seen: float
+    hits: int = 1
+    missed: int = 0
+    landed: bool = False
+
+class DartTracker:
+    """Links per-frame dart detections over time and turns them into throw events.
+
+    A detection has to persist for `confirm_frames` updates before it counts
+    as a landed dart, so one dart sitting in the board is reported once
+    rather than on every frame. Three landed darts complete a turn; the board
+    emptying out afterwards reports the darts as removed. Landed darts are
+    dropped after `lost_frames` missed updates, or after `lost_after` seconds
+    of misses, since gated cameras may only update every few seconds.
+    """
+
+    def __init__(self, match_radius: float = 1.0, confirm_frames: int = 3, lost_frames: int = 10,
+                 lost_after: float = 1.0, darts_per_turn: int = 3, smoothing: float = 0.5):
+        self.match_radius = match_radius
+        self.confirm_frames = confirm_frames
+        self.lost_frames = lost_frames
+        self.lost_after = lost_after
+        self.darts_per_turn = darts_per_turn
+        self.smoothing = smoothing
+
+        self.tracks: List[_Track] = []
+        self.turn_darts: List[ThrowEvent] = []
+        self.turn_complete = False
+        self._next_id = 1
+
+    def update(self, positions: np.ndarray, points: Sequence[int], regions: Sequence[int],
+               confidence: Sequence[float], timestamp: Optional[float] = None) -> List[ThrowEvent]:
+        """Feed one frame's darts; returns any events this frame triggered"""
+        timestamp = time.monotonic() if timestamp is None else timestamp
+        positions = np.asarray(positions, dtype=np.float64).reshape(-1, 2)
+        events: List[ThrowEvent] = []
+
+        # Greedy nearest-neighbour association, closest pairs first
+        matched_tracks, matched_darts = set(), set()
+        if self.tracks and len(positions):
+            track_xy = np.array([track.position for track in self.tracks])
+            dist = np.linalg.norm(track_xy[:, None, :] - positions[None, :, :], axis=2)
+            for flat in np.argsort(dist, axis=None):
+                t, d = np.unravel_index(flat, dist.shape)
+                if dist[t, d] > self.match_radius:
+                    break
+                if t in matched_tracks or d in matched_darts:
+                    continue
+                matched_tracks.add(t)
+                matched_darts.add(d)
+                track = self.tracks[t]
+                track.position = self.smoothing * track.position + (1 - self.smoothing) * positions[d]
+                track.hits += 1
+                track.missed = 0
+                track.last_seen = timestamp
+                if not track.landed:
+                    # Keep refining the reading until the dart is confirmed
+                    track.points, track.region, track.confidence = int(points[d]), int(regions[d]), float(confidence[d])
+
+        for t, track in enumerate(self.tracks):
+            if t not in matched_tracks:
+                track.missed += 1
+
+        for d in range(len(positions)):
+            if d not in matched_darts:
+                self.tracks.append(_Track(self._next_id, positions[d].copy(), int(points[d]),
+                                          int(regions[d]), float(confidence[d]), timestamp))
+                self._next_id += 1
+
+        self.tracks = [track for track in self.tracks if not self._is_lost(track, timestamp)]
+
+        for track in self.tracks:
+            if (not track.landed and track.hits >= self.confirm_frames
+                    and len(self.turn_darts) < self.darts_per_turn):
+                track.landed = True
+                event = ThrowEvent(
+                    type=ThrowEventType.DART_LANDED,
+                    timestamp=timestamp,
+                    dart_number=len(self.turn_darts) + 1,
+                    points=track.points,
+                    region=track.region,
+                    confidence=track.confidence,
+                    position=tuple(float(v) for v in track.position)
+                )
+                self.turn_darts.append(event)
+                event.turn_total = self.turn_total
+                events.append(event)
+
+        if len(self.turn_darts) >= self.darts_per_turn and not self.turn_complete:
+            events.append(self._complete_turn(timestamp))
+
+        if self.turn_darts and not any(track.landed for track in self.tracks):
+            if not self.turn_complete:
+                events.append(self._complete_turn(timestamp))
+            events.append(ThrowEvent(type=ThrowEventType.DARTS_REMOVED, timestamp=timestamp,
+                                     turn_total=self.turn_total, darts=self._turn_summary()))
+            self.turn_darts = []
+            self.turn_complete = False
+
+        return events
+
+    def _is_lost(self, track: _Track, timestamp: float) -> bool:
+        if not track.landed:
+            # Unconfirmed detections tolerate a single dropout
+            return track.missed >= 2
+        return (track.missed >= self.lost_frames
+                or (track.missed >= 2 and timestamp - track.last_seen >= self.lost_after))
+
+    @property
+    def turn_total(self) -> int:
+        return sum(event.points for event in self.turn_darts)
+
+    def _turn_summary(self) -> List[dict]:
+        return [{'points': event.points, 'region': region_name(event.region), 'region_code': event.region}
+                for event in self.turn_darts]
+
+    def _complete_turn(self, timestamp: float) -> ThrowEvent:
+        self.turn_complete = True
+        return ThrowEvent(type=ThrowEventType.TURN_COMPLETE, timestamp=timestamp,
+                          dart_number=len(self.turn_darts), turn_total=self.turn_total,
+                          darts=self._turn_summary())
+
+    def reset(self):
+        self.tracks = []
+        self.turn_darts = []
+        self.turn_complete = False
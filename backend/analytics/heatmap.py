@@ -0,0 +1,113 @@
+import numpy as np
+from typing import Dict, Optional, Sequence, Tuple
+
+from src.scoring.board_geometry import DOUBLE_OUTER_RADIUS, BoardGeometry
+
+# Polar sectors start at a segment edge (20 is centered straight up, at 90
+# degrees), so any multiple of 20 angular bins splits segments evenly
+SECTOR_OFFSET_DEG = 9.0
+
+
+def _check_levels(levels: Sequence, name: str) -> int:
+    finest = max(levels)
+    if any(finest % level for level in levels):
+        raise ValueError(f"{name} resolutions {tuple(levels)} must all divide the finest one")
+    return finest
+
+
+class ThrowHeatmap:
+    """Throw counts on the calibrated board, kept at several resolutions at once.
+
+    Cartesian grids cover a square of `extent_mm` around the board center
+    (rows follow board y, which points down); polar grids bin the distance
+    from the bull in mm and the angle. Each add() bins the new positions once
+    at the finest resolution of each kind and folds them into every coarser
+    level, so any level can be read at any time without going back over the
+    throw history.
+    """
+
+    def __init__(self,
+                 geometry: Optional[BoardGeometry] = None,
+                 cartesian_bins: Sequence[int] = (20, 40, 80, 160),
+                 polar_bins: Sequence[Tuple[int, int]] = ((17, 20), (34, 40), (68, 80), (136, 160)),
+                 extent_mm: float = DOUBLE_OUTER_RADIUS * 1.25):
+        self.geometry = geometry or BoardGeometry()
+        self.cartesian_bins = tuple(sorted(cartesian_bins))
+        self.polar_bins = tuple(sorted(polar_bins))
+        self._fine = _check_levels(self.cartesian_bins, 'cartesian')
+        self._fine_radial = _check_levels([r for r, _ in self.polar_bins], 'radial')
+        self._fine_angular = _check_levels([a for _, a in self.polar_bins], 'angular')
+
+        half_width = extent_mm * self.geometry.units_per_mm
+        self._origin = self.geometry.center - half_width
+        self._width = 2 * half_width
+        self._cartesian: Dict[int, np.ndarray] = {n: np.zeros((n, n), dtype=np.int64) for n in self.cartesian_bins}
+        self._polar: Dict[Tuple[int, int], np.ndarray] = {bins: np.zeros(bins, dtype=np.int64)
+                                                         for bins in self.polar_bins}
+        self.count = 0
+        # Throws outside the cartesian extent / beyond the double ring
+        self.outside = 0
+        self.off_board = 0
+
+    def add(self, board_xy: np.ndarray):
+        """Count one (x, y) or an (N, 2) array of positions in board coordinates"""
+        board_xy = np.asarray(board_xy, dtype=np.float64).reshape(-1, 2)
+        if not len(board_xy):
+            return
+        self.count += len(board_xy)
+
+        cell = np.floor((board_xy - self._origin) / self._width * self._fine).astype(np.intp)
+        inside = np.all((cell >= 0) & (cell < self._fine), axis=1)
+        self.outside += int(np.count_nonzero(~inside))
+        col, row = cell[inside, 0], cell[inside, 1]
+        for n, grid in self._cartesian.items():
+            step = self._fine // n
+            np.add.at(grid, (row // step, col // step), 1)
+
+        radius, angle = self.geometry.to_polar(board_xy)
+        on_board = radius < DOUBLE_OUTER_RADIUS
+        self.off_board += int(np.count_nonzero(~on_board))
+        ring = (radius[on_board] * (self._fine_radial / DOUBLE_OUTER_RADIUS)).astype(np.intp)
+        sector = (((angle[on_board] - SECTOR_OFFSET_DEG) % 360.0) * (self._fine_angular / 360.0)).astype(np.intp)
+        sector = np.minimum(sector, self._fine_angular - 1)
+        for (radial, angular), grid in self._polar.items():
+            np.add.at(grid, (ring // (self._fine_radial // radial), sector // (self._fine_angular // angular)), 1)
+
+    def cartesian(self, bins: Optional[int] = None) -> np.ndarray:
+        """Counts on a bins x bins grid, indexed [row (y), column (x)]; the coarsest by default"""
+        bins = self.cartesian_bins[0] if bins is None else bins
+        if bins not in self._cartesian:
+            raise ValueError(f"No {bins}x{bins} heatmap; kept resolutions are {self.cartesian_bins}")
+        return self._cartesian[bins].copy()
+
+    def polar(self, bins: Optional[Tuple[int, int]] = None) -> np.ndarray:
+        """Counts indexed [ring, sector] for (radial, angular) bins; the coarsest by default"""
+        bins = self.polar_bins[0] if bins is None else tuple(bins)
+        if bins not in self._polar:
+            raise ValueError(f"No {bins} polar heatmap; kept resolutions are {self.polar_bins}")
+        return self._polar[bins].copy()
+
+    def cartesian_extent(self) -> Tuple[float, float, float, float]:
+        """(left, right, top, bottom) of the cartesian grids in board coordinates"""
+        (left, top), (right, bottom) = self._origin, self._origin + self._width
+        return float(left), float(right), float(top), float(bottom)
+
+    def polar_edges(self, bins: Tuple[int, int]) -> Tuple[np.ndarray, np.ndarray]:
+        """Ring edges in mm from the bull and sector edges in degrees (counter-clockwise from 3 o'clock)"""
+        radial, angular = bins
+        return (np.linspace(0.0, DOUBLE_OUTER_RADIUS, radial + 1),
+                SECTOR_OFFSET_DEG + np.linspace(0.0, 360.0, angular + 1))
+
+    def clear(self):
+        for grid in list(self._cartesian.values()) + list(self._polar.values()):
+            grid.fill(0)
+        self.count = self.outside = self.off_board = 0
+
+    def stats(self) -> dict:
+        return {
+            'throws': self.count,
+            'outside': self.outside,
+            'off_board': self.off_board,
+            'cartesian_bins': list(self.cartesian_bins),
+            'polar_bins': [list(bins) for bins in self.polar_bins],
+        }
@@ -1,10 +1,16 @@
+import time
 import numpy as np
 from dataclasses import dataclass
 from datetime import datetime
-import pandas as pd
-from typing import List, Dict
+from typing import List, Dict, Optional
 import json
 
+from analytics.heatmap import ThrowHeatmap
+from analytics.throw_history import ThrowHistory, throw_records
+from src.scoring.board_geometry import BoardGeometry
+from src.scoring.regions import (N_REGIONS, REGION_NAMES, REGION_RING, RING_DOUBLE, RING_INNER_BULL, RING_TRIPLE,
+                                 as_region_code)
+
 @dataclass
 class ThrowMetrics:
     accuracy: float
@@ -14,32 +20,114 @@ class ThrowMetrics:
     triple_hit_rate: float
     bullseye_rate: float
 
-class ThrowAnalyzer:
+def _consistency(std: float, max_score: float) -> float:
+    """1 for identical scores, falling as the spread grows relative to the best score"""
+    return 1 - (std / max_score if max_score > 0 else 0)
+
+class RunningThrowStats:
+    """Sufficient statistics for ThrowMetrics, updated in O(1) per throw.
+
+    Score mean and variance use Welford's algorithm, so they stay exact
+    without keeping the scores around; hits, regions and rings are counters.
+    """
+
     def __init__(self):
-        self.throws_history: List[Dict] = []
+        self.count = 0
+        self.hits = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.max_score = 0.0
+        self.region_counts = np.zeros(N_REGIONS, dtype=np.int64)
+        self.ring_counts = np.zeros(int(REGION_RING.max()) + 1, dtype=np.int64)
+
+    def add(self, score: float, hit: bool, region: int):
+        self.count += 1
+        self.hits += bool(hit)
+        delta = score - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (score - self.mean)
+        self.max_score = score if self.count == 1 else max(self.max_score, score)
+        self.region_counts[region] += 1
+        self.ring_counts[REGION_RING[region]] += 1
+
+    @property
+    def std(self) -> float:
+        """Sample standard deviation, as pandas computes it"""
+        return float(np.sqrt(self.m2 / (self.count - 1))) if self.count > 1 else 0.0
+
+    def metrics(self) -> ThrowMetrics:
+        if not self.count:
+            return ThrowMetrics(0, 0, 0, 0, 0, 0)
+        return ThrowMetrics(
+            accuracy=self.hits / self.count,
+            consistency=_consistency(self.std, self.max_score) if self.count > 1 else 1,
+            average_score=self.mean,
+            double_hit_rate=self.ring_counts[RING_DOUBLE] / self.count,
+            triple_hit_rate=self.ring_counts[RING_TRIPLE] / self.count,
+            bullseye_rate=self.ring_counts[RING_INNER_BULL] / self.count
+        )
+
+class ThrowAnalyzer:
+    def __init__(self, history_window: int = 4096, spill_dir: Optional[str] = None,
+                 geometry: Optional[BoardGeometry] = None):
         self.session_start = datetime.now()
+        if spill_dir is not None:
+            spill_dir = f"{spill_dir}/session_{self.session_start.strftime('%Y%m%d_%H%M%S')}"
+        # Newest throws in memory, older ones spilled to disk (or dropped without a spill_dir)
+        self.history = ThrowHistory(window=history_window, segment_size=max(1, history_window // 4),
+                                    spill_dir=spill_dir)
+        self.stats = RunningThrowStats()
+        # Where throws land on the calibrated board, at every zoom level
+        self.heatmap = ThrowHeatmap(geometry)
         
     def add_throw(self, throw_data: dict):
-        throw_data['timestamp'] = datetime.now().isoformat()
-        self.throws_history.append(throw_data)
+        # Stored as a region code; labels from older callers are converted once here
+        region = as_region_code(throw_data.get('region'))
+        score, hit = throw_data.get('score', 0), throw_data.get('hit', False)
+        x, y = throw_data.get('coordinates') or (0, 0)
+        # Only positions in calibrated board coordinates can go on the board heatmap
+        on_board = bool(throw_data.get('on_board', False))
+        self.history.append(time.time(), score, hit, region, throw_data.get('confidence', 0.0), x, y, on_board)
+        self.stats.add(score, hit, region)
+        if on_board:
+            self.heatmap.add((x, y))
+
+    @property
+    def throws_history(self) -> List[Dict]:
+        """Throws still held in memory, as dicts"""
+        return throw_records(self.history.in_memory)
         
     def calculate_metrics(self) -> ThrowMetrics:
-        if not self.throws_history:
+        """Session metrics from the running statistics; constant time at any history size"""
+        return self.stats.metrics()
+
+    def region_counts(self) -> Dict[str, int]:
+        """Throws per board region that was hit at least once"""
+        return {REGION_NAMES[code]: int(self.stats.region_counts[code])
+                for code in np.flatnonzero(self.stats.region_counts)}
+
+    def recalculate_metrics(self) -> ThrowMetrics:
+        """Metrics recomputed from the full history, to verify the running statistics"""
+        import pandas as pd
+
+        throws = self.history.query()
+        if not len(throws):
             return ThrowMetrics(0, 0, 0, 0, 0, 0)
             
-        df = pd.DataFrame(self.throws_history)
+        df = pd.DataFrame(throws)
         
         # Calculate basic metrics
         accuracy = len(df[df['hit']]) / len(df) if len(df) > 0 else 0
         average_score = df['score'].mean()
         
         # Calculate consistency (lower standard deviation = more consistent)
-        consistency = 1 - (df['score'].std() / df['score'].max() if len(df) > 1 else 0)
+        consistency = _consistency(df['score'].std(), df['score'].max()) if len(df) > 1 else 1
         
         # Calculate special region hit rates
-        double_hits = df[df['region'].str.contains('double', case=False)].shape[0]
-        triple_hits = df[df['region'].str.contains('triple', case=False)].shape[0]
-        bullseye_hits = df[df['region'].str.contains('bullseye|bulls_eye', case=False)].shape[0]
+        rings = REGION_RING[df['region'].to_numpy(dtype=np.intp)]
+        double_hits = int(np.count_nonzero(rings == RING_DOUBLE))
+        triple_hits = int(np.count_nonzero(rings == RING_TRIPLE))
+        bullseye_hits = int(np.count_nonzero(rings == RING_INNER_BULL))
         
         total_throws = len(df)
         
@@ -52,19 +140,9 @@ class ThrowAnalyzer:
             bullseye_rate=bullseye_hits/total_throws if total_throws > 0 else 0
         )
     
-    def generate_heatmap(self) -> np.ndarray:
-        """Generate a heatmap of throw locations"""
-        heatmap = np.zeros((20, 20))  # Adjust size as needed
-        
-        for throw in self.throws_history:
-            x, y = throw.get('coordinates', (0, 0))
-            # Convert coordinates to heatmap indices
-            i = int(y * 20)
-            j = int(x * 20)
-            if 0 <= i < 20 and 0 <= j < 20:
-                heatmap[i, j] += 1
-                
-        return heatmap
+    def generate_heatmap(self, bins: int = 20) -> np.ndarray:
+        """Heatmap of throw locations on the board, bins x bins; see ThrowHeatmap for the polar grids"""
+        return self.heatmap.cartesian(bins)
     
     def export_session_data(self, filename: str = None):
         if filename is None:
@@ -74,7 +152,7 @@ class ThrowAnalyzer:
             'session_start': self.session_start.isoformat(),
             'session_end': datetime.now().isoformat(),
             'metrics': self.calculate_metrics().__dict__,
-            'throws': self.throws_history
+            'throws': throw_records(self.history.query())
         }
         
         with open(filename, 'w') as f:
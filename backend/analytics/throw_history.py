@@ -0,0 +1,144 @@
+import os
+import logging
+from dataclasses import dataclass
+from datetime import datetime
+from typing import List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# One row per landed dart; position is wherever the tracker measured it:
+# calibrated board cm when on_board is set, frame pixels otherwise
+THROW_DTYPE = np.dtype([
+    ('timestamp', np.float64),  # time.time()
+    ('score', np.int16),
+    ('hit', np.bool_),
+    ('region', np.uint8),       # region code, see src.scoring.regions
+    ('confidence', np.float32),
+    ('x', np.float32),
+    ('y', np.float32),
+    ('on_board', np.bool_),
+])
+
+
+@dataclass
+class HistorySegment:
+    """A block of older throws spilled to an .npy file"""
+    path: str
+    start: float
+    end: float
+    count: int
+
+    def load(self) -> np.ndarray:
+        return np.load(self.path, mmap_mode='r')
+
+
+def throw_records(throws: np.ndarray) -> List[dict]:
+    """Throw dicts for JSON exports"""
+    return [{
+        'timestamp': datetime.fromtimestamp(timestamp).isoformat(),
+        'score': score,
+        'hit': hit,
+        'region': region,
+        'confidence': confidence,
+        'coordinates': [x, y],
+        'on_board': on_board
+    } for timestamp, score, hit, region, confidence, x, y, on_board in zip(
+        throws['timestamp'].tolist(), throws['score'].tolist(), throws['hit'].tolist(),
+        throws['region'].tolist(), throws['confidence'].tolist(), throws['x'].tolist(), throws['y'].tolist(),
+        throws['on_board'].tolist())]
+
+
+class ThrowHistory:
+    """Columnar throw store whose memory use does not grow with the session.
+
+    The newest `window` throws live in a preallocated structured array. When
+    it fills up the oldest `segment_size` of them are written to `spill_dir`
+    as an .npy segment (memory-mapped again when queried), or dropped and
+    counted if there is no spill directory.
+    """
+
+    def __init__(self, window: int = 4096, segment_size: int = 1024, spill_dir: Optional[str] = None):
+        if not 0 < segment_size <= window:
+            raise ValueError("segment_size must be between 1 and window")
+        self.window = window
+        self.segment_size = segment_size
+        self.spill_dir = spill_dir
+        self._buffer = np.zeros(window, dtype=THROW_DTYPE)
+        self._size = 0
+        self.segments: List[HistorySegment] = []
+        self.dropped = 0
+
+    def append(self, timestamp: float, score: int, hit: bool, region: int, confidence: float,
+               x: float = 0.0, y: float = 0.0, on_board: bool = False):
+        if self._size == self.window:
+            self._spill()
+        self._buffer[self._size] = (timestamp, score, hit, region, confidence, x, y, on_board)
+        self._size += 1
+
+    def _spill(self):
+        oldest = self._buffer[:self.segment_size]
+        if self.spill_dir is not None:
+            os.makedirs(self.spill_dir, exist_ok=True)
+            path = os.path.join(self.spill_dir, f"throws_{len(self.segments):05d}.npy")
+            np.save(path, oldest)
+            self.segments.append(HistorySegment(path, float(oldest['timestamp'].min()),
+                                                float(oldest['timestamp'].max()), len(oldest)))
+            logger.info(f"Spilled {len(oldest)} throws to {path}")
+        else:
+            self.dropped += len(oldest)
+        # Shift the rest down; numpy copies overlapping slices safely
+        self._buffer[:self._size - self.segment_size] = self._buffer[self.segment_size:self._size]
+        self._size -= self.segment_size
+
+    @property
+    def in_memory(self) -> np.ndarray:
+        """View of the throws still held in memory, oldest first"""
+        return self._buffer[:self._size]
+
+    def __len__(self) -> int:
+        """Throws that can still be queried (spilled ones included)"""
+        return self._size + sum(segment.count for segment in self.segments)
+
+    @staticmethod
+    def _between(throws: np.ndarray, start: Optional[float], end: Optional[float]) -> np.ndarray:
+        mask = np.ones(len(throws), dtype=bool)
+        if start is not None:
+            mask &= throws['timestamp'] >= start
+        if end is not None:
+            mask &= throws['timestamp'] < end
+        return throws[mask]
+
+    def query(self, start: Optional[float] = None, end: Optional[float] = None) -> np.ndarray:
+        """Throws with start <= timestamp < end (time.time() seconds), oldest first"""
+        parts = []
+        for segment in self.segments:
+            if (start is not None and segment.end < start) or (end is not None and segment.start >= end):
+                continue
+            parts.append(self._between(segment.load(), start, end))
+        parts.append(self._between(self.in_memory, start, end))
+        return np.concatenate(parts)
+
+    def recent(self, count: int) -> np.ndarray:
+        """Up to `count` newest throws held in memory"""
+        return self.in_memory[-count:].copy() if count > 0 else self.in_memory[:0].copy()
+
+    def clear(self, delete_segments: bool = False):
+        if delete_segments:
+            for segment in self.segments:
+                if os.path.exists(segment.path):
+                    os.remove(segment.path)
+        self.segments = []
+        self._size = 0
+        self.dropped = 0
+
+    def stats(self) -> dict:
+        return {
+            'throws': len(self),
+            'in_memory': self._size,
+            'window': self.window,
+            'segments': len(self.segments),
+            'dropped': self.dropped,
+            'memory_bytes': self._buffer.nbytes,
+        }
@@ -5,25 +5,37 @@ from typing import List, Dict
 import io
 import base64
 
+from analytics.heatmap import ThrowHeatmap
+from src.scoring.regions import as_region_code, region_name
+
 class DartsVisualizer:
     def __init__(self):
         self.figure_size = (10, 6)
         plt.style.use('seaborn')
         
-    def generate_heatmap(self, throws: List[Dict]) -> str:
-        """Generate throw distribution heatmap"""
+    def generate_heatmap(self, heatmap: ThrowHeatmap, bins: int = 40) -> str:
+        """Generate throw distribution heatmap on the board from an accumulated ThrowHeatmap"""
         plt.figure(figsize=self.figure_size)
         
-        # Create 2D histogram of throw positions
-        x = [t['coordinates'][0] for t in throws]
-        y = [t['coordinates'][1] for t in throws]
-        
-        plt.hist2d(x, y, bins=20, cmap='YlOrRd')
+        # Rows follow board y, which points down like the image
+        plt.imshow(heatmap.cartesian(bins), extent=heatmap.cartesian_extent(), cmap='YlOrRd')
         plt.colorbar(label='Number of throws')
         plt.title('Throw Distribution Heatmap')
         
         # Convert plot to base64 string
         return self._fig_to_base64()
+
+    def generate_polar_heatmap(self, heatmap: ThrowHeatmap, bins=(17, 20)) -> str:
+        """Generate throw distribution by distance from the bull and board angle"""
+        plt.figure(figsize=self.figure_size)
+        
+        radii, angles = heatmap.polar_edges(bins)
+        ax = plt.subplot(projection='polar')
+        mesh = ax.pcolormesh(np.radians(angles), radii, heatmap.polar(bins), cmap='YlOrRd')
+        plt.colorbar(mesh, label='Number of throws')
+        plt.title('Throw Distribution by Ring and Segment')
+        
+        return self._fig_to_base64()
         
     def generate_score_trend(self, throws: List[Dict]) -> str:
         """Generate score trend line plot"""
@@ -49,7 +61,7 @@ class DartsVisualizer:
         
         regions = {}
         for throw in throws:
-            region = throw['region']
+            region = region_name(as_region_code(throw['region']))
             hit = throw['hit']
             if region not in regions:
                 regions[region] = {'hits': 0, 'total': 0}
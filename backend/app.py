@@ -1,22 +1,46 @@
-from flask import Flask, jsonify
+from flask import Flask, Response, jsonify, request
 from flask_socketio import SocketIO
 from flask_cors import CORS
 import eventlet
 eventlet.monkey_patch()
+from eventlet import tpool
 
+import os
+import time
+import atexit
 import cv2
-from typing import Dict, List
-from ultralytics import YOLO
+import numpy as np
+from typing import Dict, List, Optional
 import logging
-import base64
 from datetime import datetime
 import csv
 
 from game_modes.training import TrainingMode, TrainingTarget
 from utils.voice_feedback import VoiceFeedback
 from utils.calibration import BoardCalibrator
+from utils.camera import CameraManager
+from utils.recording import Recording
 from utils.data_export import DataExporter
+from utils.pipeline import CameraPipeline, FramePacket
+from utils.camera_hub import CameraHub
+from src.utils.monitor import CameraMonitor
+from utils.frame_encoding import FrameEncoder, decode_frame, negotiate_tier
+from utils.rate_control import SubscriberRateController
+from utils.batch_inference import BatchInferenceScheduler
+from utils.motion import MotionGate
+from utils.roi import BoardCropper
+from utils.inference_backends import Detections, load_backend
+from utils.inference_pool import InferencePool
+from utils import metrics
+from utils.tracing import FrameTracer
 from analytics.throw_analyzer import ThrowAnalyzer
+from analytics.throw_history import throw_records
+from analytics.dart_tracker import DartTracker, ThrowEvent, ThrowEventType
+from src.scoring.board_geometry import BoardGeometry, PixelScoringLUT
+from src.scoring.regions import REGION_NAMES, region_code, region_name
+from src.scoring.dartboard_scoring import (ClassTable, box_centers, dart_positions, detections_from_boxes,
+                                           predictions_from_detections, score_batch)
+from src.utils.score_aggregator import FusionResult, ScoreAggregator
 from player.profile_manager import ProfileManager
 from game_modes.tournament import Tournament
 from analytics.visualizer import DartsVisualizer
@@ -52,37 +76,106 @@ socketio = SocketIO(
     async_mode='eventlet',
     ping_timeout=60,
     ping_interval=25,
-    max_http_buffer_size=100000000,  # Using integer instead of scientific notation
+    # Frames go out as binary attachments, so only uploads (calibration
+    # frames) need to fit here
+    max_http_buffer_size=10 * 1024 * 1024,
     engineio_logger=True
 )
 
 # Load the YOLO model
 model_path = "Dartopia/model/best/best.pt"  # Update this line
 
-model = YOLO(model_path)
-model.conf = 0.5  # Adjusted confidence threshold for predictions
-
-logger.info("YOLO model loaded successfully")
+# Inference input size. With BOARD_ROI_INFERENCE the calibrated board region
+# is cropped and letterboxed to this size instead of feeding the full frame
+MODEL_IMGSZ = 640
+BOARD_ROI_INFERENCE = True
+
+# Runtime for the detector: torch, onnx, onnx-int8, openvino or openvino-int8.
+# Anything but torch needs the weights exported next to best.pt with
+# export_model.py, which also checks the export against the PyTorch model
+INFERENCE_BACKEND = os.environ.get('DARTOPIA_INFERENCE_BACKEND', 'torch')
+
+# Run the detector in this many worker processes so inference never holds
+# the web process's GIL; 0 runs it in-process on a tpool thread instead
+INFERENCE_WORKERS = int(os.environ.get('DARTOPIA_INFERENCE_WORKERS', 2))
+INFERENCE_THREADS_PER_WORKER = 2
+
+if INFERENCE_WORKERS:
+    model = InferencePool(
+        INFERENCE_BACKEND,
+        os.path.dirname(model_path),
+        imgsz=MODEL_IMGSZ,
+        conf=0.5,
+        workers=INFERENCE_WORKERS,
+        threads_per_worker=INFERENCE_THREADS_PER_WORKER,
+        blocking_call=tpool.execute
+    )
+    model.start()
+    atexit.register(model.stop)
+else:
+    model = load_backend(INFERENCE_BACKEND, os.path.dirname(model_path), imgsz=MODEL_IMGSZ, conf=0.5)
+
+# Batch frames from all cameras into one forward pass, waiting at most
+# this long (seconds) for the other cameras before running a partial batch
+BATCHED_INFERENCE = True
+INFERENCE_MAX_BATCH_WAIT = 0.02
+
+# Per-client frame pacing. Clients that answer each camera_frame with a
+# 'frame_ack' start at STREAM_START_FPS and adapt between STREAM_MIN_FPS and
+# their requested max_fps; clients that don't get a fixed STREAM_DEFAULT_FPS
+STREAM_START_FPS = 10
+STREAM_DEFAULT_FPS = 20
+STREAM_MIN_FPS = 1
+STREAM_MAX_FPS = 30
+# Encode-and-emit time per frame above which acked streams slow down even if the client keeps up
+STREAM_EMIT_BUDGET = 0.1
+
+# Only run YOLO when the board region changed, with a keep-alive pass
+# every MOTION_KEEPALIVE_INTERVAL seconds
+MOTION_GATING = True
+MOTION_KEEPALIVE_INTERVAL = 2.0
+
+# Role, segment and multiplier of each model class id, parsed once from its label
+model_classes = ClassTable.from_names(model.names)
+
+logger.info(f"YOLO model loaded successfully ({INFERENCE_BACKEND} backend, {INFERENCE_WORKERS} workers)")
+
+# Grab every watched camera back-to-back in one loop so frames taken for
+# multi-camera fusion are from the same moment; otherwise each pipeline
+# reads its own camera independently
+SYNCHRONIZED_CAPTURE = True
+
+# Replay a recording made with utils/recording.py instead of opening the
+# cameras, at recorded speed or (DARTOPIA_REPLAY_REALTIME=0) as fast as possible
+REPLAY_PATH = os.environ.get('DARTOPIA_REPLAY')
+REPLAY_REALTIME = os.environ.get('DARTOPIA_REPLAY_REALTIME', '1') != '0'
 
 # Initialize camera feeds
-camera_indices = [0, 1, 2]
-cameras: Dict[int, cv2.VideoCapture] = {}
-for idx in camera_indices:
-    cap = cv2.VideoCapture(idx)
-    if cap.isOpened():
-        cameras[idx] = cap
-        logger.info(f"Camera {idx} initialized")
-    else:
-        logger.warning(f"Failed to initialize camera {idx}")
+if REPLAY_PATH:
+    replay = Recording(REPLAY_PATH, realtime=REPLAY_REALTIME, loop=True)
+    camera_indices = replay.camera_indices
+    camera_manager = CameraManager(camera_indices, blocking_call=tpool.execute, capture_factory=replay.capture)
+    logger.info(f"Replaying cameras {camera_indices} from {REPLAY_PATH}")
+else:
+    camera_indices = [0, 1, 2]
+    camera_manager = CameraManager(camera_indices, blocking_call=tpool.execute)
+cameras: Dict[int, cv2.VideoCapture] = camera_manager.cameras
 
 # Store latest predictions for each camera
 latest_predictions: Dict[int, List[dict]] = {idx: [] for idx in camera_indices}
 
 # Initialize components
 voice_feedback = VoiceFeedback()
-board_calibrator = BoardCalibrator()
+# Each camera sees the board from its own angle, so each gets its own calibration
+board_calibrators: Dict[int, BoardCalibrator] = {idx: BoardCalibrator() for idx in camera_indices}
+board_cropper = BoardCropper(input_size=MODEL_IMGSZ)
 data_exporter = DataExporter()
-throw_analyzer = ThrowAnalyzer()
+# The newest THROW_HISTORY_WINDOW throws stay in memory; older ones are
+# spilled in blocks to .npy files under THROW_HISTORY_DIR, so a long
+# session's memory stays flat
+THROW_HISTORY_WINDOW = 4096
+THROW_HISTORY_DIR = os.environ.get('DARTOPIA_THROW_HISTORY_DIR', os.path.join(data_exporter.export_dir, 'throw_history'))
+throw_analyzer = ThrowAnalyzer(history_window=THROW_HISTORY_WINDOW, spill_dir=THROW_HISTORY_DIR)
 profile_manager = ProfileManager()
 visualizer = DartsVisualizer()
 ai_coach = AICoach()
@@ -90,100 +183,51 @@ game_server = GameServer()
 social_manager = SocialManager()
 active_tournaments = {}
 
-def calculate_score(predictions: List[dict]) -> dict:
-    if not predictions:
-        return {"total": 0, "details": []}
-        
-    score_details = []
-    total_score = 0
-    
-    # First, find the dartboard for reference
-    dartboard = None
-    for pred in predictions:
-        if 'dartboard' in pred['label'].lower():
-            dartboard = pred
-            break
-    
-    # Find all darts
-    darts = [p for p in predictions if 'dart' in p['label'].lower()]
-    
-    # Find all scoring regions
-    scoring_regions = [p for p in predictions if all(x not in p['label'].lower() for x in ['dart', 'dartboard'])]
-    
-    for dart in darts:
-        dart_x = dart['bbox'][0] + dart['bbox'][2]/2
-        dart_y = dart['bbox'][1] + dart['bbox'][3]/2
-        score_info = {
-            "label": dart['label'],
-            "confidence": dart['confidence'],
-            "location": dart['bbox'],
-            "points": 0,
-            "region": "outside"
-        }
-        
-        # Only score if we have a dartboard reference
-        if dartboard:
-            board_x = dartboard['bbox'][0] + dartboard['bbox'][2]/2
-            board_y = dartboard['bbox'][1] + dartboard['bbox'][3]/2
-            board_radius = max(dartboard['bbox'][2], dartboard['bbox'][3])/2
-            
-            # Calculate distance from dart to board center
-            dist_to_center = ((dart_x - board_x)**2 + (dart_y - board_y)**2)**0.5
-            
-            # If dart is within board radius
-            if dist_to_center <= board_radius:
-                # Find the closest scoring region
-                best_region = None
-                min_dist = float('inf')
-                
-                for region in scoring_regions:
-                    region_x = region['bbox'][0] + region['bbox'][2]/2
-                    region_y = region['bbox'][1] + region['bbox'][3]/2
-                    dist = ((dart_x - region_x)**2 + (dart_y - region_y)**2)**0.5
-                    
-                    if dist < min_dist:
-                        min_dist = dist
-                        best_region = region
-                
-                if best_region:
-                    region_label = best_region['label'].lower()
-                    score_info["region"] = region_label
-                    
-                    # Calculate points based on region
-                    if 'bulls_eye' in region_label or 'bullseye' in region_label:
-                        score_info["points"] = 50
-                    elif 'bull' in region_label:
-                        score_info["points"] = 25
-                    elif 'triple' in region_label:
-                        try:
-                            base = int(''.join(filter(str.isdigit, region_label)))
-                            score_info["points"] = base * 3
-                        except ValueError:
-                            score_info["points"] = 0
-                    elif 'double' in region_label:
-                        try:
-                            base = int(''.join(filter(str.isdigit, region_label)))
-                            score_info["points"] = base * 2
-                        except ValueError:
-                            score_info["points"] = 0
-                    else:
-                        try:
-                            score_info["points"] = int(''.join(filter(str.isdigit, region_label)))
-                        except ValueError:
-                            score_info["points"] = 0
-                    
-                    total_score += score_info["points"]
-        
-        score_details.append(score_info)
-    
-    # Sort details by points (highest first) and filter out zero scores
-    score_details = sorted(score_details, key=lambda x: x["points"], reverse=True)
-    score_details = [d for d in score_details if d["points"] > 0]
-    
-    return {
-        "total": total_score,
-        "details": score_details
-    }
+# Per-frame stage timings, exported with queue depths and drop counters at /metrics
+STAGE_SECONDS = metrics.histogram('dartopia_stage_seconds', 'Time a frame spends in each pipeline stage',
+                                  ('camera', 'stage'))
+FRAME_LATENCY_SECONDS = metrics.histogram('dartopia_frame_latency_seconds',
+                                          'Capture to emit latency per frame', ('camera',))
+INFERENCE_BATCH_SECONDS = metrics.histogram('dartopia_inference_batch_seconds',
+                                            'Model time per inference batch', ('backend',))
+INFERENCE_BATCH_SIZE = metrics.histogram('dartopia_inference_batch_size', 'Frames per inference batch',
+                                         buckets=(1, 2, 3, 4, 6, 8))
+CLIENT_FRAME_LATENCY_SECONDS = metrics.histogram('dartopia_client_frame_latency_seconds',
+                                                 'Capture to client render report per frame', ('camera',))
+
+# Every frame carries a trace ID from capture to the client's render report.
+# Every TRACE_SAMPLE_EVERY-th frame and any frame slower than
+# TRACE_SLOW_THRESHOLD seconds to emit is kept for /api/traces
+TRACE_SAMPLE_EVERY = 50
+TRACE_SLOW_THRESHOLD = 0.2
+frame_tracer = FrameTracer(sample_every=TRACE_SAMPLE_EVERY, slow_threshold=TRACE_SLOW_THRESHOLD)
+
+def _record_stage(packet: FramePacket, stage: str, started: float, ended: float = None, series=None):
+    """Time a stage (monotonic seconds) into its histogram and the frame's trace"""
+    ended = time.monotonic() if ended is None else ended
+    (series or STAGE_SECONDS.labels(packet.camera_idx, stage)).observe(ended - started)
+    trace = packet.extras.get('trace')
+    if trace is not None:
+        trace.span(stage, started, ended)
+
+# Calibrated board geometry, plus a per-camera pixel -> (segment, multiplier)
+# table rebuilt whenever that camera's calibration changes
+board_geometry = BoardGeometry()
+scoring_luts: Dict[int, tuple] = {}
+score_aggregator = ScoreAggregator(geometry=board_geometry)
+# Latest fused board score, which every calibrated camera's viewers are shown
+fused_score: Optional[dict] = None
+# Turn per-frame detections into dart landed / turn complete / removed events
+dart_trackers: Dict[object, DartTracker] = {}
+
+def _get_scoring_lut(camera_idx: int, frame_shape) -> PixelScoringLUT:
+    calibrator = board_calibrators[camera_idx]
+    height, width = frame_shape[:2]
+    cached = scoring_luts.get(camera_idx)
+    if cached is None or cached[0] != calibrator.version or cached[1] != (width, height):
+        cached = (calibrator.version, (width, height), PixelScoringLUT(board_geometry, calibrator, width, height))
+        scoring_luts[camera_idx] = cached
+    return cached[2]
 
 @socketio.on('connect')
 def handle_connect():
@@ -192,9 +236,13 @@ def handle_connect():
 @socketio.on('disconnect')
 def handle_disconnect():
     logger.info("Client disconnected")
+    # Release the client's cameras so unwatched ones stop processing
+    camera_hub.unsubscribe_all(request.sid)
 
 # Store active training sessions
 training_sessions = {}
+# Latest process_throw result per training session
+training_results = {}
 
 @socketio.on('start_training')
 def handle_training_start(data):
@@ -212,106 +260,529 @@ def handle_training_start(data):
 @socketio.on('calibrate_board')
 def handle_calibration(data):
     frame_data = data.get('frame')
-    # Convert base64 frame to numpy array
-    frame = cv2.imdecode(np.frombuffer(base64.b64decode(frame_data), np.uint8), cv2.IMREAD_COLOR)
-    
-    if board_calibrator.detect_board_automatically(frame):
-        return {'status': 'success', 'message': 'Board detected and calibrated'}
-    return {'status': 'error', 'message': 'Could not detect board'}
-
-@socketio.on('request_camera_feed')
-def handle_camera_feed(data):
-    camera_idx = data.get('camera_idx')
-    session_id = data.get('session_id')
+    camera_idx = data.get('camera_idx', camera_indices[0])
+    calibrator = board_calibrators.setdefault(camera_idx, BoardCalibrator())
 
-    if camera_idx not in cameras:
-        socketio.emit('camera_error', {'error': f'Camera {camera_idx} not available'}, room=data.get('sid'))
-        return
+    # Optional lens intrinsics for this camera
+    if data.get('camera_matrix') is not None and data.get('dist_coeffs') is not None:
+        calibrator.set_intrinsics(np.array(data['camera_matrix']), np.array(data['dist_coeffs']))
 
-    cap = cameras[camera_idx]
-    training_session = training_sessions.get(session_id)
+    # Frames arrive as binary attachments; base64 strings are still accepted
+    frame = decode_frame(frame_data)
+    if frame is None:
+        return {'status': 'error', 'message': 'Could not decode frame'}
 
-    logger.info(f"Starting camera feed for camera {camera_idx}")
+    if calibrator.detect_board_automatically(frame):
+        return {'status': 'success', 'message': 'Board detected and calibrated'}
+    return {'status': 'error', 'message': 'Could not detect board'}
 
-    while True:  # Main loop for processing camera feed
-
-        ret, frame = cap.read()
-        if not ret:
-            logger.warning(f"Failed to read frame from camera {camera_idx}")
-            socketio.emit('camera_error', {'error': f'Failed to read frame from camera {camera_idx}'}, room=data.get('sid'))
-            return  # Use return instead of break to exit the function
-
-
-        try:
-            # Apply calibration if available
-            calibrated_frame = board_calibrator.calibrate_frame(frame)
-            if calibrated_frame is not None:
-                frame = calibrated_frame
-
-            # Perform inference
-            results = model(frame)
-            predictions = []
-
-            for result in results:
-                boxes = result.boxes.xywh.cpu().numpy()
-                labels = result.boxes.cls.cpu().numpy()
-                confidences = result.boxes.conf.cpu().numpy()
-                names = result.names
-
-                for box, label, conf in zip(boxes, labels, confidences):
-                    x, y, w, h = box
-                    predictions.append({
-                        'label': names[int(label)],
-                        'confidence': float(conf),
-                        'bbox': [float(x - w/2), float(y - h/2), float(w), float(h)]
-                    })
-
-            # Only calculate score if we have both darts and regions detected
-            score = calculate_score(predictions)  # Calculate score based on predictions
-
-            # Process training session if active
-            training_data = None
-            if training_session:
-                training_data = training_session.process_throw(predictions)
-
-            # Analyze throw
-            throw_analyzer.add_throw({
-                'predictions': predictions,
-                'score': score['total'],
-                'hit': bool(score['total'] > 0),
-                'coordinates': predictions[0]['bbox'][:2] if predictions else (0, 0),
-                'region': score['details'][0]['region'] if score['details'] else 'unknown'
-            })
+def _read_camera(camera_idx: int):
+    """Read one frame off the driver without blocking the eventlet hub"""
+    captured = tpool.execute(camera_manager.read, camera_idx)
+    return (captured.frame, captured.timestamp) if captured else None
+
+def _roi_inference_active(camera_idx: int) -> bool:
+    return BOARD_ROI_INFERENCE and board_calibrators[camera_idx].get_board_roi() is not None
+
+def _calibrate(packet: FramePacket) -> np.ndarray:
+    # Apply calibration if available (at most once per frame)
+    if not packet.extras.get('calibrated'):
+        calibrated_frame = board_calibrators[packet.camera_idx].calibrate_frame(packet.frame)
+        if calibrated_frame is not None:
+            packet.frame = calibrated_frame
+        packet.extras['calibrated'] = True
+    return packet.frame
+
+def _prepare_frame(packet: FramePacket) -> np.ndarray:
+    started = time.monotonic()
+    if _roi_inference_active(packet.camera_idx):
+        # Only the board goes to the model; boxes are mapped back to the
+        # camera frame in _unpack_result
+        roi = board_calibrators[packet.camera_idx].get_board_roi()
+        image, packet.extras['crop'] = board_cropper.crop(packet.frame, roi)
+    else:
+        image = _calibrate(packet)
+    _record_stage(packet, 'calibrate', started)
+    return image
+
+def _run_model(frames: List[np.ndarray]) -> list:
+    INFERENCE_BATCH_SIZE.observe(len(frames))
+    with INFERENCE_BATCH_SECONDS.labels(INFERENCE_BACKEND).time():
+        if INFERENCE_WORKERS:
+            # The pool waits for its worker's reply on a tpool thread itself
+            return model(frames)
+        # Run inference in a native thread so capture and emit keep running
+        return tpool.execute(model.detect, frames)
+
+def _unpack_result(packet: FramePacket, result: Detections) -> FramePacket:
+    # The batch's forward pass is what this frame waited on for inference
+    if 'inference_started' in packet.extras:
+        inference_started = packet.extras['inference_started']
+        _record_stage(packet, 'infer', inference_started, inference_started + packet.extras['inference_time'])
+    started = time.monotonic()
+    boxes = result.xywh
+    crop = packet.extras.get('crop')
+    if crop is not None:
+        boxes = crop.to_frame(boxes)
+
+    # Kept as one structured array until the frame is emitted
+    packet.detections = detections_from_boxes(boxes, result.cls, result.conf,
+                                              camera=packet.camera_idx, timestamp=packet.timestamp)
+    _record_stage(packet, 'postprocess', started)
+    return packet
+
+def _run_inference(packet: FramePacket) -> FramePacket:
+    """Single-camera inference, used when batching is disabled"""
+    frame = _prepare_frame(packet)
+    packet.extras['inference_started'] = time.monotonic()
+    result = _run_model([frame])[0]
+    packet.extras['inference_time'] = time.monotonic() - packet.extras['inference_started']
+    return _unpack_result(packet, result)
+
+# One forward pass over the latest frame of every active camera
+inference_scheduler = BatchInferenceScheduler(
+    run_batch=_run_model,
+    prepare=_prepare_frame,
+    unpack=_unpack_result,
+    max_batch_wait=INFERENCE_MAX_BATCH_WAIT,
+    # Keep every worker busy with its own batch
+    concurrency=max(1, INFERENCE_WORKERS)
+)
 
-            # Provide voice feedback
-            voice_feedback.announce_score(score['total'], score['details'][0]['region'] if score['details'] else None)
+def _dart_board_positions(packet: FramePacket):
+    """Dart tips of a scored frame in calibrated board coordinates"""
+    tips, confidence = dart_positions(packet.detections, model_classes)
+    if _roi_inference_active(packet.camera_idx):
+        tips = board_calibrators[packet.camera_idx].to_board_coordinates(tips)
+    return tips, confidence
+
+def _fused_score(fused: FusionResult) -> dict:
+    """calculate_score-style dict for a multi-camera fusion"""
+    details = [{
+        "label": "dart",
+        "confidence": float(conf),
+        "location": [float(x), float(y)],
+        "points": int(points),
+        "region": REGION_NAMES[region],
+        "region_code": int(region),
+        "segment": int(segment),
+        "multiplier": int(multiplier),
+        "cameras": int(cameras)
+    } for (x, y), conf, points, region, segment, multiplier, cameras in zip(
+        fused.board_xy, fused.confidence, fused.points, region_code(fused.segment, fused.multiplier),
+        fused.segment, fused.multiplier, fused.cameras)
+      if points > 0]
+    details.sort(key=lambda x: x["points"], reverse=True)
+    return {
+        "total": fused.total,
+        "details": details,
+        "agreement": fused.agreement,
+        "camera_count": fused.camera_count
+    }
 
-            # Export data periodically
-            if len(throw_analyzer.throws_history) % 10 == 0:
-                data_exporter.export_session({
-                    'throws': throw_analyzer.throws_history,
-                    'metrics': throw_analyzer.calculate_metrics().__dict__
+def _handle_throw_event(event: ThrowEvent, subscribers: Dict[str, dict], on_board: bool = False):
+    # Sent on their own so a dropped frame never drops an event
+    for room in subscribers:
+        socketio.emit('throw_event', event.to_dict(), room=room)
+
+    if event.type == ThrowEventType.DART_LANDED:
+        # Each active training session counts the throw once, however many
+        # of its clients are watching
+        processed = set()
+        for room, info in subscribers.items():
+            session_id = info.get('session_id')
+            training_session = training_sessions.get(session_id)
+            if not training_session:
+                continue
+            if session_id not in processed:
+                processed.add(session_id)
+                training_data = training_session.process_throw({
+                    'region': event.region,
+                    'score': event.points,
+                    'confidence': event.confidence
                 })
+                training_results[session_id] = training_data
+            socketio.emit('training_update', training_results[session_id], room=room)
+
+        # Analyze throw
+        throw_analyzer.add_throw({
+            'score': event.points,
+            'hit': bool(event.points > 0),
+            'coordinates': event.position,
+            'on_board': on_board,
+            'region': event.region,
+            'confidence': event.confidence
+        })
+
+        # Provide voice feedback
+        voice_feedback.announce_score(event.points, region_name(event.region))
+
+        # Export data periodically; every throw, spilled ones included, to
+        # match the session-wide metrics
+        if throw_analyzer.stats.count % 10 == 0:
+            data_exporter.export_session({
+                'throws': throw_records(throw_analyzer.history.query()),
+                'metrics': throw_analyzer.calculate_metrics().__dict__
+            })
 
-            # Encode frame as base64
-            _, buffer = cv2.imencode('.jpg', frame)
-            frame_base64 = base64.b64encode(buffer).decode('utf-8')
-
-            # Send frame, predictions, score, and training data
+    elif event.type == ThrowEventType.TURN_COMPLETE:
+        voice_feedback.announce_score(event.turn_total)
+
+def _make_score_stage(camera_idx: int):
+    timer = STAGE_SECONDS.labels(camera_idx, 'score')
+
+    def score_packet(packet: FramePacket) -> FramePacket:
+        global fused_score
+        camera_monitor.record_inference(camera_idx, packet.timestamp)
+        detections = packet.detections
+        if _roi_inference_active(packet.camera_idx):
+            # Boxes are in camera pixels; look tips up in the camera's table
+            score = score_batch(detections, model_classes, n_frames=1,
+                                lut=_get_scoring_lut(packet.camera_idx, packet.frame.shape))
+        elif board_calibrators[packet.camera_idx].is_calibrated:
+            # Warped frames are already in board coordinates
+            score = score_batch(detections, model_classes, n_frames=1, geometry=board_geometry)
+        else:
+            # Without calibration fall back to the nearest detected region
+            score = score_batch(detections, model_classes, n_frames=1)
+        packet.score = score
+
+        # Calibrated cameras are fused so a dart seen by several of them is
+        # only counted once, and tracked on the board in cm
+        on_board = board_calibrators[packet.camera_idx].is_calibrated
+        if on_board:
+            fused = score_aggregator.submit(packet.camera_idx, *_dart_board_positions(packet), packet.timestamp)
+            if fused is None:
+                return packet
+            fused_score = _fused_score(fused)
+            # The fused board is shared by every calibrated camera's viewers
+            subscribers = camera_hub.all_subscribers()
+            tracker = dart_trackers.setdefault('board', DartTracker(match_radius=1.0))
+            events = tracker.update(
+                fused.board_xy, fused.points,
+                region_code(fused.segment, fused.multiplier),
+                fused.confidence, fused.timestamp)
+        else:
+            # Uncalibrated cameras are tracked separately in frame pixels
+            subscribers = camera_hub.subscribers(camera_idx)
+            tracker = dart_trackers.setdefault(camera_idx, DartTracker(match_radius=15.0))
+            rows = score.frame_rows(detections)
+            darts = detections[score.dart_index[rows]]
+            events = tracker.update(
+                box_centers(darts), score.points[rows],
+                score.region[rows],
+                darts['conf'], packet.timestamp)
+
+        # Downstream consumers only see discrete throw events, not every frame
+        for event in events:
+            _handle_throw_event(event, subscribers, on_board)
+        return packet
+
+    def score_stage(packet: FramePacket) -> FramePacket:
+        started = time.monotonic()
+        packet = score_packet(packet)
+        _record_stage(packet, 'score', started, series=timer)
+        return packet
+    return score_stage
+
+def _make_gate(camera_idx: int):
+    gate = motion_gates.setdefault(camera_idx, MotionGate(keepalive_interval=MOTION_KEEPALIVE_INTERVAL))
+
+    def should_infer(packet: FramePacket) -> bool:
+        return gate.should_infer(packet.frame, board_calibrators[camera_idx].get_board_roi(), packet.timestamp)
+    return should_infer
+
+def _make_emit_stage(camera_idx: int):
+    encode_timer = STAGE_SECONDS.labels(camera_idx, 'encode')
+    emit_timer = STAGE_SECONDS.labels(camera_idx, 'emit')
+    frame_latency = FRAME_LATENCY_SECONDS.labels(camera_idx)
+
+    def emit_stage(packet: FramePacket):
+        # Board-crop inference reports boxes on the raw camera frame; otherwise
+        # show the calibrated view (gated frames were never calibrated)
+        frame = packet.frame if _roi_inference_active(packet.camera_idx) else _calibrate(packet)
+
+        # Each client's rate controller decides whether it is ready for this
+        # frame; laggards skip it instead of queueing it
+        now = time.monotonic()
+        subscribers = {room: info for room, info in camera_hub.subscribers(camera_idx).items()
+                       if info['rate'].should_send(packet.timestamp, now)}
+        if not subscribers:
+            return
+
+        # JPEG-encode once per quality tier in use, not once per client, and
+        # send the bytes as a binary attachment instead of base64 text
+        tiers = {room: info.get('tier', default_tier) for room, info in subscribers.items()}
+        started = encode_started = time.monotonic()
+        encoded = tpool.execute(frame_encoder.encode_tiers, frame, tiers.values())
+        _record_stage(packet, 'encode', started, series=encode_timer)
+
+        trace = packet.extras.get('trace')
+        started = time.monotonic()
+        # The JSON boundary: detections become dicts only here, once per frame
+        predictions, score = [], {"total": 0, "details": [], "confidence": 0}
+        if packet.detections is not None:
+            predictions = predictions_from_detections(packet.detections, model_classes)
+            score = packet.score.to_dict(packet.detections, model_classes)
+        if fused_score is not None and board_calibrators[packet.camera_idx].is_calibrated:
+            # One score for the whole board, with how well the cameras agree on it
+            score = fused_score
+        for room, tier in tiers.items():
+            image = encoded[tier]
+            rate = subscribers[room]['rate']
+            rate.on_sent(packet.seq, now)
             socketio.emit('camera_frame', {
-                'camera_idx': camera_idx,
-                'frame': frame_base64,
+                'camera_idx': packet.camera_idx,
+                # Echo seq back in 'frame_ack' to be paced adaptively
+                'seq': packet.seq,
+                # Echo in 'frame_rendered' with the client's decode/render times
+                'trace_id': trace.trace_id if trace else None,
+                'capture_timestamp': packet.timestamp,
+                'fps': round(rate.delivered_fps, 1),
+                'frame': image.data,
+                'width': image.width,
+                'height': image.height,
+                # Predictions stay in source pixels; multiply by scale to draw them
+                'scale': image.scale,
+                'jpeg_quality': image.jpeg_quality,
                 'predictions': predictions,
                 'score': score,
-                'training_data': training_data
-            }, room=data.get('sid'))
+                'inference_skipped': packet.extras.get('inference_skipped', False)
+            }, room=room)
+        now = time.monotonic()
+        _record_stage(packet, 'emit', started, now, series=emit_timer)
+        for info in subscribers.values():
+            info['rate'].on_emitted(now - encode_started)
+        frame_latency.observe(now - packet.timestamp)
+        if trace is not None:
+            trace.inference_skipped = packet.extras.get('inference_skipped', False)
+            frame_tracer.finish(trace, now)
+    return emit_stage
+
+def _on_capture_error(camera_idx: int, message: str):
+    logger.error(message)
+    # Only capture failures get here (stage errors skip the frame); keep the
+    # subscribers while the monitor reopens the camera and resumes the feed
+    camera_hub.suspend(camera_idx)
+    camera_monitor.report_failure(camera_idx, message)
+
+def _on_camera_failure(camera_idx: int, reason: str):
+    for room in camera_hub.suspend(camera_idx):
+        socketio.emit('camera_status', {'camera_idx': camera_idx, 'status': 'reconnecting', 'reason': reason}, room=room)
+
+def _on_camera_recovered(camera_idx: int):
+    camera_hub.resume(camera_idx)
+    for room in camera_hub.subscribers(camera_idx):
+        socketio.emit('camera_status', {'camera_idx': camera_idx, 'status': 'recovered'}, room=room)
+
+def _monitored_reader(camera_idx: int, read_frame):
+    def read():
+        captured = read_frame()
+        if captured is not None:
+            camera_monitor.record_capture(camera_idx, *captured)
+        return captured
+    return read
+
+def _make_trace_start(camera_idx: int):
+    read_timer = STAGE_SECONDS.labels(camera_idx, 'read')
+
+    def start_trace(packet: FramePacket):
+        packet.extras['trace'] = frame_tracer.begin(camera_idx, packet.seq, packet.timestamp)
+        # Grab to hand-off: decode plus any wait on the synchronized loop
+        _record_stage(packet, 'read', packet.timestamp, series=read_timer)
+    return start_trace
+
+def _start_pipeline(camera_idx: int) -> CameraPipeline:
+    logger.info(f"Starting camera feed for camera {camera_idx}")
+    if SYNCHRONIZED_CAPTURE:
+        camera_manager.set_active(camera_idx, True)
+        camera_manager.start_sync()
+        read_frame = camera_manager.reader(camera_idx)
+    else:
+        read_frame = lambda: _read_camera(camera_idx)
+    camera_monitor.watch(camera_idx)
+
+    # Capture, inference, scoring and emit run as separate workers joined by
+    # latest-frame buffers, so a slow forward pass drops stale frames
+    # instead of letting them pile up behind it
+    pipeline = CameraPipeline(
+        camera_idx,
+        read_frame=_monitored_reader(camera_idx, read_frame),
+        infer=_run_inference,
+        score=_make_score_stage(camera_idx),
+        emit=_make_emit_stage(camera_idx),
+        on_error=_on_capture_error,
+        scheduler=inference_scheduler if BATCHED_INFERENCE else None,
+        gate=_make_gate(camera_idx) if MOTION_GATING else None,
+        on_capture=_make_trace_start(camera_idx)
+    )
+    if BATCHED_INFERENCE:
+        inference_scheduler.start()
+    pipeline.start()
+    return pipeline
+
+def _stop_pipeline(camera_idx: int, pipeline: CameraPipeline):
+    pipeline.stop()
+    camera_manager.set_active(camera_idx, False)
+    camera_monitor.watch(camera_idx, False)
+
+# One pipeline per camera, fanned out to every client room watching it
+camera_hub = CameraHub(_start_pipeline, _stop_pipeline)
+# Tracks capture/inference fps, detects stalled or frozen cameras and
+# reopens failed ones with backoff, pausing their feeds meanwhile
+camera_monitor = CameraMonitor(
+    camera_manager,
+    camera_indices,
+    on_failure=_on_camera_failure,
+    on_recovered=_on_camera_recovered,
+    blocking_call=tpool.execute
+)
+camera_monitor.start()
+# Shared JPEG encoder; subscribers that asked for nothing get the default tier
+frame_encoder = FrameEncoder()
+default_tier = negotiate_tier(None)
+# Change detectors deciding which frames are worth running YOLO on
+motion_gates: Dict[int, MotionGate] = {}
+
+def _pipeline_stats() -> Dict[int, dict]:
+    pipelines = {idx: camera_hub.pipeline(idx) for idx in camera_indices}
+    return {idx: pipeline.stats() for idx, pipeline in pipelines.items() if pipeline is not None}
+
+def _queue_depths() -> dict:
+    depths = {}
+    for idx in camera_indices:
+        pipeline = camera_hub.pipeline(idx)
+        if pipeline is not None:
+            depths[(idx, 'inference')] = len(pipeline.infer_buffer)
+            depths[(idx, 'scoring')] = len(pipeline.score_buffer)
+            depths[(idx, 'emit')] = len(pipeline.emit_buffer)
+    return depths
+
+def _dropped_frames() -> dict:
+    dropped = {(idx, queue): count for idx, stats in _pipeline_stats().items()
+               for queue, count in stats['dropped'].items()}
+    # Frames replaced in the scheduler before their batch ran
+    dropped[('all', 'batch')] = inference_scheduler.dropped
+    return dropped
+
+# Read at scrape time from counters the components keep anyway
+metrics.callback('dartopia_queue_depth', 'Frames waiting between pipeline stages',
+                 _queue_depths, ('camera', 'queue'))
+metrics.callback('dartopia_inference_pending', 'Cameras with a frame waiting for the next batch',
+                 lambda: inference_scheduler.pending)
+metrics.callback('dartopia_frames_dropped_total', 'Stale frames replaced by newer ones before processing',
+                 _dropped_frames, ('camera', 'queue'), type='counter')
+metrics.callback('dartopia_frames_captured_total', 'Frames read by the running pipelines',
+                 lambda: {idx: stats['frames_captured'] for idx, stats in _pipeline_stats().items()},
+                 ('camera',), type='counter')
+metrics.callback('dartopia_frames_emitted_total', 'Frames through the emit stage of the running pipelines',
+                 lambda: {idx: stats['frames_emitted'] for idx, stats in _pipeline_stats().items()},
+                 ('camera',), type='counter')
+metrics.callback('dartopia_frames_gated_total', 'Frames that skipped inference because the board did not change',
+                 lambda: {idx: stats['frames_gated'] for idx, stats in _pipeline_stats().items()},
+                 ('camera',), type='counter')
+metrics.callback('dartopia_stream_frames_skipped_total', 'Frames not sent to a client because it was not ready',
+                 lambda: {idx: sum(info['rate'].skipped for info in camera_hub.subscribers(idx).values())
+                          for idx in camera_indices}, ('camera',), type='counter')
+metrics.callback('dartopia_camera_grab_failures_total', 'Failed grabs or retrieves per camera',
+                 lambda: dict(camera_manager.grab_failures), ('camera',), type='counter')
+metrics.callback('dartopia_camera_subscribers', 'Clients watching each camera',
+                 lambda: {idx: len(camera_hub.subscribers(idx)) for idx in camera_indices}, ('camera',))
+
+@app.route('/metrics')
+def prometheus_metrics():
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+@app.route('/api/traces')
+def frame_traces():
+    """Sampled frame traces; ?slow=1 for the slowest, ?trace_id= for one frame"""
+    trace_id = request.args.get('trace_id')
+    if trace_id:
+        trace = frame_tracer.get(trace_id)
+        if trace is None:
+            return jsonify({'error': 'Trace not found'}), 404
+        return jsonify(trace.to_dict())
+    return jsonify({
+        'stats': frame_tracer.stats(),
+        'traces': frame_tracer.dump(
+            camera_idx=request.args.get('camera', type=int),
+            slow=request.args.get('slow') == '1',
+            limit=request.args.get('limit', 50, type=int))
+    })
+
+@app.route('/api/cameras/health')
+def camera_health():
+    return jsonify(camera_monitor.get_status())
+
+@app.route('/api/cameras/stats')
+def camera_stats():
+    return jsonify({
+        'cameras': camera_hub.stats(),
+        'capture': camera_manager.stats(),
+        'streams': {
+            camera_idx: {room: info['rate'].stats() for room, info in camera_hub.subscribers(camera_idx).items()}
+            for camera_idx in camera_indices
+        },
+        'inference': inference_scheduler.stats(),
+        'inference_workers': model.stats() if INFERENCE_WORKERS else None,
+        'motion_gating': {idx: gate.stats() for idx, gate in motion_gates.items()},
+        'camera_agreement': score_aggregator.camera_agreement()
+    })
+
+@socketio.on('request_camera_feed')
+def handle_camera_feed(data):
+    camera_idx = data.get('camera_idx')
+    session_id = data.get('session_id')
+    room = data.get('sid')
 
-            socketio.sleep(0.05)  # Rate limiting
+    if camera_idx not in camera_indices:
+        socketio.emit('camera_error', {'error': f'Camera {camera_idx} not available'}, room=room)
+        return
 
-        except Exception as e:
-            logger.error(f"Error processing frame from camera {camera_idx}: {str(e)}")
-            socketio.emit('camera_error', {'error': f'Error processing frame: {str(e)}'}, room=data.get('sid'))
-            break  # Exit the loop on error
+    # Clients pick a quality tier ('full', 'standard', 'thumbnail') and may
+    # override its max_width / jpeg_quality
+    tier = negotiate_tier(data)
+    acks = bool(data.get('acks', False))
+    rate = SubscriberRateController(
+        acks=acks,
+        start_fps=STREAM_START_FPS if acks else STREAM_DEFAULT_FPS,
+        min_fps=STREAM_MIN_FPS,
+        emit_budget=STREAM_EMIT_BUDGET,
+        max_fps=min(float(data.get('max_fps', STREAM_MAX_FPS)), STREAM_MAX_FPS)
+    )
+    # A camera that is reconnecting keeps the subscription and starts once it is back
+    reconnecting = camera_idx not in cameras or camera_monitor.is_failed(camera_idx)
+    subscribers = camera_hub.subscribe(camera_idx, room, start=not reconnecting,
+                                       session_id=session_id, tier=tier, rate=rate)
+    logger.info(f"Camera {camera_idx} now has {subscribers} subscriber(s)")
+    if reconnecting:
+        socketio.emit('camera_status', {'camera_idx': camera_idx, 'status': 'reconnecting'}, room=room)
+    return {'status': 'success', 'max_width': tier.max_width, 'jpeg_quality': tier.jpeg_quality}
+
+@socketio.on('set_stream_quality')
+def handle_stream_quality(data):
+    tier = negotiate_tier(data)
+    if not camera_hub.update(data.get('camera_idx'), data.get('sid'), tier=tier):
+        return {'status': 'error', 'message': 'Not subscribed to this camera'}
+    return {'status': 'success', 'max_width': tier.max_width, 'jpeg_quality': tier.jpeg_quality}
+
+@socketio.on('frame_ack')
+def handle_frame_ack(data):
+    info = camera_hub.subscribers(data.get('camera_idx')).get(data.get('sid'))
+    if info:
+        info['rate'].on_ack(data.get('seq'))
+
+@socketio.on('frame_rendered')
+def handle_frame_rendered(data):
+    trace = frame_tracer.report_client(
+        data.get('trace_id'), data.get('sid', request.sid),
+        decode_ms=data.get('decode_ms'), render_ms=data.get('render_ms'))
+    if trace:
+        CLIENT_FRAME_LATENCY_SECONDS.labels(trace.camera_idx).observe(time.monotonic() - trace.capture_timestamp)
+
+@socketio.on('stop_camera_feed')
+def handle_stop_camera_feed(data):
+    camera_hub.unsubscribe(data.get('camera_idx'), data.get('sid'))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,117 @@
+"""Micro-benchmark for per-frame scoring cost.
+
+Compares the original per-dict scorer against the batch scoring API on the
+same synthetic detections, both batched and called once per frame the way
+the live score stage in app.py does. Run from the backend directory:
+
+    python -m benchmarks.bench_scoring --frames 2000
+"""
+import argparse
+import logging
+import time
+
+import numpy as np
+
+from src.scoring.board_geometry import BoardGeometry
+from src.scoring.dartboard_scoring import calculate_score, detections_from_predictions, score_batch, default_classes
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+REGION_LABELS = [f"{ring}{n}" for ring in ('single', 'double', 'triple') for n in range(1, 21)] + ['bull', 'bullseye']
+
+
+def legacy_calculate_score(predictions):
+    """The nearest-region scorer that used to live in app.py, kept as the baseline"""
+    total = 0
+    dartboard = next((p for p in predictions if 'dartboard' in p['label'].lower()), None)
+    darts = [p for p in predictions if 'dart' in p['label'].lower()]
+    regions = [p for p in predictions if all(x not in p['label'].lower() for x in ['dart', 'dartboard'])]
+    for dart in darts:
+        dart_x = dart['bbox'][0] + dart['bbox'][2]/2
+        dart_y = dart['bbox'][1] + dart['bbox'][3]/2
+        if not dartboard:
+            continue
+        board_x = dartboard['bbox'][0] + dartboard['bbox'][2]/2
+        board_y = dartboard['bbox'][1] + dartboard['bbox'][3]/2
+        if ((dart_x - board_x)**2 + (dart_y - board_y)**2)**0.5 > max(dartboard['bbox'][2:]) / 2:
+            continue
+        best, min_dist = None, float('inf')
+        for region in regions:
+            dist = ((dart_x - region['bbox'][0] - region['bbox'][2]/2)**2 +
+                    (dart_y - region['bbox'][1] - region['bbox'][3]/2)**2)**0.5
+            if dist < min_dist:
+                best, min_dist = region, dist
+        if best:
+            label = best['label'].lower()
+            digits = ''.join(filter(str.isdigit, label))
+            if 'bullseye' in label:
+                total += 50
+            elif 'bull' in label:
+                total += 25
+            elif digits:
+                total += int(digits) * (3 if 'triple' in label else 2 if 'double' in label else 1)
+    return total
+
+
+def synthetic_frames(n_frames: int, darts: int, regions: int, seed: int = 0):
+    rng = np.random.RandomState(seed)
+    frames = []
+    for _ in range(n_frames):
+        predictions = [{'label': 'Dartboard', 'confidence': 0.95, 'bbox': [0.0, 0.0, 45.0, 45.0]}]
+        for _ in range(darts):
+            x, y = rng.uniform(5, 40, size=2)
+            predictions.append({'label': 'dart', 'confidence': float(rng.uniform(0.5, 1)), 'bbox': [x, y, 0.5, 0.5]})
+        for _ in range(regions):
+            x, y = rng.uniform(0, 45, size=2)
+            predictions.append({'label': REGION_LABELS[rng.randint(len(REGION_LABELS))],
+                                'confidence': float(rng.uniform(0.3, 1)), 'bbox': [x, y, 2.0, 2.0]})
+        frames.append(predictions)
+    return frames
+
+
+def timed(fn, repeats: int) -> float:
+    best = float('inf')
+    for _ in range(repeats):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def run(args):
+    frames = synthetic_frames(args.frames, args.darts, args.regions)
+    detections = detections_from_predictions(frames)
+    # What the score stage gets: one frame's detections array at a time
+    per_frame = [detections_from_predictions([p]) for p in frames]
+    geometry = BoardGeometry()
+
+    results = {
+        'legacy per-frame loop': timed(lambda: [legacy_calculate_score(p) for p in frames], args.repeats),
+        'calculate_score per frame': timed(lambda: [calculate_score(p) for p in frames], args.repeats),
+        'calculate_score per frame (geo)': timed(
+            lambda: [calculate_score(p, geometry=geometry) for p in frames], args.repeats),
+        'score_batch per frame (app.py)': timed(
+            lambda: [score_batch(d, default_classes, n_frames=1) for d in per_frame], args.repeats),
+        'score_batch per frame (geo, app.py)': timed(
+            lambda: [score_batch(d, default_classes, n_frames=1, geometry=geometry) for d in per_frame], args.repeats),
+        'score_batch (nearest region)': timed(
+            lambda: score_batch(detections, default_classes, n_frames=len(frames)), args.repeats),
+        'score_batch (geometric)': timed(
+            lambda: score_batch(detections, default_classes, n_frames=len(frames), geometry=geometry), args.repeats),
+    }
+
+    logger.info(f"{args.frames} frames, {args.darts} darts and {args.regions} regions per frame")
+    for name, seconds in results.items():
+        logger.info(f"{name:36s} {seconds / args.frames * 1e6:10.1f} us/frame")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--frames', type=int, default=1000)
+    parser.add_argument('--darts', type=int, default=3)
+    parser.add_argument('--regions', type=int, default=20)
+    parser.add_argument('--repeats', type=int, default=3)
+
+    args = parser.parse_args()
+    run(args)
@@ -0,0 +1,492 @@
+"""End-to-end benchmark of the camera vision pipeline.
+
+Drives capture -> calibrate/crop -> infer -> post-process -> score ->
+encode -> emit through the same CameraPipeline, batch scheduler and
+scoring code the server uses, on synthetic frames or a recording made with
+utils/recording.py. For every configuration in the grid it reports per-stage
+and end-to-end latency percentiles, throughput, CPU and memory, and writes
+everything to a JSON file that can be compared against a previous run.
+
+Run from the backend directory:
+
+    python -m benchmarks.pipeline_bench --backends synthetic torch --imgsz 416 640 \
+        --cameras 1 3 --gating on off --seconds 10 --out bench.json
+
+`synthetic` replaces the model with a fixed-cost stand-in so everything
+around inference can be measured without weights. Pass --baseline with an
+earlier output file to print the change per configuration.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import itertools
+import logging
+import platform
+import resource
+import subprocess
+import threading
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+import cv2
+import numpy as np
+
+from utils.batch_inference import BatchInferenceScheduler
+from utils.calibration import BoardCalibrator
+from utils.camera import CameraManager
+from utils.frame_encoding import FrameEncoder, negotiate_tier
+from utils.inference_backends import Detections, load_backend
+from utils.motion import MotionGate
+from utils.pipeline import CameraPipeline, FramePacket
+from utils.recording import Recording
+from utils.roi import BoardCropper
+from src.scoring.board_geometry import BoardGeometry, PixelScoringLUT
+from src.scoring.dartboard_scoring import (ClassTable, detections_from_boxes, predictions_from_detections,
+                                           score_batch)
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+STAGES = ['read', 'calibrate', 'infer', 'postprocess', 'score', 'encode', 'emit']
+SYNTHETIC_NAMES = {0: 'dartboard', 1: 'dart', 2: 'triple20', 3: 'single20'}
+
+
+class SyntheticCapture:
+    """cv2.VideoCapture stand-in drawing a board with a dart that moves every few frames.
+
+    The dart is drawn at a realistic size and in a colour that contrasts with
+    the board under it, so each move is a change MotionGate notices at its
+    default thumbnail size and threshold; gated runs then infer on every
+    move (plus settle frames) rather than only on keep-alives.
+    """
+
+    def __init__(self, camera_idx: int, width: int = 1280, height: int = 720, fps: float = 30.0,
+                 change_every: int = 15):
+        self.camera_idx = camera_idx
+        self.fps = fps
+        self.change_every = change_every
+        self.position = 0
+        self._next = None
+        self.board = np.full((height, width, 3), 40, dtype=np.uint8)
+        self.center = (width // 2, height // 2)
+        self.radius = int(min(width, height) * 0.4)
+        for fraction, color in ((1.0, (30, 30, 200)), (0.95, (20, 20, 20)), (0.63, (30, 160, 30)),
+                                (0.58, (220, 220, 220)), (0.1, (30, 160, 30)), (0.04, (30, 30, 200))):
+            cv2.circle(self.board, self.center, int(self.radius * fraction), color, -1)
+        self._frame = self.board
+
+    def isOpened(self) -> bool:
+        return True
+
+    def grab(self) -> bool:
+        # Pace like a real sensor
+        now = time.monotonic()
+        if self._next is not None and now < self._next:
+            time.sleep(self._next - now)
+        self._next = max(now, self._next or now) + 1.0 / self.fps
+        if self.position % self.change_every == 0:
+            rng = np.random.RandomState(self.position + self.camera_idx)
+            self._frame = self._draw_dart(rng)
+        self.position += 1
+        return True
+
+    def _draw_dart(self, rng: np.random.RandomState) -> np.ndarray:
+        frame = self.board.copy()
+        x, y = (np.array(self.center) + rng.randint(-self.radius // 2, self.radius // 2, size=2)).tolist()
+        # Shaft from the tip up to the flight, about a third of the board radius
+        length = self.radius // 3
+        fx, fy, size = x + length, y - length // 2, max(8, self.radius // 12)
+        color = (0, 0, 0) if self.board[fy - size:fy + size, fx - size:fx + size].mean() > 127 else (255, 255, 255)
+        cv2.line(frame, (x, y), (fx, fy), color, max(4, self.radius // 40))
+        cv2.rectangle(frame, (fx - size, fy - size), (fx + size, fy + size), color, -1)
+        return frame
+
+    def retrieve(self):
+        return True, self._frame.copy()
+
+    def read(self):
+        self.grab()
+        return self.retrieve()
+
+    def set(self, prop_id, value) -> bool:
+        return False
+
+    def get(self, prop_id) -> float:
+        return 0.0
+
+    def release(self):
+        pass
+
+
+class SyntheticDetector:
+    """Fixed-cost model stand-in returning a board, a dart and two regions per frame"""
+
+    names = SYNTHETIC_NAMES
+
+    def __init__(self, latency_ms: float = 0.0):
+        self.latency = latency_ms / 1000.0
+
+    def detect(self, frames: List[np.ndarray]) -> List[Detections]:
+        if self.latency:
+            time.sleep(self.latency * len(frames))
+        results = []
+        for frame in frames:
+            h, w = frame.shape[:2]
+            cx, cy = w / 2, h / 2
+            results.append(Detections(
+                xywh=np.array([[cx, cy, w * 0.8, h * 0.8], [cx, cy - h * 0.2, 8, 8],
+                               [cx, cy - h * 0.2, 20, 10], [cx, cy - h * 0.3, 20, 20]], dtype=np.float32),
+                cls=np.array([0, 1, 2, 3], dtype=np.int32),
+                conf=np.array([0.95, 0.9, 0.8, 0.8], dtype=np.float32)))
+        return results
+
+
+class StageRecorder:
+    """Collects per-frame stage timings; a frame's timings live in packet.extras"""
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+        self.emitted_per_camera: Dict[int, int] = defaultdict(int)
+        self.gated = 0
+        self.recording = False
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def mark(packet: FramePacket, stage: str, seconds: float):
+        packet.extras.setdefault('timings', {})[stage] = seconds
+
+    def finish(self, packet: FramePacket, now: float):
+        if not self.recording:
+            return
+        with self._lock:
+            self.emitted_per_camera[packet.camera_idx] += 1
+            if packet.extras.get('inference_skipped'):
+                self.gated += 1
+            for stage, seconds in packet.extras.get('timings', {}).items():
+                self.samples[stage].append(seconds)
+            self.samples['end_to_end'].append(now - packet.timestamp)
+
+
+def percentiles(samples: List[float]) -> Optional[dict]:
+    if not samples:
+        return None
+    values = np.asarray(samples) * 1000
+    return {
+        'count': int(values.size),
+        'mean': float(values.mean()),
+        'p50': float(np.percentile(values, 50)),
+        'p95': float(np.percentile(values, 95)),
+        'p99': float(np.percentile(values, 99)),
+    }
+
+
+def rss_mb() -> float:
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return 0.0
+
+
+def build_detector(args, backend: str, imgsz: int):
+    if backend == 'synthetic':
+        return SyntheticDetector(args.synthetic_latency)
+    return load_backend(backend, os.path.dirname(args.weights), imgsz=imgsz)
+
+
+def run_config(args, backend: str, imgsz: int, n_cameras: int, gating: bool, detector) -> dict:
+    recorder = StageRecorder()
+    classes = ClassTable.from_names(detector.names)
+    geometry = BoardGeometry()
+    cropper = BoardCropper(input_size=imgsz)
+    encoder = FrameEncoder()
+    tier = negotiate_tier({'quality': args.quality})
+
+    if args.replay:
+        recording = Recording(args.replay, realtime=not args.fast, loop=True)
+        indices = recording.camera_indices[:n_cameras]
+        factory = recording.capture
+    else:
+        indices = list(range(n_cameras))
+        factory = lambda idx: SyntheticCapture(idx, args.width, args.height, args.fps, args.change_every)
+    manager = CameraManager(indices, capture_factory=factory)
+
+    calibrators: Dict[int, BoardCalibrator] = {}
+    luts: Dict[int, PixelScoringLUT] = {}
+    for idx in indices:
+        calibrator = calibrators[idx] = BoardCalibrator()
+        _, frame = manager.cameras[idx].read()
+        if not calibrator.detect_board_automatically(frame):
+            # Fall back to a centered square the size of the frame height
+            h, w = frame.shape[:2]
+            side = int(h * 0.9)
+            x, y = (w - side) // 2, (h - side) // 2
+            calibrator.set_reference_points([(x, y), (x + side, y), (x + side, y + side), (x, y + side)])
+        luts[idx] = PixelScoringLUT(geometry, calibrator, frame.shape[1], frame.shape[0])
+
+    def prepare(packet: FramePacket) -> np.ndarray:
+        started = time.perf_counter()
+        if args.roi:
+            image, packet.extras['crop'] = cropper.crop(packet.frame, calibrators[packet.camera_idx].get_board_roi())
+        else:
+            image = calibrators[packet.camera_idx].calibrate_frame(packet.frame)
+            packet.extras['calibrated'] = image
+        recorder.mark(packet, 'calibrate', time.perf_counter() - started)
+        return image
+
+    def unpack(packet: FramePacket, result: Detections) -> FramePacket:
+        recorder.mark(packet, 'infer', packet.extras.get('inference_time', 0.0))
+        started = time.perf_counter()
+        boxes = result.xywh
+        crop = packet.extras.get('crop')
+        if crop is not None:
+            boxes = crop.to_frame(boxes)
+        packet.detections = detections_from_boxes(boxes, result.cls, result.conf,
+                                                  camera=packet.camera_idx, timestamp=packet.timestamp)
+        recorder.mark(packet, 'postprocess', time.perf_counter() - started)
+        return packet
+
+    def score(packet: FramePacket) -> FramePacket:
+        started = time.perf_counter()
+        if args.roi:
+            packet.score = score_batch(packet.detections, classes, n_frames=1, lut=luts[packet.camera_idx])
+        else:
+            packet.score = score_batch(packet.detections, classes, n_frames=1, geometry=geometry)
+        recorder.mark(packet, 'score', time.perf_counter() - started)
+        return packet
+
+    def emit(packet: FramePacket):
+        started = time.perf_counter()
+        frame = packet.frame if args.roi else packet.extras.get('calibrated', packet.frame)
+        image = encoder.encode(frame, tier)
+        encoded = time.perf_counter()
+        recorder.mark(packet, 'encode', encoded - started)
+        predictions, score = [], None
+        if packet.detections is not None:
+            predictions = predictions_from_detections(packet.detections, classes)
+            score = packet.score.to_dict(packet.detections, classes)
+        # What Socket.IO does per client: JSON for the fields, bytes as an attachment
+        payload = json.dumps({
+            'camera_idx': packet.camera_idx,
+            'seq': packet.seq,
+            'capture_timestamp': packet.timestamp,
+            'predictions': predictions,
+            'score': score,
+            'inference_skipped': packet.extras.get('inference_skipped', False)
+        })
+        for _ in range(args.subscribers):
+            _ = payload.encode('utf-8') + image.data
+        now = time.perf_counter()
+        recorder.mark(packet, 'emit', now - encoded)
+        recorder.finish(packet, time.monotonic())
+
+    scheduler = BatchInferenceScheduler(run_batch=detector.detect, prepare=prepare, unpack=unpack,
+                                        max_batch_wait=args.max_batch_wait)
+
+    # Grab to hand-off per camera: retrieve/decode plus waiting on the sync
+    # loop; the gate runs on the capture thread right after, so it attaches
+    # the value to the packet it belongs to
+    read_times: Dict[int, float] = {}
+
+    def make_reader(idx):
+        read = manager.reader(idx)
+
+        def timed_read():
+            captured = read()
+            if captured is not None:
+                read_times[idx] = time.monotonic() - captured[1]
+            return captured
+        return timed_read
+
+    gates: Dict[int, MotionGate] = {}
+
+    def make_gate(idx):
+        gate = gates[idx] = MotionGate()
+
+        def should_infer(packet: FramePacket) -> bool:
+            recorder.mark(packet, 'read', read_times.get(idx, 0.0))
+            return gate.should_infer(packet.frame, calibrators[idx].get_board_roi(), packet.timestamp)
+        return should_infer
+
+    def mark_read(idx):
+        def always(packet: FramePacket) -> bool:
+            recorder.mark(packet, 'read', read_times.get(idx, 0.0))
+            return True
+        return always
+
+    pipelines = []
+    for idx in indices:
+        manager.set_active(idx, True)
+        pipelines.append(CameraPipeline(
+            idx,
+            read_frame=make_reader(idx),
+            infer=None,
+            score=score,
+            emit=emit,
+            scheduler=scheduler,
+            gate=make_gate(idx) if gating else mark_read(idx)
+        ))
+
+    manager.start_sync()
+    scheduler.start()
+    for pipeline in pipelines:
+        pipeline.start()
+
+    time.sleep(args.warmup)
+    usage_before = resource.getrusage(resource.RUSAGE_SELF)
+    wall_before = time.monotonic()
+    recorder.recording = True
+    time.sleep(args.seconds)
+    recorder.recording = False
+    wall = time.monotonic() - wall_before
+    usage_after = resource.getrusage(resource.RUSAGE_SELF)
+
+    for pipeline in pipelines:
+        pipeline.stop()
+    for pipeline in pipelines:
+        pipeline.join(timeout=3.0)
+    scheduler.stop()
+    manager.release_all()
+
+    cpu_seconds = (usage_after.ru_utime - usage_before.ru_utime) + (usage_after.ru_stime - usage_before.ru_stime)
+    emitted = sum(recorder.emitted_per_camera.values())
+    return {
+        'config': {
+            'backend': backend,
+            'imgsz': imgsz,
+            'cameras': len(indices),
+            'motion_gating': gating,
+            'roi': args.roi,
+            'source': args.replay or f'synthetic {args.width}x{args.height}@{args.fps}',
+            'subscribers': args.subscribers,
+            'quality': args.quality,
+        },
+        'seconds': wall,
+        'frames_emitted': emitted,
+        'throughput_fps': emitted / wall if wall else 0.0,
+        'per_camera_fps': {idx: count / wall for idx, count in recorder.emitted_per_camera.items()},
+        'gated_ratio': recorder.gated / emitted if emitted else 0.0,
+        # Frames the gate let through because the board changed vs keep-alives;
+        # counted over warm-up too
+        'gate': {idx: gate.stats() for idx, gate in gates.items()},
+        'stage_samples': {stage: len(recorder.samples.get(stage, [])) for stage in STAGES},
+        'latency_ms': {stage: percentiles(recorder.samples.get(stage, [])) for stage in STAGES},
+        'end_to_end_ms': percentiles(recorder.samples.get('end_to_end', [])),
+        'batches': scheduler.stats(),
+        'dropped': {pipeline.camera_idx: pipeline.stats() for pipeline in pipelines},
+        'cpu_percent': 100.0 * cpu_seconds / wall if wall else 0.0,
+        'rss_mb': rss_mb(),
+        'peak_rss_mb': usage_after.ru_maxrss / 1024,
+    }
+
+
+def environment() -> dict:
+    try:
+        revision = subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        revision = None
+    return {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'git_revision': revision,
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'processor': platform.processor(),
+        'cpu_count': os.cpu_count(),
+        'opencv': cv2.__version__,
+        'numpy': np.__version__,
+    }
+
+
+def _config_key(result: dict) -> tuple:
+    return tuple(sorted(result['config'].items()))
+
+
+def compare(results: List[dict], baseline_path: str, threshold: float) -> bool:
+    """Log the change against a previous run; False if any config regressed past threshold"""
+    with open(baseline_path) as f:
+        baseline = {_config_key(r): r for r in json.load(f)['results']}
+    ok = True
+    for result in results:
+        before = baseline.get(_config_key(result))
+        if before is None or not before['end_to_end_ms'] or not result['end_to_end_ms']:
+            continue
+        p95_change = result['end_to_end_ms']['p95'] / before['end_to_end_ms']['p95'] - 1
+        fps_change = result['throughput_fps'] / before['throughput_fps'] - 1 if before['throughput_fps'] else 0.0
+        regressed = p95_change > threshold or fps_change < -threshold
+        ok &= not regressed
+        logger.info(f"{result['config']['backend']:10s} imgsz={result['config']['imgsz']:<4d} "
+                    f"cams={result['config']['cameras']} gating={result['config']['motion_gating']!s:5s} "
+                    f"p95 {p95_change:+.1%}  fps {fps_change:+.1%}{'  REGRESSION' if regressed else ''}")
+    return ok
+
+
+def run(args) -> bool:
+    results = []
+    detectors = {}
+    for backend, imgsz, n_cameras, gating in itertools.product(
+            args.backends, args.imgsz, args.cameras, [g == 'on' for g in args.gating]):
+        if (backend, imgsz) not in detectors:
+            detectors[(backend, imgsz)] = build_detector(args, backend, imgsz)
+        logger.info(f"Running backend={backend} imgsz={imgsz} cameras={n_cameras} gating={gating}")
+        result = run_config(args, backend, imgsz, n_cameras, gating, detectors[(backend, imgsz)])
+        results.append(result)
+
+        e2e = result['end_to_end_ms'] or {}
+        logger.info(f"  {result['throughput_fps']:.1f} fps, end-to-end p50 {e2e.get('p50', 0):.1f} ms "
+                    f"p95 {e2e.get('p95', 0):.1f} ms p99 {e2e.get('p99', 0):.1f} ms, "
+                    f"cpu {result['cpu_percent']:.0f}%, rss {result['rss_mb']:.0f} MB")
+        if gating:
+            changes = sum(stats['changes'] for stats in result['gate'].values())
+            keepalives = sum(stats['keepalives'] for stats in result['gate'].values())
+            logger.info(f"  gate: {result['gated_ratio']:.1%} of frames skipped, "
+                        f"{changes} change triggers, {keepalives} keep-alives")
+            if not changes:
+                logger.warning("  gate never saw a change; the gated latencies only reflect keep-alives")
+        for stage in STAGES:
+            stats = result['latency_ms'][stage]
+            if stats:
+                logger.info(f"    {stage:12s} p50 {stats['p50']:8.2f}  p95 {stats['p95']:8.2f}  p99 {stats['p99']:8.2f} ms"
+                            f"  ({stats['count']} samples)")
+
+    with open(args.out, 'w') as f:
+        json.dump({'environment': environment(), 'results': results}, f, indent=2)
+    logger.info(f"Results written to {args.out}")
+
+    if args.baseline:
+        return compare(results, args.baseline, args.regression_threshold)
+    return True
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--backends', nargs='+', default=['synthetic'],
+                        help="'synthetic' or an inference backend: torch, onnx, onnx-int8, openvino, openvino-int8")
+    parser.add_argument('--weights', type=str, default='Dartopia/model/best/best.pt')
+    parser.add_argument('--imgsz', type=int, nargs='+', default=[640])
+    parser.add_argument('--cameras', type=int, nargs='+', default=[1, 3])
+    parser.add_argument('--gating', nargs='+', choices=['on', 'off'], default=['off', 'on'])
+    parser.add_argument('--roi', action=argparse.BooleanOptionalAction, default=True,
+                        help='board-crop inference (default) or full calibrated frames')
+    parser.add_argument('--replay', type=str, default=None, help='recording directory instead of synthetic frames')
+    parser.add_argument('--fast', action='store_true', help='replay as fast as possible instead of real time')
+    parser.add_argument('--width', type=int, default=1280)
+    parser.add_argument('--height', type=int, default=720)
+    parser.add_argument('--fps', type=float, default=30.0)
+    parser.add_argument('--change-every', type=int, default=15, help='synthetic frames between dart moves')
+    parser.add_argument('--synthetic-latency', type=float, default=15.0, help='ms per frame for the synthetic model')
+    parser.add_argument('--max-batch-wait', type=float, default=0.02)
+    parser.add_argument('--subscribers', type=int, default=1)
+    parser.add_argument('--quality', type=str, default='standard')
+    parser.add_argument('--warmup', type=float, default=2.0)
+    parser.add_argument('--seconds', type=float, default=10.0)
+    parser.add_argument('--out', type=str, default='pipeline_bench.json')
+    parser.add_argument('--baseline', type=str, default=None, help='earlier output file to compare against')
+    parser.add_argument('--regression-threshold', type=float, default=0.1)
+
+    args = parser.parse_args()
+    sys.exit(0 if run(args) else 1)
@@ -0,0 +1,208 @@
+"""Export the dart detector for CPU runtimes and check it against PyTorch.
+
+Writes each requested format next to the .pt weights, under the names
+utils.inference_backends expects, then runs the PyTorch model and every
+export over a set of validation images. An export fails validation when
+too many of its detections have no PyTorch counterpart of the same class
+within the IoU and confidence tolerances. Latencies are reported per
+backend so the fastest one that passes can be picked for the server with
+DARTOPIA_INFERENCE_BACKEND.
+
+    python export_model.py --weights Dartopia/model/best/best.pt \
+        --formats onnx openvino openvino-int8 --data data.yaml --images path/to/val/images
+"""
+import os
+import sys
+import glob
+import json
+import time
+import shutil
+import argparse
+import logging
+
+import cv2
+import numpy as np
+from ultralytics import YOLO
+
+from utils.inference_backends import BACKEND_WEIGHTS, InferenceBackend, resolve_weights
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMATS = [name for name in BACKEND_WEIGHTS if name != 'torch']
+
+
+def export(weights: str, backend: str, imgsz: int, data: str = None) -> str:
+    """Export one backend and move it to the path load_backend() looks for"""
+    model_dir = os.path.dirname(weights)
+    target = resolve_weights(backend, model_dir)
+
+    if backend == 'onnx-int8':
+        # Dynamic int8 quantization of the fp32 ONNX graph; needs no calibration data
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        fp32 = resolve_weights('onnx', model_dir)
+        if not os.path.exists(fp32):
+            export(weights, 'onnx', imgsz)
+        quantize_dynamic(fp32, target, weight_type=QuantType.QInt8)
+        return target
+
+    fmt = backend.split('-')[0]
+    options = {'format': fmt, 'imgsz': imgsz, 'dynamic': True}
+    if backend.endswith('-int8'):
+        if not data:
+            raise ValueError(f"{backend} export needs --data for int8 calibration images")
+        options.update(int8=True, data=data)
+    elif fmt == 'onnx':
+        options['simplify'] = True
+
+    exported = YOLO(weights).export(**options)
+    if os.path.abspath(exported) != os.path.abspath(target):
+        if os.path.exists(target):
+            shutil.rmtree(target) if os.path.isdir(target) else os.remove(target)
+        shutil.move(exported, target)
+    return target
+
+
+def _iou(box: np.ndarray, boxes: np.ndarray) -> np.ndarray:
+    """IoU of one xyxy box against (N, 4) xyxy boxes"""
+    x1 = np.maximum(box[0], boxes[:, 0])
+    y1 = np.maximum(box[1], boxes[:, 1])
+    x2 = np.minimum(box[2], boxes[:, 2])
+    y2 = np.minimum(box[3], boxes[:, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area = (box[2] - box[0]) * (box[3] - box[1])
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    return inter / np.maximum(area + areas - inter, 1e-9)
+
+
+def _detections(result):
+    boxes = result.boxes
+    return boxes.xyxy.cpu().numpy(), boxes.cls.cpu().numpy().astype(int), boxes.conf.cpu().numpy()
+
+
+def compare(reference, candidate, iou_threshold: float, conf_tolerance: float) -> dict:
+    """Greedily match candidate detections to the reference of the same class"""
+    ref_xyxy, ref_cls, ref_conf = _detections(reference)
+    cand_xyxy, cand_cls, cand_conf = _detections(candidate)
+
+    used = np.zeros(len(ref_cls), dtype=bool)
+    matched, conf_diffs = 0, []
+    for i in np.argsort(-cand_conf):
+        pool = np.flatnonzero(~used & (ref_cls == cand_cls[i]))
+        if pool.size == 0:
+            continue
+        ious = _iou(cand_xyxy[i], ref_xyxy[pool])
+        best = int(np.argmax(ious))
+        if ious[best] < iou_threshold:
+            continue
+        j = pool[best]
+        diff = abs(float(cand_conf[i]) - float(ref_conf[j]))
+        if diff > conf_tolerance:
+            continue
+        used[j] = True
+        matched += 1
+        conf_diffs.append(diff)
+
+    return {
+        'reference': len(ref_cls),
+        'candidate': len(cand_cls),
+        'matched': matched,
+        'conf_diffs': conf_diffs
+    }
+
+
+def time_backend(backend: InferenceBackend, images, warmup: int = 3):
+    """Per-image results and latencies in milliseconds"""
+    for image in images[:warmup]:
+        backend([image])
+    results, latencies = [], []
+    for image in images:
+        started = time.perf_counter()
+        results.append(backend([image])[0])
+        latencies.append((time.perf_counter() - started) * 1000)
+    return results, np.array(latencies)
+
+
+def load_images(pattern: str, limit: int):
+    paths = sorted(glob.glob(os.path.join(pattern, '*')) if os.path.isdir(pattern) else glob.glob(pattern))
+    images = [cv2.imread(path) for path in paths[:limit]]
+    return [image for image in images if image is not None]
+
+
+def run(args) -> bool:
+    model_dir = os.path.dirname(args.weights)
+    for backend in args.formats:
+        logger.info(f"Exporting {backend}")
+        logger.info(f"Wrote {export(args.weights, backend, args.imgsz, args.data)}")
+
+    if not args.images:
+        return True
+    images = load_images(args.images, args.limit)
+    if not images:
+        logger.error(f"No images found at {args.images}")
+        return False
+
+    reference = InferenceBackend('torch', args.weights, imgsz=args.imgsz, conf=args.conf)
+    ref_results, ref_latency = time_backend(reference, images)
+    report = {'images': len(images), 'imgsz': args.imgsz, 'backends': {
+        'torch': {'mean_ms': float(ref_latency.mean()), 'p50_ms': float(np.percentile(ref_latency, 50)),
+                  'p95_ms': float(np.percentile(ref_latency, 95)), 'passed': True}
+    }}
+
+    passed = True
+    for name in args.formats:
+        backend = InferenceBackend(name, resolve_weights(name, model_dir), imgsz=args.imgsz, conf=args.conf)
+        results, latency = time_backend(backend, images)
+
+        stats = [compare(ref, cand, args.iou, args.conf_tolerance) for ref, cand in zip(ref_results, results)]
+        total_ref = sum(s['reference'] for s in stats)
+        total_cand = sum(s['candidate'] for s in stats)
+        matched = sum(s['matched'] for s in stats)
+        diffs = [d for s in stats for d in s['conf_diffs']]
+        # Recall and precision against PyTorch; both must clear the bar
+        recall = matched / total_ref if total_ref else 1.0
+        precision = matched / total_cand if total_cand else 1.0
+        ok = min(recall, precision) >= args.min_match
+
+        report['backends'][name] = {
+            'mean_ms': float(latency.mean()),
+            'p50_ms': float(np.percentile(latency, 50)),
+            'p95_ms': float(np.percentile(latency, 95)),
+            'speedup': float(ref_latency.mean() / latency.mean()),
+            'recall': recall,
+            'precision': precision,
+            'max_conf_diff': float(max(diffs)) if diffs else 0.0,
+            'passed': ok
+        }
+        passed &= ok
+
+    logger.info(f"{'backend':16s} {'mean ms':>9s} {'p95 ms':>9s} {'speedup':>8s} {'recall':>7s} {'prec':>7s}")
+    for name, row in report['backends'].items():
+        logger.info(f"{name:16s} {row['mean_ms']:9.1f} {row['p95_ms']:9.1f} {row.get('speedup', 1.0):8.2f} "
+                    f"{row.get('recall', 1.0):7.3f} {row.get('precision', 1.0):7.3f}"
+                    f"{'' if row['passed'] else '  FAILED'}")
+
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(report, f, indent=2)
+        logger.info(f"Report written to {args.report}")
+    return passed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--weights', type=str, default='Dartopia/model/best/best.pt')
+    parser.add_argument('--formats', nargs='+', choices=EXPORT_FORMATS, default=['onnx', 'openvino'])
+    parser.add_argument('--imgsz', type=int, default=640)
+    parser.add_argument('--data', type=str, default=None, help='dataset yaml, used for int8 calibration')
+    parser.add_argument('--images', type=str, default=None, help='validation image directory or glob')
+    parser.add_argument('--limit', type=int, default=200)
+    parser.add_argument('--conf', type=float, default=0.5)
+    parser.add_argument('--iou', type=float, default=0.9, help='minimum IoU with the PyTorch box')
+    parser.add_argument('--conf-tolerance', type=float, default=0.05)
+    parser.add_argument('--min-match', type=float, default=0.95)
+    parser.add_argument('--report', type=str, default='export_report.json')
+
+    args = parser.parse_args()
+    sys.exit(0 if run(args) else 1)
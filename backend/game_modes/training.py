@@ -3,6 +3,8 @@ from typing import List, Optional
 import numpy as np
 from datetime import datetime
 
+from src.scoring.regions import as_region_code, hits_target, region_name
+
 class TrainingTarget(Enum):
     DOUBLES = "doubles"
     TRIPLES = "triples"
@@ -60,8 +62,9 @@ class TrainingMode:
 
     def _analyze_throw(self, prediction_data: dict) -> dict:
         """Convert YOLO predictions to throw analysis"""
-        # Extract the detected region and score from prediction_data
-        detected_region = prediction_data.get("region", "")
+        # Extract the detected region and score from prediction_data; the
+        # region may come as a region code or a label
+        detected_region = as_region_code(prediction_data.get("region"))
         detected_score = prediction_data.get("score", 0)
         confidence = prediction_data.get("confidence", 0.0)
         
@@ -74,27 +77,19 @@ class TrainingMode:
         return {
             "timestamp": datetime.now(),
             "target": self.current_target,
-            "detected_region": detected_region,
+            "detected_region": region_name(detected_region),
+            "region_code": detected_region,
             "score": detected_score,
             "confidence": confidence,
             "hit": hit,
             "deviation": deviation
         }
 
-    def _check_hit(self, detected: str, target: str) -> bool:
-        """Check if the detected region matches the target"""
-        # Handle special cases (doubles, triples, bull)
-        if target.startswith('D') and 'double' in detected.lower():
-            return str(target[1:]) in detected
-        if target.startswith('T') and 'triple' in detected.lower():
-            return str(target[1:]) in detected
-        if target == "50" and ('bulls_eye' in detected.lower() or 'bullseye' in detected.lower()):
-            return True
-        if target == "25" and 'bull' in detected.lower():
-            return True
-        return target in detected
+    def _check_hit(self, detected: int, target: str) -> bool:
+        """Check if the detected region code matches the target ('D16', 'T20', '50', '20', ...)"""
+        return hits_target(detected, target)
 
-    def _calculate_deviation(self, detected: str, target: str) -> dict:
+    def _calculate_deviation(self, detected: int, target: str) -> dict:
         """Calculate how far the throw was from the target"""
         # This is a simplified version - you might want to enhance this based on
         # actual coordinate data from your detection system
@@ -103,12 +98,12 @@ class TrainingMode:
             "angular": self._estimate_angular_deviation(detected, target)
         }
 
-    def _estimate_radial_deviation(self, detected: str, target: str) -> float:
+    def _estimate_radial_deviation(self, detected: int, target: str) -> float:
         # Implement based on your coordinate system
         # This is a placeholder implementation
         return 0.0
 
-    def _estimate_angular_deviation(self, detected: str, target: str) -> float:
+    def _estimate_angular_deviation(self, detected: int, target: str) -> float:
         # Implement based on your coordinate system
         # This is a placeholder implementation
         return 0.0
@@ -3,6 +3,11 @@ from typing import Dict, Set
 from dataclasses import dataclass
 from datetime import datetime
 
+from utils.metrics import histogram, timed
+
+PROCESS_THROW_SECONDS = histogram('dartopia_game_process_throw_seconds',
+                                  'Time to apply a multiplayer throw and broadcast the room update')
+
 @dataclass
 class Player:
     id: str
@@ -73,6 +78,7 @@ class GameServer:
             return True
         return False
         
+    @timed(PROCESS_THROW_SECONDS)
     async def process_throw(self, player_id: str, throw_data: Dict):
         player = self.players.get(player_id)
         if not player or not player.room:
@@ -4,6 +4,8 @@ import os
 from typing import Dict, List, Optional
 import numpy as np
 
+from src.scoring.regions import REGION_RING, RING_DOUBLE, as_region_code, region_name
+
 class PlayerProfile:
     def __init__(self, player_id: str, name: str):
         self.player_id = player_id
@@ -40,8 +42,9 @@ class PlayerProfile:
             
         # Update preferred doubles
         for throw in game_data['throws']:
-            if 'double' in throw['region'].lower():
-                region = throw['region']
+            code = as_region_code(throw['region'])
+            if REGION_RING[code] == RING_DOUBLE:
+                region = region_name(code)
                 self.stats['preferred_doubles'][region] = \
                     self.stats['preferred_doubles'].get(region, 0) + 1
 
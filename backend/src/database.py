@@ -1,10 +1,33 @@
+import time
+
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from utils.metrics import histogram
 
 db = SQLAlchemy()
 
+COMMIT_SECONDS = histogram('dartopia_db_commit_seconds', 'Duration of database commits, flush included')
+
 def init_db(app):
     app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///darts.db'
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
     db.init_app(app)
     with app.app_context():
         db.create_all()
+
+# Listeners on the Session class apply to every session, Flask-SQLAlchemy's included
+@event.listens_for(Session, 'before_commit')
+def _commit_started(session):
+    session.info['commit_started'] = time.perf_counter()
+
+@event.listens_for(Session, 'after_commit')
+def _commit_finished(session):
+    started = session.info.pop('commit_started', None)
+    if started is not None:
+        COMMIT_SECONDS.observe(time.perf_counter() - started)
+
+@event.listens_for(Session, 'after_rollback')
+def _commit_failed(session):
+    session.info.pop('commit_started', None)
@@ -0,0 +1,108 @@
+import numpy as np
+from typing import Tuple
+
+from .regions import BULL_SEGMENT
+
+# Segment numbers clockwise from the top of the board
+SEGMENT_ORDER = np.array([20, 1, 18, 4, 13, 6, 10, 15, 2, 17, 3, 19, 7, 16, 8, 11, 14, 9, 12, 5], dtype=np.uint8)
+
+# Standard (WDF) ring radii in mm, measured from the board center
+INNER_BULL_RADIUS = 6.35
+OUTER_BULL_RADIUS = 15.9
+TRIPLE_INNER_RADIUS = 99.0
+TRIPLE_OUTER_RADIUS = 107.0
+DOUBLE_INNER_RADIUS = 162.0
+DOUBLE_OUTER_RADIUS = 170.0
+
+
+class BoardGeometry:
+    """Scores positions on a calibrated board from ring radii and segment angles.
+
+    Positions are given in the calibrated board space of BoardCalibrator
+    (cm, y pointing down, board centered in the board_dimensions square).
+    Ring and segment lookups are precomputed into polar bins, so scoring any
+    number of points is a couple of vectorized array lookups.
+    """
+
+    def __init__(self,
+                 center: Tuple[float, float] = (22.5, 22.5),
+                 units_per_mm: float = 0.1,
+                 rotation_deg: float = 0.0,
+                 radial_resolution_mm: float = 0.25,
+                 angular_bins: int = 3600):
+        self.center = np.asarray(center, dtype=np.float64)
+        self.units_per_mm = units_per_mm
+        self.rotation_deg = rotation_deg
+        self.radial_resolution_mm = radial_resolution_mm
+        self.angular_bins = angular_bins
+        self._build_polar_tables()
+
+    def _build_polar_tables(self):
+        # Radial bins -> multiplier (0 miss, 1 single, 2 double, 3 triple);
+        # bull bins get segment 25 with multiplier 1 (outer) or 2 (inner)
+        radii = (np.arange(int(DOUBLE_OUTER_RADIUS / self.radial_resolution_mm) + 2) + 0.5) * self.radial_resolution_mm
+        multiplier = np.ones(radii.size, dtype=np.uint8)
+        multiplier[(radii >= TRIPLE_INNER_RADIUS) & (radii < TRIPLE_OUTER_RADIUS)] = 3
+        multiplier[(radii >= DOUBLE_INNER_RADIUS) & (radii < DOUBLE_OUTER_RADIUS)] = 2
+        multiplier[radii >= DOUBLE_OUTER_RADIUS] = 0
+        multiplier[radii < OUTER_BULL_RADIUS] = 1
+        multiplier[radii < INNER_BULL_RADIUS] = 2
+        self._radial_multiplier = multiplier
+        self._radial_bull = radii < OUTER_BULL_RADIUS
+
+        # Angular bins -> segment number; 20 is centered straight up
+        angles = (np.arange(self.angular_bins) + 0.5) * (360.0 / self.angular_bins)
+        index = np.floor(((90.0 - angles + 9.0) % 360.0) / 18.0).astype(np.int64) % 20
+        self._angular_segment = SEGMENT_ORDER[index]
+
+    def to_polar(self, board_xy: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Board coordinates -> (radius in mm, angle in degrees counter-clockwise from 3 o'clock)"""
+        offset = np.asarray(board_xy, dtype=np.float64).reshape(-1, 2) - self.center
+        radius = np.hypot(offset[:, 0], offset[:, 1]) / self.units_per_mm
+        # Image y points down, so flip it for a conventional angle
+        angle = (np.degrees(np.arctan2(-offset[:, 1], offset[:, 0])) + self.rotation_deg) % 360.0
+        return radius, angle
+
+    def score_polar(self, radius: np.ndarray, angle: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Vectorized (segment, multiplier) lookup; misses are (0, 0)"""
+        radial_bin = np.minimum((np.asarray(radius) / self.radial_resolution_mm).astype(np.int64),
+                                self._radial_multiplier.size - 1)
+        angular_bin = (np.asarray(angle) * (self.angular_bins / 360.0)).astype(np.int64) % self.angular_bins
+
+        multiplier = self._radial_multiplier[radial_bin]
+        segment = np.where(self._radial_bull[radial_bin], BULL_SEGMENT, self._angular_segment[angular_bin]).astype(np.uint8)
+        segment[multiplier == 0] = 0
+        return segment, multiplier
+
+    def score_points(self, board_xy: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        return self.score_polar(*self.to_polar(board_xy))
+
+
+class PixelScoringLUT:
+    """Per-camera table of segment and multiplier for every frame pixel.
+
+    Built once per calibration by pushing the whole pixel grid through the
+    calibrator, after which scoring a dart tip is a single array index.
+    """
+
+    def __init__(self, geometry: BoardGeometry, calibrator, width: int, height: int):
+        self.width = width
+        self.height = height
+        xs, ys = np.meshgrid(np.arange(width, dtype=np.float32), np.arange(height, dtype=np.float32))
+        pixels = np.stack([xs.ravel(), ys.ravel()], axis=1)
+        segment, multiplier = geometry.score_points(calibrator.to_board_coordinates(pixels))
+        self.segment = segment.reshape(height, width)
+        self.multiplier = multiplier.reshape(height, width)
+
+    def lookup(self, pixel_xy: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """(segment, multiplier) at each pixel position; off-frame positions are misses"""
+        points = np.asarray(pixel_xy, dtype=np.float64).reshape(-1, 2)
+        x = np.floor(points[:, 0]).astype(np.int64)
+        y = np.floor(points[:, 1]).astype(np.int64)
+        inside = (x >= 0) & (x < self.width) & (y >= 0) & (y < self.height)
+
+        segment = np.zeros(points.shape[0], dtype=np.uint8)
+        multiplier = np.zeros(points.shape[0], dtype=np.uint8)
+        segment[inside] = self.segment[y[inside], x[inside]]
+        multiplier[inside] = self.multiplier[y[inside], x[inside]]
+        return segment, multiplier
@@ -1,39 +1,280 @@
-from typing import List, Dict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence
 import logging
-import re
+
+import numpy as np
+
+from .regions import MISS, REGION_MULTIPLIER, REGION_NAMES, REGION_SEGMENT, parse_region, region_code
 
 logger = logging.getLogger(__name__)
 
-def calculate_score(predictions: List[dict]) -> dict:
-    """Calculate dart score based on predictions from multiple cameras"""
-    if not predictions:
-        return {"total": 0, "details": [], "confidence": 0}
-        
-    score_details = []
-    total_score = 0
-    confidence_sum = 0
-    
-    # Find dartboard for reference
-    dartboard = next(
-        (pred for pred in sorted(
-            (p for p in predictions if 'dartboard' in p['label'].lower()),
-            key=lambda x: x['confidence'],
-            reverse=True
-        )), None)
-    
-    if not dartboard:
-        logger.warning("No dartboard detected in frame")
-        return {"total": 0, "details": [], "confidence": 0}
+# One row per detection. Frames are indexed 0..N-1 within a batch and
+# boxes use the same top-left (x, y, w, h) layout as prediction 'bbox'.
+# This is what flows through the camera pipeline; prediction dicts are only
+# built where detections leave as JSON
+DETECTION_DTYPE = np.dtype([
+    ('frame', np.int32),
+    ('camera', np.int16),
+    ('timestamp', np.float64),  # capture time of the frame, time.monotonic()
+    ('cls', np.int16),
+    ('conf', np.float32),
+    ('x', np.float32),
+    ('y', np.float32),
+    ('w', np.float32),
+    ('h', np.float32),
+])
+
+ROLE_OTHER = 0
+ROLE_DART = 1
+ROLE_BOARD = 2
+ROLE_REGION = 3
+
+def _parse_label(label: str):
+    """Role and region code for a detector class label"""
+    name = label.lower()
+    if 'dartboard' in name or 'dart-board' in name:
+        return ROLE_BOARD, MISS
+    if 'dart' in name:
+        return ROLE_DART, MISS
+    return ROLE_REGION, parse_region(name)
+
+
+class ClassTable:
+    """Per-class lookup arrays, so labels are parsed once instead of per detection.
+
+    `region` maps a class id to its region code; `segment` and `multiplier`
+    are the same codes looked up in the region tables.
+    """
+
+    def __init__(self, names: Optional[Sequence[str]] = None):
+        self.names: List[str] = []
+        self._ids: Dict[str, int] = {}
+        self.role = np.zeros(0, dtype=np.uint8)
+        self.region = np.zeros(0, dtype=np.uint8)
+        self.segment = np.zeros(0, dtype=np.uint8)
+        self.multiplier = np.zeros(0, dtype=np.uint8)
+        for name in names or []:
+            self.intern(name)
+
+    @classmethod
+    def from_names(cls, names) -> 'ClassTable':
+        """Build from a model's names (dict of id -> label, or a list)"""
+        if isinstance(names, dict):
+            names = [names[i] for i in range(len(names))]
+        return cls(names)
+
+    def intern(self, label: str) -> int:
+        class_id = self._ids.get(label)
+        if class_id is None:
+            role, region = _parse_label(label)
+            class_id = self._ids[label] = len(self.names)
+            self.names.append(label)
+            self.role = np.append(self.role, np.uint8(role))
+            self.region = np.append(self.region, np.uint8(region))
+            self.segment = REGION_SEGMENT[self.region]
+            self.multiplier = REGION_MULTIPLIER[self.region]
+        return class_id
+
+    def points(self) -> np.ndarray:
+        return self.segment.astype(np.int32) * self.multiplier
+
+
+# Shared table for callers that only have label strings
+default_classes = ClassTable()
+
+
+@dataclass
+class BatchScore:
+    """Scores for a batch of frames; per-dart arrays are parallel to `dart_index`"""
+    totals: np.ndarray       # (n_frames,) total points per frame
+    dart_index: np.ndarray   # rows of the detections array that are darts
+    segment: np.ndarray
+    multiplier: np.ndarray
+    points: np.ndarray
+    region: np.ndarray       # region codes, see src.scoring.regions
+
+    def frame_rows(self, detections: np.ndarray, frame: int = 0) -> np.ndarray:
+        """Indices into the per-dart arrays of one frame's scoring darts, highest points first"""
+        rows = np.flatnonzero((detections['frame'][self.dart_index] == frame) & (self.points > 0))
+        return rows[np.argsort(-self.points[rows], kind='stable')]
+
+    def frame_details(self, detections: np.ndarray, classes: ClassTable, frame: int) -> List[dict]:
+        """Prediction-style score details for one frame, highest points first"""
+        details = []
+        for i in self.frame_rows(detections, frame):
+            det = detections[self.dart_index[i]]
+            details.append({
+                "label": classes.names[det['cls']],
+                "confidence": float(det['conf']),
+                "location": [float(det['x']), float(det['y']), float(det['w']), float(det['h'])],
+                "points": int(self.points[i]),
+                "region": REGION_NAMES[self.region[i]],
+                "region_code": int(self.region[i]),
+                "segment": int(self.segment[i]),
+                "multiplier": int(self.multiplier[i])
+            })
+        return details
+
+    def to_dict(self, detections: np.ndarray, classes: ClassTable, frame: int = 0) -> dict:
+        """calculate_score-style result for one frame"""
+        details = self.frame_details(detections, classes, frame)
+        return {
+            "total": int(self.totals[frame]) if frame < self.totals.size else 0,
+            "details": details,
+            "confidence": float(np.mean([d["confidence"] for d in details])) if details else 0
+        }
+
+
+def detections_from_predictions(frames: Sequence[List[dict]], classes: ClassTable = default_classes) -> np.ndarray:
+    """Pack per-frame prediction dicts into one structured detections array"""
+    rows = [(frame_idx, 0, 0.0, classes.intern(pred['label']), pred['confidence'], *pred['bbox'])
+            for frame_idx, predictions in enumerate(frames) for pred in predictions]
+    return np.array(rows, dtype=DETECTION_DTYPE)
+
+
+def detections_from_boxes(xywh: np.ndarray, cls: np.ndarray, conf: np.ndarray,
+                          camera: int = 0, timestamp: float = 0.0, frame: int = 0) -> np.ndarray:
+    """Structured detections straight from model output (center x, y, w, h boxes)"""
+    xywh = np.asarray(xywh, dtype=np.float32).reshape(-1, 4)
+    detections = np.empty(xywh.shape[0], dtype=DETECTION_DTYPE)
+    detections['frame'] = frame
+    detections['camera'] = camera
+    detections['timestamp'] = timestamp
+    detections['cls'] = cls
+    detections['conf'] = conf
+    detections['x'] = xywh[:, 0] - xywh[:, 2] / 2
+    detections['y'] = xywh[:, 1] - xywh[:, 3] / 2
+    detections['w'] = xywh[:, 2]
+    detections['h'] = xywh[:, 3]
+    return detections
 
-    # Calculate board reference points
-    board_center_x = dartboard['bbox'][0] + dartboard['bbox'][2]/2
-    board_center_y = dartboard['bbox'][1] + dartboard['bbox'][3]/2
-    board_radius = max(dartboard['bbox'][2], dartboard['bbox'][3])/2
 
-    # Process darts and scoring regions
-    darts = [p for p in predictions if 'dart' in p['label'].lower()]
-    scoring_regions = [p for p in predictions if any(
-        region in p['label'].lower() for region in ['single', 'double', 'triple', 'bull']
-    )]
+def predictions_from_detections(detections: np.ndarray, classes: ClassTable = default_classes) -> List[dict]:
+    """Prediction dicts ({'label', 'confidence', 'bbox'}) for sending detections as JSON"""
+    boxes = np.stack([detections['x'], detections['y'], detections['w'], detections['h']], axis=1).tolist()
+    return [{'label': classes.names[cls], 'confidence': conf, 'bbox': bbox}
+            for cls, conf, bbox in zip(detections['cls'].tolist(), detections['conf'].tolist(), boxes)]
+
+
+def box_centers(detections: np.ndarray) -> np.ndarray:
+    """(N, 2) box centers, used as the dart tip position"""
+    return np.stack([detections['x'] + detections['w'] / 2, detections['y'] + detections['h'] / 2], axis=1)
+
+
+def _nearest_region_frame(detections, roles, classes, dart_index, segment, multiplier):
+    """_nearest_region_scores for a single frame, as the live pipeline scores
+    them; skips the per-frame padding, which costs more than the scoring here"""
+    board_index = np.flatnonzero(roles == ROLE_BOARD)
+    region_index = np.flatnonzero(roles == ROLE_REGION)
+    if board_index.size == 0 or region_index.size == 0:
+        return segment, multiplier
+
+    centers = box_centers(detections)
+    board = board_index[np.argmax(detections['conf'][board_index])]
+    radius = max(detections['w'][board], detections['h'][board]) / 2
+    dart_xy = centers[dart_index]
+    on_board = np.linalg.norm(dart_xy - centers[board], axis=1) <= radius
+
+    dist = np.linalg.norm(dart_xy[:, None, :] - centers[region_index][None, :, :], axis=2)
+    cls = detections['cls'][region_index[np.argmin(dist, axis=1)][on_board]]
+    segment[on_board] = classes.segment[cls]
+    multiplier[on_board] = classes.multiplier[cls]
+    return segment, multiplier
+
+
+def _nearest_region_scores(detections, roles, classes, n_frames, dart_index):
+    """Legacy scoring: nearest detected region to each dart inside the detected board"""
+    segment = np.zeros(dart_index.size, dtype=np.uint8)
+    multiplier = np.zeros(dart_index.size, dtype=np.uint8)
+    if dart_index.size == 0:
+        return segment, multiplier
+    if n_frames == 1:
+        return _nearest_region_frame(detections, roles, classes, dart_index, segment, multiplier)
+
+    frames = detections['frame']
+    centers = box_centers(detections)
+
+    # Highest-confidence board per frame
+    board_index = np.flatnonzero(roles == ROLE_BOARD)
+    board_center = np.full((n_frames, 2), np.nan)
+    board_radius = np.zeros(n_frames)
+    if board_index.size:
+        order = board_index[np.lexsort((-detections['conf'][board_index], frames[board_index]))]
+        board_frames, first = np.unique(frames[order], return_index=True)
+        best = order[first]
+        board_center[board_frames] = centers[best]
+        board_radius[board_frames] = np.maximum(detections['w'][best], detections['h'][best]) / 2
+
+    dart_frames = frames[dart_index]
+    dart_xy = centers[dart_index]
+    on_board = np.linalg.norm(dart_xy - board_center[dart_frames], axis=1) <= board_radius[dart_frames]
+
+    region_index = np.flatnonzero(roles == ROLE_REGION)
+    if region_index.size == 0:
+        return segment, multiplier
+    region_index = region_index[np.argsort(frames[region_index], kind='stable')]
+    region_frames = frames[region_index]
+
+    # Pad each frame's regions into an (n_frames, max_regions) grid so every
+    # dart is compared only against the regions of its own frame
+    counts = np.bincount(region_frames, minlength=n_frames)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    slot = np.arange(region_index.size) - starts[region_frames]
+    padded_xy = np.full((n_frames, counts.max(), 2), np.inf)
+    padded_xy[region_frames, slot] = centers[region_index]
+    padded_cls = np.zeros((n_frames, counts.max()), dtype=detections['cls'].dtype)
+    padded_cls[region_frames, slot] = detections['cls'][region_index]
+
+    dist = np.linalg.norm(dart_xy[:, None, :] - padded_xy[dart_frames], axis=2)
+    nearest = np.argmin(dist, axis=1)
+    found = np.isfinite(dist[np.arange(dart_index.size), nearest]) & on_board
+    cls = padded_cls[dart_frames[found], nearest[found]]
+    segment[found] = classes.segment[cls]
+    multiplier[found] = classes.multiplier[cls]
+    return segment, multiplier
+
+
+def dart_positions(detections: np.ndarray, classes: ClassTable = default_classes):
+    """Tip positions and confidences of the darts in a detections array"""
+    darts = detections[classes.role[detections['cls']] == ROLE_DART] if detections.size else detections
+    return box_centers(darts), darts['conf'].astype(np.float64)
+
+
+def score_batch(detections: np.ndarray,
+                classes: ClassTable = default_classes,
+                n_frames: Optional[int] = None,
+                lut=None,
+                geometry=None) -> BatchScore:
+    """Score every dart in a batch of frames in one call.
+
+    With a PixelScoringLUT (`lut`) dart tips are looked up in camera pixel
+    space; with a BoardGeometry (`geometry`) boxes are taken to already be
+    in calibrated board coordinates. Without either, each dart is given the
+    nearest detected scoring region, as the uncalibrated fallback.
+    """
+    if n_frames is None:
+        n_frames = int(detections['frame'].max()) + 1 if detections.size else 0
+    roles = classes.role[detections['cls']] if detections.size else np.zeros(0, dtype=np.uint8)
+    dart_index = np.flatnonzero(roles == ROLE_DART)
+
+    if lut is not None:
+        segment, multiplier = lut.lookup(box_centers(detections[dart_index]))
+    elif geometry is not None:
+        segment, multiplier = geometry.score_points(box_centers(detections[dart_index]))
+    else:
+        segment, multiplier = _nearest_region_scores(detections, roles, classes, n_frames, dart_index)
+
+    points = segment.astype(np.int32) * multiplier
+    totals = np.bincount(detections['frame'][dart_index], weights=points, minlength=n_frames).astype(np.int32)
+    return BatchScore(totals=totals, dart_index=dart_index, segment=segment, multiplier=multiplier, points=points,
+                      region=region_code(segment, multiplier))
+
+
+def calculate_score(predictions: List[dict], lut=None, geometry=None) -> dict:
+    """Calculate dart score for a single frame of prediction dicts"""
+    if not predictions:
+        return {"total": 0, "details": [], "confidence": 0}
 
-    # ... rest of the calculate_score implementation as provided ...
+    detections = detections_from_predictions([predictions])
+    result = score_batch(detections, default_classes, n_frames=1, lut=lut, geometry=geometry)
+    return result.to_dict(detections, default_classes)
@@ -0,0 +1,129 @@
+"""Canonical board regions as small integer codes.
+
+A region code packs a segment (1-20, 25 for the bull, 0 for a miss) and a
+multiplier (1 single, 2 double or bullseye, 3 triple) into one uint8 as
+segment * 4 + multiplier, with 0 meaning a miss. Everything else about a
+region is a lookup in the REGION_* tables, so scoring, training and
+analytics never parse labels on their hot paths; strings are turned into
+codes once, where they enter, and back into names where they leave.
+"""
+import re
+from functools import lru_cache
+from typing import Optional, Tuple, Union
+
+import numpy as np
+
+BULL_SEGMENT = 25
+MISS = 0
+N_REGIONS = BULL_SEGMENT * 4 + 4
+
+RING_MISS = 0
+RING_SINGLE = 1
+RING_DOUBLE = 2
+RING_TRIPLE = 3
+RING_OUTER_BULL = 4
+RING_INNER_BULL = 5
+
+
+def region_code(segment, multiplier):
+    """Region code(s) for a segment and multiplier; arrays in, uint8 array out"""
+    segment = np.asarray(segment, dtype=np.int32)
+    multiplier = np.asarray(multiplier, dtype=np.int32)
+    code = np.where(multiplier > 0, segment * 4 + multiplier, MISS).astype(np.uint8)
+    return int(code) if code.ndim == 0 else code
+
+
+def _build_tables():
+    segment = np.zeros(N_REGIONS, dtype=np.uint8)
+    multiplier = np.zeros(N_REGIONS, dtype=np.uint8)
+    ring = np.zeros(N_REGIONS, dtype=np.uint8)
+    names = ['outside'] * N_REGIONS
+    for seg in range(1, 21):
+        for mult, (ring_id, prefix) in enumerate(
+                [(RING_SINGLE, 'single'), (RING_DOUBLE, 'double'), (RING_TRIPLE, 'triple')], start=1):
+            code = seg * 4 + mult
+            segment[code], multiplier[code], ring[code] = seg, mult, ring_id
+            names[code] = f"{prefix}_{seg}"
+    for mult, ring_id, name in ((1, RING_OUTER_BULL, 'bull'), (2, RING_INNER_BULL, 'bullseye')):
+        code = BULL_SEGMENT * 4 + mult
+        segment[code], multiplier[code], ring[code] = BULL_SEGMENT, mult, ring_id
+        names[code] = name
+    return segment, multiplier, ring, tuple(names)
+
+
+REGION_SEGMENT, REGION_MULTIPLIER, REGION_RING, REGION_NAMES = _build_tables()
+REGION_POINTS = REGION_SEGMENT.astype(np.int16) * REGION_MULTIPLIER
+# Codes that name a real region; the rest of the 0..N_REGIONS-1 range is unused
+REGION_VALID = REGION_RING > RING_MISS
+
+
+def region_name(code: int) -> str:
+    """Label for a region code in the detector's vocabulary, e.g. 'triple_20'"""
+    return REGION_NAMES[int(code)]
+
+
+_SHORT_FORM = re.compile(r'^([sdt])(\d+)$')
+
+
+@lru_cache(maxsize=None)
+def parse_region(label: str) -> int:
+    """Region code for a label: detector classes ('triple_20', 'bullseye'),
+    short forms ('T20', 'D16', 'S5') or plain numbers ('20', '25', '50')"""
+    name = label.strip().lower()
+    if 'bulls_eye' in name or 'bullseye' in name or name == '50':
+        return region_code(BULL_SEGMENT, 2)
+    if 'bull' in name or name == '25':
+        return region_code(BULL_SEGMENT, 1)
+
+    short = _SHORT_FORM.match(name)
+    if short:
+        segment, multiplier = int(short.group(2)), 'sdt'.index(short.group(1)) + 1
+    else:
+        digits = ''.join(filter(str.isdigit, name))
+        segment = int(digits) if digits else 0
+        multiplier = 3 if 'triple' in name else 2 if 'double' in name else 1
+    if segment == BULL_SEGMENT:
+        return region_code(BULL_SEGMENT, min(multiplier, 2))
+    if not 1 <= segment <= 20:
+        return MISS
+    return region_code(segment, multiplier)
+
+
+def as_region_code(region: Union[int, str, None]) -> int:
+    """Normalize a region given as a code or a label"""
+    if region is None:
+        return MISS
+    if isinstance(region, str):
+        return parse_region(region)
+    return int(region)
+
+
+@lru_cache(maxsize=None)
+def parse_target(target: str) -> Tuple[int, int]:
+    """(segment, multiplier) a training target asks for; multiplier 0 accepts any ring.
+
+    'D16' / 'T20' want that double/treble, '50' the bullseye, 'D25' the bullseye
+    too, and a plain number any ring of its segment ('25' either bull).
+    """
+    name = target.strip().upper()
+    if name == '50':
+        return BULL_SEGMENT, 2
+    if name[:1] in ('D', 'T') and name[1:].isdigit():
+        return int(name[1:]), 2 if name[0] == 'D' else 3
+    if name.isdigit():
+        return int(name), 0
+    code = parse_region(target)
+    return int(REGION_SEGMENT[code]), int(REGION_MULTIPLIER[code])
+
+
+def hits_target(code, target: Optional[str]):
+    """Whether region code(s) hit a training target; vectorized over codes"""
+    if target is None:
+        return False
+    segment, multiplier = parse_target(target)
+    code = np.asarray(code, dtype=np.intp)
+    hit = REGION_SEGMENT[code] == segment
+    if multiplier:
+        hit &= REGION_MULTIPLIER[code] == multiplier
+    hit &= REGION_VALID[code]
+    return bool(hit) if hit.ndim == 0 else hit
@@ -0,0 +1,38 @@
+from analytics.dart_tracker import DartTracker, ThrowEventType
+from src.scoring.regions import parse_region
+
+def feed(tracker, frames, start=0.0, step=0.1):
+    events = []
+    for i, darts in enumerate(frames):
+        positions = [d[0] for d in darts]
+        events += tracker.update(positions, [d[1] for d in darts], [d[2] for d in darts],
+                                 [0.9] * len(darts), timestamp=start + i * step)
+    return events
+
+def test_dart_in_board_is_reported_once():
+    """Test that a dart sitting in the board for many frames lands only once"""
+    tracker = DartTracker()
+    dart = ((10.0, 10.0), 60, parse_region('triple_20'))
+    events = feed(tracker, [[dart]] * 30)
+    assert [e.type for e in events] == [ThrowEventType.DART_LANDED]
+    assert events[0].points == 60
+
+def test_turn_complete_and_darts_removed():
+    """Test the landed -> turn complete -> removed sequence for a full turn"""
+    tracker = DartTracker()
+    first = ((10.0, 10.0), 60, parse_region('triple_20'))
+    second = ((20.0, 20.0), 20, parse_region('single_20'))
+    third = ((30.0, 30.0), 50, parse_region('bullseye'))
+    frames = [[first]] * 5 + [[first, second]] * 5 + [[first, second, third]] * 5 + [[]] * 15
+    events = feed(tracker, frames)
+
+    types = [e.type for e in events]
+    assert types == [ThrowEventType.DART_LANDED] * 3 + [ThrowEventType.TURN_COMPLETE, ThrowEventType.DARTS_REMOVED]
+    assert events[3].turn_total == 130
+    assert tracker.turn_darts == []
+
+def test_single_frame_flicker_is_ignored():
+    """Test that a detection seen on one frame never becomes a throw"""
+    tracker = DartTracker()
+    events = feed(tracker, [[((5.0, 5.0), 20, parse_region('single_20'))]] + [[]] * 10)
+    assert events == []
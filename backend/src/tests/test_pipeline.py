@@ -0,0 +1,491 @@
+import time
+import asyncio
+import threading
+from multiprocessing import Pipe
+import numpy as np
+import pytest
+from utils.pipeline import CameraPipeline, FramePacket, LatestFrameBuffer
+from utils.batch_inference import BatchInferenceScheduler
+from utils.inference_pool import InferencePool
+from utils.camera import CameraManager
+from utils.camera_hub import CameraHub
+from utils.recording import FrameRecorder, Recording
+from utils.rate_control import SubscriberRateController
+from src.utils.monitor import CameraMonitor
+from utils.metrics import MetricsRegistry, timed
+from utils.tracing import FrameTracer
+
+def test_latest_frame_buffer_drops_stale_items():
+    """Test that a full buffer keeps the newest item and counts drops"""
+    buffer = LatestFrameBuffer(maxsize=1)
+    for i in range(5):
+        buffer.put(i)
+    assert buffer.get(timeout=0) == 4
+    assert buffer.dropped == 4
+    assert buffer.get(timeout=0) is None
+
+def test_pipeline_slow_inference_does_not_stall_capture():
+    """Test that capture keeps running while inference is busy"""
+    frame = np.zeros((4, 4, 3), dtype=np.uint8)
+    emitted = []
+
+    def slow_infer(packet):
+        time.sleep(0.05)
+        return packet
+
+    pipeline = CameraPipeline(
+        0,
+        read_frame=lambda: (time.sleep(0.001), frame)[1],
+        infer=slow_infer,
+        score=lambda packet: packet,
+        emit=emitted.append
+    )
+    pipeline.start()
+    time.sleep(0.3)
+    pipeline.stop()
+    pipeline.join(1)
+
+    assert emitted
+    assert pipeline.frames_captured > len(emitted)
+    assert pipeline.stats()['dropped']['inference'] > 0
+    # Frames reach emit in capture order
+    seqs = [p.seq for p in emitted]
+    assert seqs == sorted(seqs)
+
+def test_pipeline_stage_error_skips_the_frame_without_reporting_the_camera():
+    """Test that a raising stage drops its frame while only capture failures reach on_error"""
+    frame = np.zeros((4, 4, 3), dtype=np.uint8)
+    frames = iter([frame] * 20)
+    emitted, errors = [], []
+
+    def flaky_score(packet):
+        if packet.seq % 2:
+            raise ValueError("bad detections")
+        return packet
+
+    pipeline = CameraPipeline(
+        0,
+        read_frame=lambda: (time.sleep(0.005), next(frames, None))[1],
+        infer=lambda packet: packet,
+        score=flaky_score,
+        emit=emitted.append,
+        on_error=lambda idx, message: errors.append(message),
+        buffer_size=20
+    )
+    pipeline.start()
+    deadline = time.monotonic() + 2
+    while not errors and time.monotonic() < deadline:
+        time.sleep(0.01)
+    pipeline.join(1)
+
+    assert emitted and all(p.seq % 2 == 0 for p in emitted)
+    assert pipeline.stats()['stage_errors']['scoring'] > 0
+    # The camera ran dry once; stage errors never got reported
+    assert errors == ["Failed to read frame from camera 0"]
+
+def test_scheduler_batches_latest_frame_per_camera():
+    """Test that frames from several cameras go through one batched call"""
+    batch_sizes = []
+    delivered = {}
+
+    def run_batch(frames):
+        batch_sizes.append(len(frames))
+        return [frame.sum() for frame in frames]
+
+    scheduler = BatchInferenceScheduler(run_batch, max_batch_wait=0.5)
+    for idx in range(3):
+        scheduler.register(idx, lambda packet: delivered.setdefault(packet.camera_idx, packet))
+    scheduler.start()
+    for idx in range(3):
+        frame = np.full((2, 2), idx, dtype=np.uint8)
+        scheduler.submit(idx, FramePacket(camera_idx=idx, seq=1, frame=frame, timestamp=time.monotonic()))
+    deadline = time.monotonic() + 2
+    while len(delivered) < 3 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    scheduler.stop()
+
+    assert batch_sizes == [3]
+    assert {idx: p.extras['result'] for idx, p in delivered.items()} == {0: 0, 1: 4, 2: 8}
+
+def test_inference_pool_replaces_dead_worker_after_successful_restart():
+    """Test that a dead worker only rejoins the pool once a restart succeeded, waiting through blocking_call"""
+    replies = [('ready', {0: 'dart'}), ('error', 'model failed to load'), ('ready', {0: 'dart'})]
+    children = []
+    waited = []
+
+    class FakeWorkerPool(InferencePool):
+        def _spawn(self, worker, cpus):
+            parent, child = Pipe()
+            self._conns[worker] = parent
+            children.append(child)
+            child.send(replies.pop(0))
+
+    def blocking_call(fn, *args):
+        waited.append(fn.__name__)
+        return fn(*args)
+
+    pool = FakeWorkerPool('torch', '.', workers=1, slots=2, slot_bytes=64, pin_cpus=False,
+                          blocking_call=blocking_call, restart_backoff=0.2)
+    pool.start()
+    try:
+        assert 'poll' in waited and pool.names == {0: 'dart'}
+        children[0].close()
+        try:
+            pool([np.zeros((2, 2, 3), dtype=np.uint8)])
+            assert False, "a dead worker must fail the request"
+        except RuntimeError:
+            pass
+        # The first restart fails, so the worker stays out of the pool until the retry
+        assert pool.stats()['idle'] == 0
+
+        deadline = time.monotonic() + 3.0
+        while pool.stats()['idle'] == 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert pool.stats()['idle'] == 1 and pool.restarts == 2 and not replies
+    finally:
+        for conn in pool._conns + children:
+            conn.close()
+        pool._conns = [None]
+        pool.stop()
+
+def test_camera_hub_shares_one_pipeline_per_camera():
+    """Test that subscribers share a camera's pipeline and the last one out stops it"""
+    class FakePipeline:
+        def __init__(self):
+            self.stopped = False
+
+        def stop(self):
+            self.stopped = True
+
+    started = []
+    def start_pipeline(camera_idx):
+        started.append(FakePipeline())
+        return started[-1]
+
+    hub = CameraHub(start_pipeline)
+    assert hub.subscribe(0, 'a', session_id=1) == 1
+    assert hub.subscribe(0, 'b') == 2
+    assert hub.subscribe(0, 'a', session_id=2) == 2
+    assert hub.subscribe(1, 'a') == 1
+    assert len(started) == 2
+    assert hub.subscribers(0)['a'] == {'session_id': 2}
+
+    assert hub.unsubscribe(0, 'b') == 1
+    assert not started[0].stopped
+    assert sorted(hub.unsubscribe_all('a')) == [0, 1]
+    assert started[0].stopped and started[1].stopped
+    assert hub.pipeline(0) is None and hub.stats() == {}
+
+def test_rate_controller_keeps_one_frame_in_flight_and_adapts():
+    """Test that unacked clients skip frames and fast acks raise the rate"""
+    rate = SubscriberRateController(start_fps=10, max_fps=30, ack_timeout=1.0)
+    assert rate.should_send(0.0, now=0.0)
+    rate.on_sent(1, now=0.0)
+    # Still waiting on frame 1
+    assert not rate.should_send(0.05, now=0.2)
+
+    assert rate.on_ack(1, now=0.01)
+    assert rate.target_fps == 11
+    assert not rate.on_ack(1, now=0.02)
+    assert rate.should_send(0.2, now=0.2)
+    rate.on_sent(2, now=0.2)
+
+    # A lost ack times out and backs off
+    assert rate.should_send(1.3, now=1.3)
+    assert rate.timeouts == 1 and rate.target_fps < 11
+
+def _acked_stream(latency, emit_seconds=0.005):
+    """Five seconds of 30 fps frames `latency` old on arrival, acked instantly"""
+    rate = SubscriberRateController(start_fps=10, max_fps=30, emit_budget=0.1)
+    now, seq = 0.0, 0
+    while now < 5.0:
+        if rate.should_send(now - latency, now=now):
+            seq += 1
+            rate.on_sent(seq, now=now)
+            rate.on_emitted(emit_seconds)
+            assert rate.on_ack(seq, now=now + 0.005)
+        now += 1 / 30
+    return rate
+
+def test_rate_controller_slows_down_for_slow_sends_despite_fast_acks():
+    """Test that slow encoding and emitting lowers the rate even when acks are instant"""
+    fast, slow = _acked_stream(0.02), _acked_stream(0.02, emit_seconds=0.2)
+    assert fast.target_fps > 10 and fast.emit_backoffs == 0
+    assert slow.target_fps < 10 and slow.emit_backoffs > 0
+    assert slow.sent < fast.sent
+
+def test_rate_controller_ignores_slow_inference():
+    """Test that frames staying over budget from capture to emit do not drive the rate to the floor"""
+    rate = _acked_stream(0.5)
+    assert rate.pipeline_latency > 0.25
+    assert rate.target_fps > rate.min_fps and rate.emit_backoffs == 0
+
+def test_camera_manager_grabs_all_cameras_before_retrieving():
+    """Test that synchronized capture grabs every camera before decoding any"""
+    calls = []
+
+    class FakeCapture:
+        def __init__(self, idx):
+            self.idx = idx
+
+        def grab(self):
+            calls.append(('grab', self.idx))
+            return True
+
+        def retrieve(self):
+            calls.append(('retrieve', self.idx))
+            return True, np.full((2, 2, 3), self.idx, dtype=np.uint8)
+
+    manager = CameraManager([])
+    for idx in range(3):
+        manager.add_capture(idx, FakeCapture(idx))
+
+    frames = manager.capture_synchronized()
+    assert [kind for kind, _ in calls] == ['grab'] * 3 + ['retrieve'] * 3
+    assert {f.seq for f in frames.values()} == {1}
+    assert all(frames[idx].frame[0, 0, 0] == idx for idx in range(3))
+    assert frames[0].timestamp <= frames[2].timestamp
+
+    manager.set_active(1, True)
+    manager.start_sync()
+    read = manager.reader(1)
+    frame, timestamp = read()
+    assert frame[0, 0, 0] == 1
+    assert read()[1] > timestamp
+    manager.stop_sync()
+
+def test_camera_manager_reopen_waits_for_the_capture_round():
+    """Test that reopening a camera never releases it while a round is grabbing from it"""
+    class SlowCapture:
+        def __init__(self):
+            self.in_grab = threading.Event()
+            self.proceed = threading.Event()
+            self.released = False
+            self.used_after_release = False
+
+        def isOpened(self):
+            return True
+
+        def set(self, *args):
+            return True
+
+        def grab(self):
+            self.in_grab.set()
+            self.proceed.wait(2.0)
+            self.used_after_release |= self.released
+            return True
+
+        def retrieve(self):
+            self.used_after_release |= self.released
+            return True, np.zeros((2, 2, 3), dtype=np.uint8)
+
+        def release(self):
+            self.released = True
+
+    manager = CameraManager([0], capture_factory=lambda idx: SlowCapture())
+    old = manager.cameras[0]
+    results = {}
+    round_thread = threading.Thread(target=lambda: results.update(round=manager.capture_synchronized([0])))
+    round_thread.start()
+    assert old.in_grab.wait(2.0)
+
+    reopen_thread = threading.Thread(target=lambda: results.update(reopened=manager.reopen(0)))
+    reopen_thread.start()
+    time.sleep(0.05)
+    assert not old.released
+
+    old.proceed.set()
+    round_thread.join(2.0)
+    reopen_thread.join(2.0)
+    assert results['round'][0] is not None and results['reopened']
+    assert old.released and not old.used_after_release
+    assert manager.cameras[0] is not old
+
+def test_camera_manager_sync_loop_survives_capture_errors():
+    """Test that a capture raising in the sync loop fails only that camera and the loop keeps running"""
+    class FakeCapture:
+        def __init__(self, idx, broken=False):
+            self.idx = idx
+            self.broken = broken
+
+        def grab(self):
+            if self.broken:
+                raise RuntimeError("device unplugged")
+            return True
+
+        def retrieve(self):
+            return True, np.full((2, 2, 3), self.idx, dtype=np.uint8)
+
+    manager = CameraManager([])
+    manager.add_capture(0, FakeCapture(0))
+    manager.add_capture(1, FakeCapture(1, broken=True))
+    for idx in (0, 1):
+        manager.set_active(idx, True)
+    manager.start_sync()
+    try:
+        assert manager.wait_frame(1) is None
+        assert manager.grab_failures[1] > 0
+        first = manager.wait_frame(0)
+        assert manager.wait_frame(0, after=first.seq).frame[0, 0, 0] == 0
+        assert manager._thread.is_alive()
+
+        # A round that fails as a whole reports every camera as failed
+        def broken_pool(fn, *args):
+            raise RuntimeError("pool gone")
+        manager.blocking_call = broken_pool
+        deadline = time.monotonic() + 2.0
+        while not manager.sync_errors and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert manager.sync_errors and manager.wait_frame(0) is None
+        assert manager._thread.is_alive()
+    finally:
+        manager.stop_sync()
+
+def test_camera_monitor_detects_stalls_and_reconnects_with_backoff():
+    """Test that a stalled camera is reported once and reopened with growing backoff"""
+    class FakeManager:
+        cameras = {0: object()}
+        reopen_results = [False, True]
+
+        def reopen(self, idx):
+            return self.reopen_results.pop(0)
+
+    events = []
+    monitor = CameraMonitor(FakeManager(), [0], stall_timeout=1.0, backoff_initial=1.0,
+                            on_failure=lambda idx, reason: events.append(('failed', idx)),
+                            on_recovered=lambda idx: events.append(('recovered', idx)))
+    monitor.watch(0)
+    frame = np.zeros((64, 64, 3), dtype=np.uint8)
+    now = time.monotonic()
+    monitor.record_capture(0, frame, now)
+    monitor.record_capture(0, frame + 1, now + 0.1)
+    assert monitor.get_status()[0]['fps'] == 10.0
+
+    monitor.check(now + 2.0)
+    monitor.report_failure(0, 'read failed')
+    assert events == [('failed', 0)]
+    assert monitor.is_failed(0)
+
+    # First retry fails and doubles the backoff, the second succeeds
+    monitor.check(now + 3.5)
+    assert monitor.health[0].backoff == 2.0 and monitor.is_failed(0)
+    monitor.check(now + 4.0)
+    assert monitor.is_failed(0)
+    monitor.check(now + 6.0)
+    assert events[-1] == ('recovered', 0)
+    assert not monitor.is_failed(0) and monitor.get_status()[0]['reconnects'] == 1
+
+@pytest.mark.parametrize('codec', ['jpg', 'png', 'raw'])
+def test_recording_replays_through_camera_manager(tmp_path, codec):
+    """Test that recorded frames and timestamps come back in order through a replay capture"""
+    with FrameRecorder(str(tmp_path), codec=codec) as recorder:
+        for i in range(3):
+            for idx in (0, 1):
+                recorder.write(idx, np.full((4, 6, 3), i * 10 + idx, dtype=np.uint8), 100.0 + i)
+
+    recording = Recording(str(tmp_path), realtime=False)
+    assert recording.camera_indices == [0, 1]
+    manager = CameraManager(recording.camera_indices, capture_factory=recording.capture)
+    frames = [manager.capture_synchronized()[1].frame for _ in range(3)]
+    assert all(frame.shape == (4, 6, 3) for frame in frames)
+    assert [int(frame[0, 0, 0]) for frame in frames] == pytest.approx([1, 11, 21], abs=0 if codec != 'jpg' else 2)
+    # The recording has run out, like an unplugged camera
+    assert manager.capture_synchronized()[1] is None
+    assert manager.reopen(1) and manager.read(1).frame[0, 0, 0] == 1
+
+def test_looping_replay_keeps_cameras_with_unequal_frame_counts_aligned(tmp_path):
+    """Test that a camera whose recording wraps early does not hold the others back"""
+    with FrameRecorder(str(tmp_path), codec='raw') as recorder:
+        for i in range(10):
+            recorder.write(0, np.full((2, 2, 3), i, dtype=np.uint8), 100.0 + i * 0.02)
+            # Camera 1 dropped out halfway through the recording
+            if i < 5:
+                recorder.write(1, np.full((2, 2, 3), i, dtype=np.uint8), 100.0 + i * 0.02)
+
+    recording = Recording(str(tmp_path), loop=True)
+    assert recording.clock.period == pytest.approx(0.2)
+    delivered = {0: [], 1: []}
+    started = time.monotonic()
+
+    def replay(idx, reads):
+        capture = recording.capture(idx)
+        for _ in range(reads):
+            ret, frame = capture.read()
+            assert ret
+            delivered[idx].append((int(frame[0, 0, 0]), time.monotonic() - started))
+
+    readers = [threading.Thread(target=replay, args=(0, 20)), threading.Thread(target=replay, args=(1, 10))]
+    for reader in readers:
+        reader.start()
+    for reader in readers:
+        reader.join(2)
+
+    assert [value for value, _ in delivered[0]] == list(range(10)) * 2
+    assert [value for value, _ in delivered[1]] == list(range(5)) * 2
+    # Each frame is served on its recorded schedule, 0.2s per pass, even
+    # after camera 1 has wrapped around
+    for frames, per_pass in ((delivered[0], 10), (delivered[1], 5)):
+        due = [(i // per_pass) * 0.2 + (i % per_pass) * 0.02 for i in range(len(frames))]
+        assert np.allclose([at for _, at in frames], due, atol=0.03)
+
+def test_recording_compresses_frames(tmp_path):
+    """Test that encoded recordings are much smaller than raw frames and replay exactly with png"""
+    rng = np.random.RandomState(0)
+    board = np.full((240, 320, 3), 40, dtype=np.uint8)
+    board[60:180, 100:220] = rng.randint(0, 255, size=3)
+    sizes = {}
+    for codec in ('png', 'raw'):
+        path = tmp_path / codec
+        with FrameRecorder(str(path), codec=codec) as recorder:
+            for i in range(5):
+                recorder.write(0, board, float(i))
+        sizes[codec] = (path / 'camera0.frames').stat().st_size
+        ret, frame = Recording(str(path), realtime=False).capture(0).read()
+        assert ret and np.array_equal(frame, board)
+    assert sizes['png'] * 10 < sizes['raw']
+
+def test_metrics_render_prometheus_histograms_and_callbacks():
+    """Test that histograms export cumulative buckets and callbacks are read at scrape time"""
+    registry = MetricsRegistry()
+    stages = registry.histogram('stage_seconds', 'Stage latency', ('camera', 'stage'), buckets=(0.01, 0.1))
+    for value in (0.005, 0.05, 0.5):
+        stages.labels(0, 'infer').observe(value)
+    depth = {'value': 2}
+    registry.callback('queue_depth', 'Queued frames', lambda: {(0, 'emit'): depth['value']}, ('camera', 'queue'))
+
+    @timed(registry.histogram('throw_seconds', 'Throw handling'))
+    async def process_throw():
+        return 'done'
+    assert asyncio.run(process_throw()) == 'done'
+
+    depth['value'] = 3
+    text = registry.render()
+    assert 'stage_seconds_bucket{camera="0",stage="infer",le="0.01"} 1' in text
+    assert 'stage_seconds_bucket{camera="0",stage="infer",le="0.1"} 2' in text
+    assert 'stage_seconds_bucket{camera="0",stage="infer",le="+Inf"} 3' in text
+    assert 'stage_seconds_count{camera="0",stage="infer"} 3' in text
+    assert 'queue_depth{camera="0",queue="emit"} 3.0' in text
+    assert 'throw_seconds_count 1' in text
+    assert stages.labels(0, 'infer').quantile(0.5) == 0.1
+
+def test_frame_tracer_keeps_sampled_and_slow_frames_with_client_reports():
+    """Test that traces record stage spans and queueing, and match client render reports"""
+    tracer = FrameTracer(sample_every=2, slow_threshold=0.1)
+    fast = tracer.begin(0, 1, 10.0)
+    fast.span('infer', 10.01, 10.03)
+    tracer.finish(fast, 10.04)
+    slow = tracer.begin(0, 2, 20.0)
+    slow.span('read', 20.0, 20.01)
+    slow.span('infer', 20.21, 20.26)
+    tracer.finish(slow, 20.3)
+
+    # Only seq 2 is sampled, and only it was slow
+    assert [t['trace_id'] for t in tracer.dump()] == [slow.trace_id]
+    dumped = tracer.dump(slow=True)[0]
+    assert dumped['server_latency_ms'] == 300.0
+    assert dumped['spans'][1] == {'stage': 'infer', 'start_ms': 210.0, 'duration_ms': 50.0, 'queued_ms': 200.0}
+
+    assert tracer.report_client(fast.trace_id, 'sid1', now=10.1, render_ms=12) is fast
+    assert fast.to_dict()['clients']['sid1'] == {'render_ms': 12.0, 'reported_ms': 100.0, 'emit_to_report_ms': 60.0}
+    assert tracer.report_client('missing', 'sid1') is None
+    assert tracer.stats()['unmatched_reports'] == 1
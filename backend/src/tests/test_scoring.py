@@ -0,0 +1,158 @@
+import numpy as np
+from src.scoring.board_geometry import BoardGeometry, PixelScoringLUT
+from src.scoring.dartboard_scoring import (ClassTable, calculate_score, detections_from_boxes, detections_from_predictions,
+                                           default_classes, predictions_from_detections, score_batch)
+from src.scoring.regions import (REGION_NAMES, REGION_POINTS, REGION_RING, RING_INNER_BULL, hits_target,
+                                  parse_region, region_code, region_name)
+from src.utils.score_aggregator import ScoreAggregator
+from utils.calibration import BoardCalibrator
+
+def board_point(geometry, radius_mm, angle_deg):
+    """Board coordinates for a polar position (angle counter-clockwise from 3 o'clock)"""
+    r = radius_mm * geometry.units_per_mm
+    theta = np.radians(angle_deg)
+    return geometry.center + [r * np.cos(theta), -r * np.sin(theta)]
+
+def test_geometry_scores_rings_and_segments():
+    """Test segment and ring lookup at known board positions"""
+    geometry = BoardGeometry()
+    points = np.array([
+        board_point(geometry, 0, 0),       # inner bull
+        board_point(geometry, 10, 0),      # outer bull
+        board_point(geometry, 103, 90),    # triple 20
+        board_point(geometry, 166, 0),     # double 6
+        board_point(geometry, 50, 72),     # single 1
+        board_point(geometry, 103, 270),   # triple 3
+        board_point(geometry, 180, 90),    # off the board
+    ])
+    segments, multipliers = geometry.score_points(points)
+    assert list(segments) == [25, 25, 20, 6, 1, 3, 0]
+    assert list(multipliers) == [2, 1, 3, 2, 1, 3, 0]
+    assert region_name(region_code(20, 3)) == 'triple_20'
+    assert region_name(region_code(25, 2)) == 'bullseye'
+
+def test_pixel_lut_matches_geometry():
+    """Test that the per-camera pixel table agrees with direct geometric scoring"""
+    calibrator = BoardCalibrator()
+    calibrator.set_reference_points([(100, 50), (500, 60), (520, 430), (90, 440)])
+    geometry = BoardGeometry()
+    lut = PixelScoringLUT(geometry, calibrator, 640, 480)
+
+    pixels = np.random.RandomState(0).uniform([0, 0], [640, 480], size=(500, 2))
+    pixels = np.floor(pixels)
+    expected = geometry.score_points(calibrator.to_board_coordinates(pixels))
+    actual = lut.lookup(pixels)
+    assert np.array_equal(actual[0], expected[0])
+    assert np.array_equal(actual[1], expected[1])
+
+def test_region_codes_round_trip_and_match_targets():
+    """Test that labels, codes and training targets agree on one region table"""
+    for segment, multiplier, name in [(20, 3, 'triple_20'), (16, 2, 'double_16'), (5, 1, 'single_5'),
+                                      (25, 1, 'bull'), (25, 2, 'bullseye'), (0, 0, 'outside')]:
+        code = region_code(segment, multiplier)
+        assert REGION_NAMES[code] == name and parse_region(name) == code
+        assert REGION_POINTS[code] == segment * multiplier
+    assert parse_region('Bulls_Eye') == parse_region('50') == parse_region('D25')
+    assert REGION_RING[parse_region('bullseye')] == RING_INNER_BULL
+    assert parse_region('T20') == parse_region('triple_20')
+
+    codes = np.array([parse_region(label) for label in ['triple_20', 'single_2', 'double_12', 'bull', 'bullseye']])
+    assert list(hits_target(codes, 'T20')) == [True, False, False, False, False]
+    # A plain number is any ring of that segment only, not a substring match
+    assert list(hits_target(codes, '2')) == [False, True, False, False, False]
+    assert list(hits_target(codes, '25')) == [False, False, False, True, True]
+    assert list(hits_target(codes, '50')) == [False, False, False, False, True]
+
+def test_nearest_region_scoring_without_calibration():
+    """Test the uncalibrated fallback picks the nearest region inside the board"""
+    predictions = [
+        {'label': 'Dartboard', 'confidence': 0.9, 'bbox': [0, 0, 100, 100]},
+        {'label': 'dart', 'confidence': 0.8, 'bbox': [48, 10, 4, 4]},
+        {'label': 'dart', 'confidence': 0.7, 'bbox': [48, 48, 4, 4]},
+        {'label': 'dart', 'confidence': 0.6, 'bbox': [300, 300, 4, 4]},
+        {'label': 'triple_20', 'confidence': 0.9, 'bbox': [45, 5, 10, 10]},
+        {'label': 'bullseye', 'confidence': 0.9, 'bbox': [45, 45, 10, 10]},
+    ]
+    score = calculate_score(predictions)
+    assert score['total'] == 110
+    assert [d['points'] for d in score['details']] == [60, 50]
+
+def test_score_batch_matches_per_frame_scoring():
+    """Test that one batched call scores every frame like per-frame calls"""
+    rng = np.random.RandomState(1)
+    labels = ['dart', 'single_5', 'double_16', 'triple_20', 'bull', 'bullseye']
+    frames = []
+    for _ in range(50):
+        predictions = [{'label': 'Dartboard', 'confidence': 0.9, 'bbox': [0, 0, 400, 400]}]
+        for _ in range(rng.randint(0, 10)):
+            x, y = rng.uniform(0, 400, size=2)
+            predictions.append({'label': labels[rng.randint(len(labels))], 'confidence': 0.5, 'bbox': [x, y, 8, 8]})
+        frames.append(predictions)
+
+    detections = detections_from_predictions(frames)
+    batch = score_batch(detections, n_frames=len(frames))
+    assert list(batch.totals) == [calculate_score(p)['total'] for p in frames]
+
+    # The single-frame fast path gives the same details, by board geometry too
+    geometry = BoardGeometry(center=(200, 200), units_per_mm=1.0)
+    geometric = score_batch(detections, n_frames=len(frames), geometry=geometry)
+    for frame, predictions in enumerate(frames):
+        for result, expected in ((calculate_score(predictions), batch),
+                                 (calculate_score(predictions, geometry=geometry), geometric)):
+            details = expected.frame_details(detections, default_classes, frame)
+            assert [(d['region_code'], d['points']) for d in result['details']] == \
+                [(d['region_code'], d['points']) for d in details]
+
+def test_model_detections_stay_arrays_until_converted_to_json():
+    """Test that model boxes scored as a structured array match scoring the equivalent dicts"""
+    classes = ClassTable.from_names({0: 'Dartboard', 1: 'dart', 2: 'triple_20', 3: 'bullseye'})
+    # Center-format boxes as the detector returns them
+    xywh = np.array([[50, 50, 100, 100], [50, 12, 4, 4], [50, 50, 4, 4], [50, 10, 10, 10], [50, 50, 10, 10]])
+    detections = detections_from_boxes(xywh, [0, 1, 1, 2, 3], [0.9, 0.8, 0.7, 0.9, 0.9], camera=2, timestamp=5.0)
+    assert set(detections['camera']) == {2} and set(detections['timestamp']) == {5.0}
+
+    predictions = predictions_from_detections(detections, classes)
+    assert predictions[1] == {'label': 'dart', 'confidence': detections['conf'][1].item(), 'bbox': [48.0, 10.0, 4.0, 4.0]}
+    score = score_batch(detections, classes, n_frames=1).to_dict(detections, classes)
+    assert score == calculate_score(predictions)
+    assert score['total'] == 110
+
+def test_aggregator_counts_each_dart_once_across_cameras():
+    """Test that views of the same dart from several cameras fuse into one throw"""
+    geometry = BoardGeometry()
+    aggregator = ScoreAggregator(geometry=geometry)
+    triple_20 = board_point(geometry, 103, 90)
+    single_6 = board_point(geometry, 50, 0)
+
+    # Warm up so all three cameras count as active
+    for idx in range(3):
+        aggregator.submit(idx, np.zeros((0, 2)), np.zeros(0), timestamp=0.0)
+    aggregator.submit(0, np.zeros((0, 2)), np.zeros(0), timestamp=0.05)
+
+    assert aggregator.submit(0, [triple_20, single_6], [0.9, 0.8], timestamp=0.10) is None
+    assert aggregator.submit(1, [triple_20 + 0.1, single_6 - 0.1], [0.7, 0.6], timestamp=0.11) is None
+    fused = aggregator.submit(2, [triple_20 - 0.1], [0.8], timestamp=0.12)
+
+    assert fused is not None
+    assert fused.total == 66
+    assert sorted(fused.cameras.tolist()) == [2, 3]
+    assert 0 < fused.agreement < 1
+
+def test_aggregator_fuses_within_max_skew_when_a_camera_is_silent():
+    """Test that a silent camera delays fusion by at most max_skew, not until it goes stale"""
+    geometry = BoardGeometry()
+    aggregator = ScoreAggregator(geometry=geometry, max_skew=0.1, stale_after=2.0)
+    for idx in range(2):
+        aggregator.submit(idx, np.zeros((0, 2)), np.zeros(0), timestamp=0.0)
+    assert aggregator.submit(0, np.zeros((0, 2)), np.zeros(0), timestamp=0.5) is not None
+
+    # Camera 0 keeps resubmitting at 30 fps while camera 1 stays silent
+    dart = board_point(geometry, 103, 90)
+    fused, timestamp = None, 1.0
+    while fused is None and timestamp < 3.0:
+        fused = aggregator.submit(0, [dart], [0.9], timestamp=timestamp)
+        timestamp += 0.033
+
+    assert fused is not None and fused.timestamp - 1.0 >= 0.1
+    assert fused.timestamp - 1.0 < 0.1 + 0.033
+    assert fused.total == 60 and fused.camera_count == 1
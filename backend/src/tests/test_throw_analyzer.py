@@ -0,0 +1,108 @@
+import json
+import numpy as np
+import pytest
+from analytics.heatmap import ThrowHeatmap
+from analytics.throw_analyzer import ThrowAnalyzer
+from analytics.throw_history import THROW_DTYPE, ThrowHistory
+from src.scoring.regions import REGION_POINTS, REGION_VALID, parse_region
+
+def test_running_metrics_match_batch_recompute():
+    """Test that the O(1) running metrics agree with recomputing from the history"""
+    rng = np.random.RandomState(3)
+    analyzer = ThrowAnalyzer()
+    codes = np.flatnonzero(REGION_VALID)
+    bullseye = parse_region('bullseye')
+    regions = rng.choice(codes, size=500)
+    for region in regions:
+        points = int(REGION_POINTS[region])
+        analyzer.add_throw({'score': points, 'hit': points >= 20, 'region': int(region), 'confidence': 0.9})
+
+    metrics = analyzer.calculate_metrics()
+    scores = REGION_POINTS[regions].astype(float)
+    assert metrics.average_score == pytest.approx(scores.mean())
+    assert metrics.consistency == pytest.approx(1 - scores.std(ddof=1) / scores.max())
+    assert metrics.accuracy == pytest.approx(np.mean(scores >= 20))
+    assert metrics.bullseye_rate == pytest.approx(np.mean(regions == bullseye))
+    assert analyzer.region_counts()['bullseye'] == np.count_nonzero(regions == bullseye)
+
+    pytest.importorskip('pandas')
+    batch = analyzer.recalculate_metrics()
+    for name, value in batch.__dict__.items():
+        assert getattr(metrics, name) == pytest.approx(value)
+
+def test_labels_are_converted_to_region_codes():
+    """Test that throws reported with region labels are counted like codes"""
+    analyzer = ThrowAnalyzer()
+    analyzer.add_throw({'score': 40, 'hit': True, 'region': 'double_20'})
+    analyzer.add_throw({'score': 60, 'hit': True, 'region': 'T20'})
+    metrics = analyzer.calculate_metrics()
+    assert metrics.double_hit_rate == 0.5 and metrics.triple_hit_rate == 0.5
+    assert analyzer.region_counts() == {'double_20': 1, 'triple_20': 1}
+
+def test_history_spills_old_throws_and_queries_across_segments(tmp_path):
+    """Test that the history keeps a fixed window in memory and queries spilled throws by time"""
+    history = ThrowHistory(window=8, segment_size=4, spill_dir=str(tmp_path))
+    for t in range(30):
+        history.append(1000.0 + t, t, t % 2 == 0, parse_region('T20'), 0.5, t / 30, 0.5)
+
+    assert len(history.in_memory) <= 8 and history._buffer.nbytes == 8 * THROW_DTYPE.itemsize
+    assert len(history) == 30 and len(list(tmp_path.glob('*.npy'))) == len(history.segments)
+    assert history.query()['score'].tolist() == list(range(30))
+    assert history.query(1003.0, 1025.0)['score'].tolist() == list(range(3, 25))
+    assert history.recent(3)['score'].tolist() == [27, 28, 29]
+
+def test_history_without_spill_dir_drops_oldest():
+    """Test that a history with nowhere to spill keeps only recent throws and counts the rest"""
+    history = ThrowHistory(window=4, segment_size=2)
+    for t in range(9):
+        history.append(float(t), t, True, 0, 1.0)
+    assert history.dropped + len(history) == 9
+    assert history.query()['score'].tolist() == list(range(9 - len(history), 9))
+
+def test_analyzer_exports_throws_from_history(tmp_path):
+    """Test that analyzer throws survive spilling and come back as export records"""
+    analyzer = ThrowAnalyzer(history_window=4, spill_dir=str(tmp_path))
+    for score in range(10):
+        analyzer.add_throw({'score': score, 'hit': True, 'region': 'single_1', 'coordinates': (0.1, 0.9)})
+    assert len(analyzer.throws_history) <= 4
+
+    path = tmp_path / 'session.json'
+    analyzer.export_session_data(str(path))
+    throws = json.loads(path.read_text())['throws']
+    assert [throw['score'] for throw in throws] == list(range(10))
+    assert throws[0]['region'] == parse_region('single_1') and throws[0]['coordinates'] == pytest.approx([0.1, 0.9])
+
+def test_heatmap_levels_match_histograms_of_all_throws():
+    """Test that every incrementally kept heatmap level equals a histogram over all throws"""
+    rng = np.random.RandomState(5)
+    heatmap = ThrowHeatmap()
+    positions = rng.normal(22.5, 6.0, size=(3000, 2))
+    for batch in np.array_split(positions, 7):
+        heatmap.add(batch)
+
+    left, right, top, bottom = heatmap.cartesian_extent()
+    for bins in heatmap.cartesian_bins:
+        expected, _, _ = np.histogram2d(positions[:, 1], positions[:, 0], bins=bins, range=[[top, bottom], [left, right]])
+        assert np.array_equal(heatmap.cartesian(bins), expected)
+
+    radius, angle = heatmap.geometry.to_polar(positions)
+    on_board = radius < 170.0
+    assert heatmap.off_board == np.count_nonzero(~on_board)
+    for bins in heatmap.polar_bins:
+        expected, _, _ = np.histogram2d(radius[on_board], (angle[on_board] - 9.0) % 360.0, bins=bins,
+                                        range=[[0, 170.0], [0, 360.0]])
+        assert np.array_equal(heatmap.polar(bins), expected)
+
+def test_analyzer_heatmap_only_counts_board_positions():
+    """Test that throws tracked in frame pixels stay off the board heatmap"""
+    analyzer = ThrowAnalyzer()
+    # 5 cm straight above the bull: segment 20, 50 mm out
+    analyzer.add_throw({'score': 20, 'hit': True, 'region': 'single_20', 'coordinates': (22.5, 17.5), 'on_board': True})
+    analyzer.add_throw({'score': 20, 'hit': True, 'region': 'single_20', 'coordinates': (320.0, 240.0)})
+
+    assert analyzer.generate_heatmap().sum() == 1 and analyzer.generate_heatmap(160).sum() == 1
+    polar = analyzer.heatmap.polar((17, 20))
+    radii, angles = analyzer.heatmap.polar_edges((17, 20))
+    assert polar[5, 4] == 1 and angles[4] < 90 < angles[5] and radii[5] <= 50 < radii[6]
+    with pytest.raises(ValueError):
+        analyzer.generate_heatmap(30)
@@ -2,15 +2,232 @@ import cv2
 import numpy as np
 import threading
 import time
-from typing import Dict, List
-from queue import Queue
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
 import logging
 
+@dataclass
+class CameraHealth:
+    connected: bool = True
+    failed: bool = False
+    capture_fps: float = 0.0
+    inference_fps: float = 0.0
+    last_capture: Optional[float] = None
+    last_inference: Optional[float] = None
+    frozen_since: Optional[float] = None
+    watched_since: Optional[float] = None
+    issues: List[str] = field(default_factory=list)
+    reconnect_attempts: int = 0
+    reconnects: int = 0
+    next_retry: float = 0.0
+    backoff: float = 0.0
+    thumbnail: Optional[np.ndarray] = None
+
 class CameraMonitor:
-    def __init__(self, cameras: Dict[int, cv2.VideoCapture], model):
-        self.cameras = cameras
-        self.model = model
-        self.frame_queues = {idx: Queue(maxsize=30) for idx in cameras.keys()}
-        self.status = {idx: {"active": True, "fps": 0, "issues": []} for idx in cameras.keys()}
-        
-    # ... implementation as provided ...
+    """Watches every camera's capture and inference rate and heals failures.
+
+    Pipelines report each captured and each inferred frame. A background
+    thread flags cameras whose frames stopped arriving (stalled) or stopped
+    changing (frozen), and any failed camera is reopened through the
+    CameraManager with exponential backoff. `on_failure` / `on_recovered`
+    let the server pause and resume the camera's pipeline around that.
+    """
+
+    def __init__(self,
+                 camera_manager,
+                 camera_indices: Optional[List[int]] = None,
+                 on_failure: Optional[Callable[[int, str], None]] = None,
+                 on_recovered: Optional[Callable[[int], None]] = None,
+                 stall_timeout: float = 3.0,
+                 frozen_after: float = 5.0,
+                 frozen_threshold: float = 0.0,
+                 check_interval: float = 0.5,
+                 backoff_initial: float = 1.0,
+                 backoff_max: float = 30.0,
+                 smoothing: float = 0.1,
+                 blocking_call: Optional[Callable] = None):
+        self.camera_manager = camera_manager
+        self.on_failure = on_failure
+        self.on_recovered = on_recovered
+        self.stall_timeout = stall_timeout
+        self.frozen_after = frozen_after
+        self.frozen_threshold = frozen_threshold
+        self.check_interval = check_interval
+        self.backoff_initial = backoff_initial
+        self.backoff_max = backoff_max
+        self.smoothing = smoothing
+        self.blocking_call = blocking_call or (lambda fn, *args: fn(*args))
+        self.logger = logging.getLogger(__name__)
+
+        indices = camera_indices if camera_indices is not None else list(camera_manager.cameras)
+        self.health: Dict[int, CameraHealth] = {idx: CameraHealth() for idx in indices}
+        # Cameras that never opened are retried like failed ones
+        for idx in indices:
+            if idx not in camera_manager.cameras:
+                self.health[idx].connected = False
+                self._mark_failed(idx, "not connected", time.monotonic())
+        # Cameras currently expected to produce frames
+        self.watched: set = set()
+        self.running = False
+        self._lock = threading.RLock()
+        self._thread: Optional[threading.Thread] = None
+
+    def _rate(self, current: float, last: Optional[float], now: float) -> float:
+        if last is None or now <= last:
+            return current
+        sample = 1.0 / (now - last)
+        return sample if current == 0 else current + self.smoothing * (sample - current)
+
+    def watch(self, camera_idx: int, active: bool = True):
+        """Start or stop expecting frames from a camera, e.g. when its pipeline starts"""
+        with self._lock:
+            health = self.health.setdefault(camera_idx, CameraHealth())
+            if active:
+                self.watched.add(camera_idx)
+                # A fresh start must not look like a stall
+                health.watched_since = time.monotonic()
+                health.last_capture = None
+                health.frozen_since = None
+            else:
+                self.watched.discard(camera_idx)
+
+    def record_capture(self, camera_idx: int, frame: np.ndarray, timestamp: Optional[float] = None):
+        timestamp = time.monotonic() if timestamp is None else timestamp
+        # A sparse grid of pixels is enough to tell a live sensor from a frozen
+        # one; by default only bit-identical frames count, since a static board
+        # on a clean sensor can come close
+        thumbnail = frame[::32, ::32].astype(np.int16)
+        with self._lock:
+            health = self.health.setdefault(camera_idx, CameraHealth())
+            health.capture_fps = self._rate(health.capture_fps, health.last_capture, timestamp)
+            health.last_capture = timestamp
+            previous, health.thumbnail = health.thumbnail, thumbnail
+            if previous is not None and previous.shape == thumbnail.shape \
+                    and np.mean(np.abs(thumbnail - previous)) <= self.frozen_threshold:
+                if health.frozen_since is None:
+                    health.frozen_since = timestamp
+            else:
+                health.frozen_since = None
+
+    def record_inference(self, camera_idx: int, timestamp: Optional[float] = None):
+        timestamp = time.monotonic() if timestamp is None else timestamp
+        with self._lock:
+            health = self.health.setdefault(camera_idx, CameraHealth())
+            health.inference_fps = self._rate(health.inference_fps, health.last_inference, timestamp)
+            health.last_inference = timestamp
+
+    def report_failure(self, camera_idx: int, reason: str):
+        """Mark a camera failed and schedule its reconnect; notifies `on_failure` once per failure"""
+        with self._lock:
+            health = self.health.setdefault(camera_idx, CameraHealth())
+            already_failed = health.failed
+            self._mark_failed(camera_idx, reason, time.monotonic())
+        if not already_failed:
+            self.logger.warning(f"Camera {camera_idx} failed: {reason}")
+            if self.on_failure:
+                self.on_failure(camera_idx, reason)
+
+    def _mark_failed(self, camera_idx: int, reason: str, now: float):
+        health = self.health[camera_idx]
+        if reason not in health.issues:
+            health.issues.append(reason)
+        if not health.failed:
+            health.failed = True
+            health.backoff = self.backoff_initial
+            health.next_retry = now + health.backoff
+        health.capture_fps = 0.0
+        health.inference_fps = 0.0
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self._thread = threading.Thread(target=self._monitor_loop, daemon=True, name="camera-monitor")
+        self._thread.start()
+        self.logger.info("Camera monitor started")
+
+    def stop(self):
+        self.running = False
+
+    def _monitor_loop(self):
+        while self.running:
+            time.sleep(self.check_interval)
+            try:
+                self.check()
+            except Exception as e:
+                self.logger.error(f"Camera monitor check failed: {str(e)}")
+
+    def check(self, now: Optional[float] = None):
+        """One health pass: detect stalls and frozen frames, retry failed cameras"""
+        now = time.monotonic() if now is None else now
+        failures, retries = [], []
+        with self._lock:
+            for idx, health in self.health.items():
+                if health.failed:
+                    if now >= health.next_retry:
+                        retries.append(idx)
+                    continue
+                if idx not in self.watched:
+                    continue
+                last_frame = health.last_capture if health.last_capture is not None else health.watched_since
+                if last_frame is not None and now - last_frame > self.stall_timeout:
+                    failures.append((idx, f"stalled: no frame for {now - last_frame:.1f}s"))
+                elif health.frozen_since is not None and now - health.frozen_since > self.frozen_after:
+                    failures.append((idx, f"frozen: identical frames for {now - health.frozen_since:.1f}s"))
+
+        for idx, reason in failures:
+            self.report_failure(idx, reason)
+        for idx in retries:
+            self._reconnect(idx, now)
+
+    def _reconnect(self, camera_idx: int, now: float):
+        health = self.health[camera_idx]
+        health.reconnect_attempts += 1
+        self.logger.info(f"Reconnecting camera {camera_idx} (attempt {health.reconnect_attempts})")
+        try:
+            ok = self.blocking_call(self.camera_manager.reopen, camera_idx)
+        except Exception as e:
+            self.logger.error(f"Reopening camera {camera_idx} raised: {str(e)}")
+            ok = False
+
+        with self._lock:
+            if not ok:
+                health.connected = False
+                health.backoff = min(health.backoff * 2, self.backoff_max)
+                health.next_retry = now + health.backoff
+                return
+            health.connected = True
+            health.failed = False
+            health.issues = []
+            health.reconnect_attempts = 0
+            health.reconnects += 1
+            health.last_capture = None
+            health.frozen_since = None
+            health.thumbnail = None
+        self.logger.info(f"Camera {camera_idx} reconnected")
+        if self.on_recovered:
+            self.on_recovered(camera_idx)
+
+    def is_failed(self, camera_idx: int) -> bool:
+        health = self.health.get(camera_idx)
+        return health is not None and health.failed
+
+    def get_status(self) -> Dict[int, dict]:
+        now = time.monotonic()
+        with self._lock:
+            return {idx: {
+                "active": idx in self.watched and not health.failed,
+                "connected": health.connected and not health.failed,
+                "fps": round(health.capture_fps, 2),
+                "inference_fps": round(health.inference_fps, 2),
+                "last_frame_age": round(now - health.last_capture, 3) if health.last_capture else None,
+                "frozen": health.frozen_since is not None,
+                "issues": list(health.issues),
+                "reconnect_attempts": health.reconnect_attempts,
+                "next_retry_in": round(max(0.0, health.next_retry - now), 2) if health.failed else None,
+                "reconnects": health.reconnects
+            } for idx, health in self.health.items()}
+
+    @property
+    def status(self) -> Dict[int, dict]:
+        return self.get_status()
@@ -1,10 +1,156 @@
 import numpy as np
-from typing import List, Dict
-from collections import defaultdict
+import threading
+import time
+from typing import List, Dict, Optional
+from collections import defaultdict, deque
+from dataclasses import dataclass
+
+@dataclass
+class FusionResult:
+    """Darts agreed on across cameras, as parallel arrays in board coordinates"""
+    timestamp: float
+    board_xy: np.ndarray      # (M, 2) confidence-weighted position
+    confidence: np.ndarray    # (M,) combined confidence
+    cameras: np.ndarray       # (M,) number of cameras that saw each dart
+    spread: np.ndarray        # (M,) weighted RMS distance of the views from the fused position
+    segment: np.ndarray
+    multiplier: np.ndarray
+    points: np.ndarray
+    camera_count: int         # cameras that contributed to this fusion
+    agreement: float          # 1.0 when every camera saw every dart
+
+    @property
+    def total(self) -> int:
+        return int(self.points.sum())
+
+    def to_dict(self) -> dict:
+        return {
+            "total": self.total,
+            "agreement": self.agreement,
+            "camera_count": self.camera_count,
+            "darts": [{
+                "position": [float(x), float(y)],
+                "confidence": float(conf),
+                "cameras": int(cams),
+                "spread": float(spread),
+                "segment": int(segment),
+                "multiplier": int(multiplier),
+                "points": int(points)
+            } for (x, y), conf, cams, spread, segment, multiplier, points in zip(
+                self.board_xy, self.confidence, self.cameras, self.spread,
+                self.segment, self.multiplier, self.points)]
+        }
 
 class ScoreAggregator:
-    def __init__(self, confidence_threshold: float = 0.3):
+    """Fuses the darts seen by several cameras into a single scored set.
+
+    Each camera submits its dart positions in calibrated board coordinates.
+    Views of the same dart from different cameras are matched within
+    `match_radius`, their positions combined by confidence weighting and
+    re-scored on the board geometry, so a dart seen by three cameras is
+    counted once.
+    """
+
+    def __init__(self, confidence_threshold: float = 0.3, match_radius: float = 1.0,
+                 max_skew: float = 0.1, stale_after: float = 2.0, geometry=None, history: int = 100):
         self.confidence_threshold = confidence_threshold
-        self.historical_scores = defaultdict(list)
-        
-    # ... implementation as provided ...
+        self.match_radius = match_radius
+        self.max_skew = max_skew
+        self.stale_after = stale_after
+        self.geometry = geometry
+        # Per-camera share of fused darts it agreed on, most recent last
+        self.historical_scores = defaultdict(lambda: deque(maxlen=history))
+
+        self._pending: Dict[int, tuple] = {}
+        # When the first observation of the fusion being collected arrived;
+        # a camera resubmitting replaces its observation but not this clock
+        self._round_started: Optional[float] = None
+        self._last_seen: Dict[int, float] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, camera_idx: int, board_xy: np.ndarray, confidence: np.ndarray,
+               timestamp: Optional[float] = None) -> Optional[FusionResult]:
+        """Add one camera's darts; returns a fusion once every active camera has
+        reported, or once `max_skew` has passed since the first pending report"""
+        timestamp = time.monotonic() if timestamp is None else timestamp
+        with self._lock:
+            if not self._pending:
+                self._round_started = timestamp
+            self._pending[camera_idx] = (np.asarray(board_xy, dtype=np.float64).reshape(-1, 2),
+                                         np.asarray(confidence, dtype=np.float64).ravel(), timestamp)
+            self._last_seen[camera_idx] = timestamp
+
+            active = {idx for idx, seen in self._last_seen.items() if timestamp - seen <= self.stale_after}
+            if not active.issubset(self._pending) and timestamp - self._round_started < self.max_skew:
+                return None
+
+            pending, self._pending = self._pending, {}
+            self._round_started = None
+        return self.fuse(pending)
+
+    def fuse(self, observations: Dict[int, tuple]) -> FusionResult:
+        cameras = sorted(observations)
+        xy = np.concatenate([observations[idx][0] for idx in cameras]) if cameras else np.zeros((0, 2))
+        conf = np.concatenate([observations[idx][1] for idx in cameras]) if cameras else np.zeros(0)
+        cam = np.concatenate([np.full(len(observations[idx][1]), idx) for idx in cameras]) if cameras else np.zeros(0, int)
+        timestamp = max((observations[idx][2] for idx in cameras), default=time.monotonic())
+
+        keep = conf >= self.confidence_threshold
+        xy, conf, cam = xy[keep], conf[keep], cam[keep]
+
+        dist = np.linalg.norm(xy[:, None, :] - xy[None, :, :], axis=2)
+        assigned = np.zeros(len(conf), dtype=bool)
+        clusters: List[np.ndarray] = []
+        # Seed clusters from the most confident views; each cluster takes at
+        # most one view per camera, the closest one within the match radius
+        for seed in np.argsort(-conf):
+            if assigned[seed]:
+                continue
+            candidates = np.flatnonzero(~assigned & (dist[seed] <= self.match_radius))
+            candidates = candidates[np.argsort(dist[seed, candidates])]
+            _, first = np.unique(cam[candidates], return_index=True)
+            members = candidates[first]
+            assigned[members] = True
+            clusters.append(members)
+
+        count = len(clusters)
+        fused_xy = np.zeros((count, 2))
+        fused_conf = np.zeros(count)
+        n_cameras = np.zeros(count, dtype=np.int32)
+        spread = np.zeros(count)
+        for i, members in enumerate(clusters):
+            weights = conf[members]
+            fused_xy[i] = np.average(xy[members], axis=0, weights=weights)
+            # Independent views: probability at least one of them is right
+            fused_conf[i] = 1.0 - np.prod(1.0 - weights)
+            n_cameras[i] = len(members)
+            spread[i] = np.sqrt(np.average(np.sum((xy[members] - fused_xy[i]) ** 2, axis=1), weights=weights))
+
+        if self.geometry is not None and count:
+            segment, multiplier = self.geometry.score_points(fused_xy)
+        else:
+            segment, multiplier = np.zeros(count, dtype=np.uint8), np.zeros(count, dtype=np.uint8)
+        points = segment.astype(np.int32) * multiplier
+
+        camera_count = len(cameras)
+        agreement = float(np.mean(n_cameras / camera_count)) if count and camera_count else 1.0
+        for idx in cameras:
+            seen = sum(1 for members in clusters if idx in cam[members])
+            self.historical_scores[idx].append(seen / count if count else 1.0)
+
+        return FusionResult(
+            timestamp=timestamp,
+            board_xy=fused_xy,
+            confidence=fused_conf,
+            cameras=n_cameras,
+            spread=spread,
+            segment=segment,
+            multiplier=multiplier,
+            points=points,
+            camera_count=camera_count,
+            agreement=agreement
+        )
+
+    def camera_agreement(self) -> Dict[int, float]:
+        """Average share of fused darts each camera agreed on; low values flag a bad view or calibration"""
+        return {idx: float(np.mean(history)) for idx, history in self.historical_scores.items() if history}
@@ -0,0 +1,167 @@
+import threading
+import time
+import logging
+from typing import Any, Callable, Dict, Hashable, List, Optional
+
+import numpy as np
+
+from utils.pipeline import FramePacket
+
+logger = logging.getLogger(__name__)
+
+
+class BatchInferenceScheduler:
+    """Runs one batched forward pass over the latest frame of every camera.
+
+    Each registered source keeps only its newest pending frame. Once a frame
+    is pending the scheduler waits at most `max_batch_wait` seconds for the
+    other sources to catch up, then runs them all through `run_batch` in a
+    single call and hands each result back to its own consumer. With
+    `concurrency` > 1 that many batches may be in flight at once, for a
+    `run_batch` backed by several inference workers.
+    """
+
+    def __init__(self,
+                 run_batch: Callable[[List[np.ndarray]], List[Any]],
+                 prepare: Optional[Callable[[FramePacket], np.ndarray]] = None,
+                 unpack: Optional[Callable[[FramePacket, Any], FramePacket]] = None,
+                 max_batch_wait: float = 0.02,
+                 max_batch_size: Optional[int] = None,
+                 poll_interval: float = 0.5,
+                 concurrency: int = 1):
+        self.run_batch = run_batch
+        self.prepare = prepare or (lambda packet: packet.frame)
+        self.unpack = unpack or self._attach_result
+        self.max_batch_wait = max_batch_wait
+        self.max_batch_size = max_batch_size
+        self.poll_interval = poll_interval
+        self.concurrency = concurrency
+        self.running = False
+
+        self._consumers: Dict[Hashable, Callable[[FramePacket], None]] = {}
+        self._pending: Dict[Hashable, FramePacket] = {}
+        self._first_pending_at: Optional[float] = None
+        self._cond = threading.Condition()
+        self._threads: List[threading.Thread] = []
+
+        self.batches = 0
+        self.frames_inferred = 0
+        self.dropped = 0
+        self.last_batch_time = 0.0
+        self.logger = logging.getLogger(__name__)
+
+    @staticmethod
+    def _attach_result(packet: FramePacket, result: Any) -> FramePacket:
+        packet.extras['result'] = result
+        return packet
+
+    def register(self, key: Hashable, consumer: Callable[[FramePacket], None]):
+        with self._cond:
+            self._consumers[key] = consumer
+
+    def unregister(self, key: Hashable):
+        with self._cond:
+            self._consumers.pop(key, None)
+            self._pending.pop(key, None)
+
+    def submit(self, key: Hashable, packet: FramePacket):
+        """Queue a frame for the next batch, replacing any unprocessed one from the same source"""
+        with self._cond:
+            if key not in self._consumers:
+                return
+            if key in self._pending:
+                self.dropped += 1
+            elif not self._pending:
+                self._first_pending_at = time.monotonic()
+            self._pending[key] = packet
+            self._cond.notify()
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self._threads = [threading.Thread(target=self._loop, daemon=True, name=f"batch-inference-{i}")
+                         for i in range(self.concurrency)]
+        for thread in self._threads:
+            thread.start()
+        self.logger.info(f"Batch inference started (max wait {self.max_batch_wait * 1000:.0f} ms)")
+
+    def stop(self):
+        self.running = False
+        with self._cond:
+            self._cond.notify_all()
+
+    def _batch_ready(self) -> bool:
+        if not self._pending:
+            return False
+        if self.max_batch_size and len(self._pending) >= self.max_batch_size:
+            return True
+        if len(self._pending) >= len(self._consumers):
+            return True
+        return time.monotonic() - self._first_pending_at >= self.max_batch_wait
+
+    def _take_batch(self) -> Optional[Dict[Hashable, FramePacket]]:
+        with self._cond:
+            if not self._pending:
+                self._cond.wait(self.poll_interval)
+            while self.running and self._pending and not self._batch_ready():
+                remaining = self.max_batch_wait - (time.monotonic() - self._first_pending_at)
+                self._cond.wait(max(remaining, 0.001))
+            if not self.running or not self._pending:
+                return None
+
+            # Oldest frames first when the batch is capped
+            keys = sorted(self._pending, key=lambda k: self._pending[k].timestamp)
+            if self.max_batch_size:
+                keys = keys[:self.max_batch_size]
+            batch = {key: self._pending.pop(key) for key in keys}
+            if self._pending:
+                self._first_pending_at = min(p.timestamp for p in self._pending.values())
+            return batch
+
+    def _loop(self):
+        while self.running:
+            batch = self._take_batch()
+            if not batch:
+                continue
+
+            keys = list(batch)
+            packets = [batch[key] for key in keys]
+            try:
+                frames = [self.prepare(packet) for packet in packets]
+                started = time.monotonic()
+                results = self.run_batch(frames)
+            except Exception as e:
+                self.logger.error(f"Batched inference failed for {len(packets)} frames: {str(e)}")
+                continue
+            elapsed = self.last_batch_time = time.monotonic() - started
+            self.batches += 1
+            self.frames_inferred += len(packets)
+
+            for key, packet, result in zip(keys, packets, results):
+                consumer = self._consumers.get(key)
+                if consumer is None:
+                    continue
+                packet.extras['batch_size'] = len(packets)
+                packet.extras['inference_started'] = started
+                packet.extras['inference_time'] = elapsed
+                try:
+                    consumer(self.unpack(packet, result))
+                except Exception as e:
+                    self.logger.error(f"Failed to deliver inference result for camera {packet.camera_idx}: {str(e)}")
+
+    @property
+    def pending(self) -> int:
+        """Sources with a frame waiting for the next batch"""
+        return len(self._pending)
+
+    def stats(self) -> dict:
+        return {
+            'batches': self.batches,
+            'pending': self.pending,
+            'frames_inferred': self.frames_inferred,
+            'average_batch_size': self.frames_inferred / self.batches if self.batches else 0,
+            'last_batch_time': self.last_batch_time,
+            'dropped': self.dropped,
+            'sources': len(self._consumers),
+        }
@@ -1,12 +1,37 @@
 import cv2
 import numpy as np
-from typing import Tuple, List, Optional
+from typing import Dict, Tuple, List, Optional
 
 class BoardCalibrator:
-    def __init__(self):
+    def __init__(self, camera_matrix: Optional[np.ndarray] = None, dist_coeffs: Optional[np.ndarray] = None):
         self.reference_points = []
         self.calibration_matrix = None
         self.board_dimensions = (45, 45)  # Standard dartboard dimensions in cm
+        # Optional lens intrinsics, folded into the remap tables
+        self.camera_matrix = camera_matrix
+        self.dist_coeffs = dist_coeffs
+        # Fixed-point cv2.remap tables per (width, height), rebuilt only when
+        # the calibration changes
+        self._remap_cache: Dict[Tuple[int, int], Tuple[np.ndarray, np.ndarray]] = {}
+        # Bumped whenever the pixel -> board mapping changes, so anything
+        # derived from it (remap tables, scoring lookup tables) can be rebuilt
+        self.version = 0
+
+    def set_intrinsics(self, camera_matrix: np.ndarray, dist_coeffs: np.ndarray):
+        """Set lens intrinsics so calibrated frames are also undistorted"""
+        self.camera_matrix = np.asarray(camera_matrix, dtype=np.float64).reshape(3, 3)
+        self.dist_coeffs = np.asarray(dist_coeffs, dtype=np.float64).ravel()
+        self._calculate_calibration_matrix()
+
+    def _has_intrinsics(self) -> bool:
+        return self.camera_matrix is not None and self.dist_coeffs is not None
+
+    def _undistort_points(self, points: np.ndarray) -> np.ndarray:
+        """Map raw (distorted) pixel coordinates to undistorted pixel coordinates"""
+        points = np.float32(points).reshape(-1, 1, 2)
+        if not self._has_intrinsics():
+            return points
+        return cv2.undistortPoints(points, self.camera_matrix, self.dist_coeffs, P=self.camera_matrix)
         
     def set_reference_points(self, points: List[Tuple[int, int]]):
         """Set reference points for calibration (corners of the dartboard)"""
@@ -29,8 +54,34 @@ class BoardCalibrator:
             [0, board_height]
         ])
         
-        src_points = np.float32(self.reference_points)
+        src_points = self._undistort_points(self.reference_points).reshape(4, 2)
         self.calibration_matrix = cv2.getPerspectiveTransform(src_points, dst_points)
+        self._remap_cache.clear()
+        self.version += 1
+
+    @property
+    def is_calibrated(self) -> bool:
+        return self.calibration_matrix is not None
+
+    def _build_remap(self, width: int, height: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Precompute, for every output pixel, the source pixel to sample"""
+        xs, ys = np.meshgrid(np.arange(width, dtype=np.float64), np.arange(height, dtype=np.float64))
+        dst = np.stack([xs.ravel(), ys.ravel(), np.ones(xs.size)])
+
+        # Output pixel -> undistorted source pixel (same sampling as warpPerspective)
+        src = np.linalg.inv(self.calibration_matrix) @ dst
+        src_xy = (src[:2] / src[2]).T
+
+        if self._has_intrinsics():
+            # Undistorted pixel -> raw pixel through the lens model
+            normalized = cv2.convertPointsToHomogeneous(
+                cv2.undistortPoints(src_xy.reshape(-1, 1, 2), self.camera_matrix, None)
+            ).astype(np.float64)
+            src_xy, _ = cv2.projectPoints(normalized, np.zeros(3), np.zeros(3), self.camera_matrix, self.dist_coeffs)
+
+        map_x = src_xy[..., 0].reshape(height, width).astype(np.float32)
+        map_y = src_xy[..., 1].reshape(height, width).astype(np.float32)
+        return cv2.convertMaps(map_x, map_y, cv2.CV_16SC2)
     
     def calibrate_frame(self, frame: np.ndarray) -> Optional[np.ndarray]:
         """Apply calibration transform to frame"""
@@ -38,21 +89,37 @@ class BoardCalibrator:
             return None
             
         height, width = frame.shape[:2]
-        return cv2.warpPerspective(
-            frame,
-            self.calibration_matrix,
-            (width, height)
-        )
+        maps = self._remap_cache.get((width, height))
+        if maps is None:
+            maps = self._remap_cache[(width, height)] = self._build_remap(width, height)
+        return cv2.remap(frame, maps[0], maps[1], cv2.INTER_LINEAR)
     
+    def get_board_roi(self) -> Optional[Tuple[int, int, int, int]]:
+        """Bounding box (x, y, w, h) of the board in camera pixels, if known"""
+        if len(self.reference_points) != 4:
+            return None
+        points = np.int32(self.reference_points)
+        x, y = points.min(axis=0)
+        x2, y2 = points.max(axis=0)
+        return (int(x), int(y), int(x2 - x), int(y2 - y))
+
     def get_real_coordinates(self, pixel_coords: Tuple[int, int]) -> Tuple[float, float]:
         """Convert pixel coordinates to real-world coordinates (in cm)"""
         if self.calibration_matrix is None:
             return pixel_coords
             
-        points = np.float32([pixel_coords]).reshape(-1, 1, 2)
+        points = self._undistort_points([pixel_coords])
         transformed_points = cv2.perspectiveTransform(points, self.calibration_matrix)
         return tuple(transformed_points[0][0])
     
+    def to_board_coordinates(self, pixel_coords: np.ndarray) -> np.ndarray:
+        """Vectorized get_real_coordinates for an (N, 2) array of pixel positions"""
+        points = np.asarray(pixel_coords, dtype=np.float32).reshape(-1, 2)
+        if self.calibration_matrix is None or points.shape[0] == 0:
+            return points
+        transformed = cv2.perspectiveTransform(self._undistort_points(points), self.calibration_matrix)
+        return transformed.reshape(-1, 2)
+
     def detect_board_automatically(self, frame: np.ndarray) -> bool:
         """Attempt to automatically detect dartboard in frame"""
         gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
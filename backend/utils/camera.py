@@ -1,39 +1,252 @@
 import cv2
-from typing import Dict, Optional
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, Optional, Set
 import logging
+import threading
+import time
 import numpy as np
 
+@dataclass
+class CapturedFrame:
+    camera_idx: int
+    frame: np.ndarray
+    timestamp: float  # time.monotonic() right after the grab, i.e. closest to exposure
+    seq: int          # capture round; frames of one synchronized round share it
+    skew: float = 0.0 # spread of the grab times within the round
+
 class CameraManager:
-    def __init__(self, camera_indices: list):
+    """Owns the capture devices and reads them individually or in lockstep.
+
+    Synchronized capture grabs every active camera back-to-back and only then
+    retrieves (decodes) the frames, so the frames of one round are exposed
+    as close together in time as the drivers allow. `start_sync` runs that in
+    a background loop; pipelines pull their camera's latest frame with
+    `wait_frame`.
+    """
+
+    def __init__(self, camera_indices: list, blocking_call: Optional[Callable] = None,
+                 capture_factory: Optional[Callable[[int], cv2.VideoCapture]] = None):
         self.cameras: Dict[int, cv2.VideoCapture] = {}
-        self.frame_count = 0
+        # Opens a device by index; swap in Recording.capture to replay from disk
+        self.capture_factory = capture_factory or cv2.VideoCapture
+        self.frame_counts: Dict[int, int] = {}
+        self.skipped: Dict[int, int] = {}
+        self.grab_failures: Dict[int, int] = {}
+        # Held while a capture object is in use, so reopen() never releases
+        # a device in the middle of a grab or retrieve
+        self._camera_locks: Dict[int, threading.Lock] = {}
+        # Wraps the blocking driver calls, e.g. eventlet.tpool.execute
+        self.blocking_call = blocking_call or (lambda fn, *args: fn(*args))
         self.logger = logging.getLogger(__name__)
-        
+
+        self.active: Set[int] = set()
+        self.latest: Dict[int, Optional[CapturedFrame]] = {}
+        self.rounds = 0
+        self.sync_errors = 0
+        self.last_skew = 0.0
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self.running = False
+
         for idx in camera_indices:
             self.initialize_camera(idx)
-    
+
     def initialize_camera(self, idx: int) -> bool:
-        cap = cv2.VideoCapture(idx)
+        cap = self.capture_factory(idx)
         if cap.isOpened():
-            self.cameras[idx] = cap
+            # Keep the driver queue to a single frame so reads are always fresh
+            cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+            self.add_capture(idx, cap)
             self.logger.info(f"Camera {idx} initialized")
             return True
         self.logger.warning(f"Failed to initialize camera {idx}")
         return False
 
+    def add_capture(self, idx: int, cap) -> None:
+        """Register an already opened capture source under a camera index"""
+        self._camera_lock(idx)
+        self.cameras[idx] = cap
+        self.frame_counts.setdefault(idx, 0)
+        self.skipped.setdefault(idx, 0)
+        self.grab_failures.setdefault(idx, 0)
+
+    def _camera_lock(self, idx: int) -> threading.Lock:
+        return self._camera_locks.setdefault(idx, threading.Lock())
+
+    def reopen(self, idx: int) -> bool:
+        """Release and reopen a device, e.g. after it was unplugged.
+
+        Waits for a capture round using the device to finish; rounds that
+        start meanwhile report the camera as failed.
+        """
+        with self._camera_lock(idx):
+            cap = self.cameras.pop(idx, None)
+            if cap is not None:
+                cap.release()
+            return self.initialize_camera(idx)
+
     def get_frame(self, camera_idx: int, skip_frames: int = 2) -> Optional[np.ndarray]:
         if camera_idx not in self.cameras:
             return None
-            
-        cap = self.cameras[camera_idx]
-        self.frame_count += 1
-        
-        if self.frame_count % skip_frames != 0:
+
+        # Counted per camera so cameras don't skip each other's frames
+        self.frame_counts[camera_idx] += 1
+
+        if self.frame_counts[camera_idx] % skip_frames != 0:
+            self.skipped[camera_idx] += 1
             return None
-            
-        ret, frame = cap.read()
+
+        with self._camera_lock(camera_idx):
+            cap = self.cameras.get(camera_idx)
+            ret, frame = cap.read() if cap is not None else (False, None)
         return frame if ret else None
 
+    def read(self, camera_idx: int) -> Optional[CapturedFrame]:
+        """Unsynchronized read of one camera, with its capture timestamp"""
+        with self._camera_lock(camera_idx):
+            cap = self.cameras.get(camera_idx)
+            if cap is None or not cap.grab():
+                return None
+            timestamp = time.monotonic()
+            ret, frame = cap.retrieve()
+        if not ret:
+            return None
+        self.frame_counts[camera_idx] += 1
+        return CapturedFrame(camera_idx, frame, timestamp, self.frame_counts[camera_idx])
+
+    def capture_synchronized(self, camera_indices: Optional[Iterable[int]] = None) -> Dict[int, Optional[CapturedFrame]]:
+        """Grab all cameras back-to-back, then retrieve; failed cameras, and
+        cameras being reopened, map to None"""
+        indices = [idx for idx in (camera_indices if camera_indices is not None else list(self.cameras))
+                   if idx in self.cameras]
+        # Hold every camera of the round; one that is being reopened is skipped
+        # rather than waited for, so it cannot hold up the others
+        locked = [idx for idx in indices if self._camera_lock(idx).acquire(blocking=False)]
+        try:
+            cameras = {idx: self.cameras[idx] for idx in locked if idx in self.cameras}
+            grabbed: Dict[int, float] = {}
+            for idx, cap in cameras.items():
+                if self._call_capture(idx, cap.grab):
+                    grabbed[idx] = time.monotonic()
+                else:
+                    self.grab_failures[idx] += 1
+
+            self.rounds += 1
+            skew = max(grabbed.values()) - min(grabbed.values()) if grabbed else 0.0
+            self.last_skew = skew
+
+            frames: Dict[int, Optional[CapturedFrame]] = {idx: None for idx in indices}
+            for idx, timestamp in grabbed.items():
+                ret, frame = self._call_capture(idx, cameras[idx].retrieve) or (False, None)
+                if ret:
+                    self.frame_counts[idx] += 1
+                    frames[idx] = CapturedFrame(idx, frame, timestamp, self.rounds, skew)
+                else:
+                    self.grab_failures[idx] += 1
+        finally:
+            for idx in locked:
+                self._camera_lock(idx).release()
+        return frames
+
+    def _call_capture(self, idx: int, method: Callable):
+        """Call a capture method; a driver error fails only that camera's read"""
+        try:
+            return method()
+        except Exception as e:
+            self.logger.error(f"Camera {idx} {method.__name__} raised: {str(e)}")
+            return None
+
+    def set_active(self, camera_idx: int, active: bool):
+        """Include or drop a camera from the synchronized capture loop"""
+        with self._cond:
+            if active:
+                self.active.add(camera_idx)
+            else:
+                self.active.discard(camera_idx)
+                self.latest.pop(camera_idx, None)
+            self._cond.notify_all()
+
+    def start_sync(self):
+        if self.running:
+            return
+        self.running = True
+        self._thread = threading.Thread(target=self._sync_loop, daemon=True, name="camera-sync")
+        self._thread.start()
+        self.logger.info("Synchronized capture started")
+
+    def stop_sync(self):
+        self.running = False
+        with self._cond:
+            self._cond.notify_all()
+
+    def _sync_loop(self):
+        while self.running:
+            with self._cond:
+                if not self.active:
+                    self._cond.wait(0.5)
+                    continue
+                indices = sorted(self.active)
+            try:
+                frames = self.blocking_call(self.capture_synchronized, indices)
+                failed = False
+            except Exception as e:
+                # Report the round's cameras as failed so the monitor can
+                # reopen them, and keep the loop alive for the next round
+                self.logger.error(f"Synchronized capture round failed: {str(e)}")
+                self.sync_errors += 1
+                frames = {idx: None for idx in indices}
+                failed = True
+            with self._cond:
+                for idx, captured in frames.items():
+                    if idx in self.active:
+                        self.latest[idx] = captured
+                self._cond.notify_all()
+                if failed:
+                    # Don't spin on a round that keeps failing
+                    self._cond.wait(0.1)
+
+    def wait_frame(self, camera_idx: int, after: int = 0, timeout: float = 2.0) -> Optional[CapturedFrame]:
+        """Next synchronized frame of a camera newer than round `after`;
+        None if the camera failed or nothing arrived within `timeout`"""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                if camera_idx in self.latest:
+                    captured = self.latest[camera_idx]
+                    if captured is None:
+                        return None
+                    if captured.seq > after:
+                        return captured
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self.running:
+                    return None
+                self._cond.wait(remaining)
+
+    def reader(self, camera_idx: int) -> Callable[[], Optional[tuple]]:
+        """Frame source for a CameraPipeline fed by the synchronized loop"""
+        last = {'seq': 0}
+
+        def read():
+            captured = self.wait_frame(camera_idx, last['seq'])
+            if captured is None:
+                return None
+            last['seq'] = captured.seq
+            return captured.frame, captured.timestamp
+        return read
+
+    def stats(self) -> dict:
+        return {
+            'rounds': self.rounds,
+            'sync_errors': self.sync_errors,
+            'last_skew_ms': self.last_skew * 1000,
+            'active': sorted(self.active),
+            'frames': dict(self.frame_counts),
+            'skipped': dict(self.skipped),
+            'grab_failures': dict(self.grab_failures),
+        }
+
     def release_all(self):
-        for cap in self.cameras.values():
-            cap.release()
\ No newline at end of file
+        self.stop_sync()
+        for idx, cap in list(self.cameras.items()):
+            with self._camera_lock(idx):
+                cap.release()
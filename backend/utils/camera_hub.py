@@ -0,0 +1,120 @@
+import threading
+import logging
+from typing import Any, Callable, Dict, Hashable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class CameraHub:
+    """Owns at most one processing pipeline per camera and who it feeds.
+
+    Subscribers (client rooms) are reference counted per camera: the first
+    subscriber starts the camera's pipeline through `start_pipeline`, every
+    later one just joins the broadcast, and the pipeline is stopped once the
+    last one leaves so an unwatched camera costs nothing.
+    """
+
+    def __init__(self, start_pipeline: Callable[[int], Any],
+                 stop_pipeline: Optional[Callable[[int, Any], None]] = None):
+        self.start_pipeline = start_pipeline
+        self.stop_pipeline = stop_pipeline or (lambda camera_idx, pipeline: pipeline.stop())
+        self._pipelines: Dict[int, Any] = {}
+        self._subscribers: Dict[int, Dict[Hashable, dict]] = {}
+        self._lock = threading.RLock()
+
+    def subscribe(self, camera_idx: int, subscriber: Hashable, start: bool = True, **info) -> int:
+        """Add a subscriber, starting the camera if needed; returns its subscriber count.
+        With `start=False` the subscription waits for `resume`, e.g. while the camera reconnects"""
+        with self._lock:
+            subscribers = self._subscribers.setdefault(camera_idx, {})
+            # Subscribing again only refreshes the subscriber's info
+            subscribers[subscriber] = info
+            if start and camera_idx not in self._pipelines:
+                try:
+                    self._pipelines[camera_idx] = self.start_pipeline(camera_idx)
+                except Exception:
+                    self._subscribers.pop(camera_idx, None)
+                    raise
+                logger.info(f"Camera {camera_idx} started for {subscriber}")
+            return len(subscribers)
+
+    def update(self, camera_idx: int, subscriber: Hashable, **info) -> bool:
+        """Merge new info into an existing subscription; False if not subscribed"""
+        with self._lock:
+            subscribers = self._subscribers.get(camera_idx, {})
+            if subscriber not in subscribers:
+                return False
+            subscribers[subscriber] = {**subscribers[subscriber], **info}
+            return True
+
+    def unsubscribe(self, camera_idx: int, subscriber: Hashable) -> int:
+        """Remove a subscriber, stopping the camera after the last one; returns the remaining count"""
+        with self._lock:
+            subscribers = self._subscribers.get(camera_idx, {})
+            subscribers.pop(subscriber, None)
+            if subscribers:
+                return len(subscribers)
+            self.stop_camera(camera_idx)
+            return 0
+
+    def unsubscribe_all(self, subscriber: Hashable) -> List[int]:
+        """Drop a subscriber from every camera, e.g. on disconnect; returns the cameras it left"""
+        with self._lock:
+            cameras = [idx for idx, subscribers in self._subscribers.items() if subscriber in subscribers]
+            for camera_idx in cameras:
+                self.unsubscribe(camera_idx, subscriber)
+            return cameras
+
+    def stop_camera(self, camera_idx: int) -> Dict[Hashable, dict]:
+        """Stop a camera regardless of subscribers; returns the subscribers it had"""
+        with self._lock:
+            subscribers = self._subscribers.pop(camera_idx, {})
+            pipeline = self._pipelines.pop(camera_idx, None)
+        if pipeline is not None:
+            self.stop_pipeline(camera_idx, pipeline)
+            logger.info(f"Camera {camera_idx} stopped")
+        return subscribers
+
+    def suspend(self, camera_idx: int) -> Dict[Hashable, dict]:
+        """Stop a camera's pipeline but keep its subscribers for `resume`"""
+        with self._lock:
+            pipeline = self._pipelines.pop(camera_idx, None)
+            subscribers = dict(self._subscribers.get(camera_idx, {}))
+        if pipeline is not None:
+            self.stop_pipeline(camera_idx, pipeline)
+            logger.info(f"Camera {camera_idx} suspended")
+        return subscribers
+
+    def resume(self, camera_idx: int) -> bool:
+        """Restart a suspended camera if anyone is still subscribed"""
+        with self._lock:
+            if camera_idx in self._pipelines or not self._subscribers.get(camera_idx):
+                return False
+            self._pipelines[camera_idx] = self.start_pipeline(camera_idx)
+            logger.info(f"Camera {camera_idx} resumed")
+            return True
+
+    def subscribers(self, camera_idx: int) -> Dict[Hashable, dict]:
+        with self._lock:
+            return dict(self._subscribers.get(camera_idx, {}))
+
+    def all_subscribers(self) -> Dict[Hashable, dict]:
+        """Every subscriber of any camera, each once"""
+        with self._lock:
+            merged: Dict[Hashable, dict] = {}
+            for subscribers in self._subscribers.values():
+                merged.update(subscribers)
+            return merged
+
+    def pipeline(self, camera_idx: int):
+        return self._pipelines.get(camera_idx)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                camera_idx: {
+                    'subscribers': len(self._subscribers.get(camera_idx, {})),
+                    'pipeline': pipeline.stats() if hasattr(pipeline, 'stats') else None
+                }
+                for camera_idx, pipeline in self._pipelines.items()
+            }
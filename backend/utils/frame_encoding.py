@@ -0,0 +1,88 @@
+import base64
+import logging
+from dataclasses import dataclass
+from typing import Dict, Iterable, Optional
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class QualityTier:
+    """How a client wants frames: longest side cap (None for full size) and JPEG quality"""
+    max_width: Optional[int]
+    jpeg_quality: int
+
+
+# Named tiers clients can ask for; spectators only need thumbnails
+QUALITY_TIERS: Dict[str, QualityTier] = {
+    'full': QualityTier(max_width=None, jpeg_quality=85),
+    'standard': QualityTier(max_width=960, jpeg_quality=75),
+    'thumbnail': QualityTier(max_width=320, jpeg_quality=60),
+}
+DEFAULT_TIER = 'standard'
+
+MIN_WIDTH = 160
+MIN_QUALITY = 30
+MAX_QUALITY = 95
+
+
+def negotiate_tier(request: Optional[dict]) -> QualityTier:
+    """Tier for a client's quality request: a tier name, optionally overridden by
+    explicit 'max_width' / 'jpeg_quality', clamped to sane limits"""
+    request = request or {}
+    tier = QUALITY_TIERS.get(request.get('quality'), QUALITY_TIERS[DEFAULT_TIER])
+
+    max_width = request.get('max_width', tier.max_width)
+    if max_width is not None:
+        max_width = max(MIN_WIDTH, int(max_width))
+    jpeg_quality = int(request.get('jpeg_quality', tier.jpeg_quality))
+    jpeg_quality = min(MAX_QUALITY, max(MIN_QUALITY, jpeg_quality))
+    return QualityTier(max_width=max_width, jpeg_quality=jpeg_quality)
+
+
+@dataclass
+class EncodedFrame:
+    data: bytes
+    width: int
+    height: int
+    scale: float  # encoded size / source size, for mapping boxes onto the image
+    jpeg_quality: int
+
+
+class FrameEncoder:
+    """JPEG-encodes a frame once per distinct tier, however many clients want it"""
+
+    def __init__(self):
+        self.encodes = 0
+        self.bytes_encoded = 0
+
+    def encode(self, frame: np.ndarray, tier: QualityTier) -> EncodedFrame:
+        height, width = frame.shape[:2]
+        scale = 1.0
+        if tier.max_width is not None and width > tier.max_width:
+            scale = tier.max_width / width
+            frame = cv2.resize(frame, (tier.max_width, max(1, round(height * scale))), interpolation=cv2.INTER_AREA)
+
+        ok, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, tier.jpeg_quality])
+        if not ok:
+            raise ValueError("JPEG encoding failed")
+        data = buffer.tobytes()
+        self.encodes += 1
+        self.bytes_encoded += len(data)
+        return EncodedFrame(data=data, width=frame.shape[1], height=frame.shape[0],
+                            scale=scale, jpeg_quality=tier.jpeg_quality)
+
+    def encode_tiers(self, frame: np.ndarray, tiers: Iterable[QualityTier]) -> Dict[QualityTier, EncodedFrame]:
+        return {tier: self.encode(frame, tier) for tier in set(tiers)}
+
+
+def decode_frame(data) -> Optional[np.ndarray]:
+    """Decode an uploaded image sent as binary, or as base64 text from older clients"""
+    if data is None:
+        return None
+    if isinstance(data, str):
+        data = base64.b64decode(data.split(',', 1)[-1])
+    return cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
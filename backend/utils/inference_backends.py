@@ -0,0 +1,87 @@
+import os
+import logging
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Backend name -> exported weights, relative to the directory holding best.pt.
+# Everything except 'torch' is produced by export_model.py
+BACKEND_WEIGHTS: Dict[str, str] = {
+    'torch': 'best.pt',
+    'onnx': 'best.onnx',
+    'onnx-int8': 'best_int8.onnx',
+    'openvino': 'best_openvino_model',
+    'openvino-int8': 'best_int8_openvino_model',
+}
+
+DEFAULT_BACKEND = 'torch'
+
+
+def resolve_weights(backend: str, model_dir: str) -> str:
+    if backend not in BACKEND_WEIGHTS:
+        raise ValueError(f"Unknown inference backend '{backend}', expected one of {sorted(BACKEND_WEIGHTS)}")
+    return os.path.join(model_dir, BACKEND_WEIGHTS[backend])
+
+
+@dataclass
+class Detections:
+    """One frame's boxes as plain arrays, cheap to pickle across processes"""
+    xywh: np.ndarray   # (N, 4) box centers and sizes in input-frame pixels
+    cls: np.ndarray    # (N,) class ids
+    conf: np.ndarray   # (N,)
+
+
+class InferenceBackend:
+    """A YOLO detector behind a single call signature, whatever runtime it uses.
+
+    Ultralytics picks the runtime from the weights format (PyTorch, ONNX
+    Runtime or OpenVINO), so the rest of the server only ever calls
+    `backend(frames)` and gets the same Results objects back.
+    """
+
+    def __init__(self, name: str, weights: str, imgsz: int = 640, conf: float = 0.5, device: str = 'cpu'):
+        from ultralytics import YOLO
+
+        self.name = name
+        self.weights = weights
+        self.imgsz = imgsz
+        self.conf = conf
+        self.device = device
+        self.model = YOLO(weights, task='detect')
+
+    @property
+    def names(self) -> Dict[int, str]:
+        return self.model.names
+
+    def __call__(self, frames: List[np.ndarray], **kwargs) -> list:
+        options = {'imgsz': self.imgsz, 'conf': self.conf, 'device': self.device, 'verbose': False}
+        options.update(kwargs)
+        return self.model(frames, **options)
+
+    def detect(self, frames: List[np.ndarray], **kwargs) -> List[Detections]:
+        return [Detections(xywh=result.boxes.xywh.cpu().numpy(),
+                           cls=result.boxes.cls.cpu().numpy().astype(np.int32),
+                           conf=result.boxes.conf.cpu().numpy())
+                for result in self(frames, **kwargs)]
+
+    def warmup(self, runs: int = 2):
+        frame = np.zeros((self.imgsz, self.imgsz, 3), dtype=np.uint8)
+        for _ in range(runs):
+            self([frame])
+
+
+def load_backend(name: Optional[str], model_dir: str, imgsz: int = 640, conf: float = 0.5,
+                 device: str = 'cpu') -> InferenceBackend:
+    """Load the configured backend, falling back to PyTorch if its export is missing"""
+    name = name or DEFAULT_BACKEND
+    weights = resolve_weights(name, model_dir)
+    if not os.path.exists(weights) and name != DEFAULT_BACKEND:
+        logger.warning(f"No exported weights for backend '{name}' at {weights}, "
+                       f"run export_model.py; falling back to {DEFAULT_BACKEND}")
+        name, weights = DEFAULT_BACKEND, resolve_weights(DEFAULT_BACKEND, model_dir)
+    backend = InferenceBackend(name, weights, imgsz=imgsz, conf=conf, device=device)
+    logger.info(f"Loaded {name} inference backend from {weights}")
+    return backend
@@ -0,0 +1,301 @@
+import os
+import sys
+import json
+import queue
+import logging
+import argparse
+import subprocess
+import threading
+import time
+from multiprocessing import Pipe, resource_tracker
+from multiprocessing.connection import Connection
+from multiprocessing.shared_memory import SharedMemory
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+BACKEND_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class InferencePool:
+    """Runs the detector in separate worker processes.
+
+    Under eventlet the web process only has one OS thread for all sockets,
+    so any Python-heavy work in pre/post-processing stalls every client. Here
+    inference happens in child processes instead. Frames are copied into
+    fixed-size slots of one shared memory block and only the slot offsets
+    cross the pipe; the small per-frame box arrays come back pickled.
+
+    Each worker gets its own torch/OpenMP thread count and, where the OS
+    supports it, its own set of CPU cores so workers do not contend.
+    `blocking_call` wraps the waits for a worker's reply and for a worker to
+    start, e.g. `eventlet.tpool.execute`, so green threads keep running
+    meanwhile. A worker that dies is restarted in the background.
+    """
+
+    def __init__(self,
+                 backend: str,
+                 model_dir: str,
+                 imgsz: int = 640,
+                 conf: float = 0.5,
+                 workers: int = 2,
+                 threads_per_worker: int = 2,
+                 pin_cpus: bool = True,
+                 slot_bytes: int = 1920 * 1080 * 3,
+                 slots: Optional[int] = None,
+                 blocking_call: Optional[Callable] = None,
+                 startup_timeout: float = 120.0,
+                 restart_backoff: float = 1.0,
+                 restart_backoff_max: float = 30.0):
+        self.backend = backend
+        self.model_dir = model_dir
+        self.imgsz = imgsz
+        self.conf = conf
+        self.workers = workers
+        self.threads_per_worker = threads_per_worker
+        self.pin_cpus = pin_cpus
+        self.slot_bytes = slot_bytes
+        self.slots = slots or workers * 4
+        self.blocking_call = blocking_call or (lambda fn, *args: fn(*args))
+        self.startup_timeout = startup_timeout
+        self.restart_backoff = restart_backoff
+        self.restart_backoff_max = restart_backoff_max
+
+        self.names: Dict[int, str] = {}
+        self.requests = 0
+        self.failures = 0
+        self.restarts = 0
+
+        self._shm: Optional[SharedMemory] = None
+        self._procs: List[Optional[subprocess.Popen]] = [None] * workers
+        self._conns: List[Optional[Connection]] = [None] * workers
+        self._idle: queue.Queue = queue.Queue()
+        self._free_slots: queue.Queue = queue.Queue()
+        self._request_id = 0
+        self._lock = threading.Lock()
+        self._slot_lock = threading.Lock()
+
+    def _cpu_sets(self) -> List[Optional[List[int]]]:
+        if not self.pin_cpus or not hasattr(os, 'sched_getaffinity'):
+            return [None] * self.workers
+        cpus = sorted(os.sched_getaffinity(0))
+        per_worker = max(1, min(self.threads_per_worker, len(cpus) // self.workers))
+        # Wrap around when there are more worker threads than cores
+        return [[cpus[(i * per_worker + j) % len(cpus)] for j in range(per_worker)]
+                for i in range(self.workers)]
+
+    def start(self):
+        if self._shm is not None:
+            return
+        self._shm = SharedMemory(create=True, size=self.slot_bytes * self.slots)
+        for slot in range(self.slots):
+            self._free_slots.put(slot)
+
+        cpu_sets = self._cpu_sets()
+        for worker in range(self.workers):
+            self._spawn(worker, cpu_sets[worker])
+        for worker in range(self.workers):
+            self._await_ready(worker)
+            self._idle.put(worker)
+        logger.info(f"Inference pool started: {self.workers} x {self.backend} workers, "
+                    f"{self.threads_per_worker} threads each, {self.slots} shared frame slots")
+
+    def _spawn(self, worker: int, cpus: Optional[List[int]]):
+        parent, child = Pipe()
+        config = {
+            'shm': self._shm.name,
+            'backend': self.backend,
+            'model_dir': self.model_dir,
+            'imgsz': self.imgsz,
+            'conf': self.conf,
+            'threads': self.threads_per_worker,
+            'cpus': cpus,
+        }
+        env = dict(os.environ)
+        # Set before torch is imported in the child, so its pools start at this size
+        for var in ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS'):
+            env[var] = str(self.threads_per_worker)
+
+        # A fresh interpreter rather than fork/spawn: forking an eventlet-patched
+        # process is unsafe, and spawn would re-run app.py's module-level setup
+        self._procs[worker] = subprocess.Popen(
+            [sys.executable, '-m', 'utils.inference_pool', '--fd', str(child.fileno()), '--config', json.dumps(config)],
+            cwd=BACKEND_ROOT,
+            env=env,
+            pass_fds=(child.fileno(),)
+        )
+        child.close()
+        self._conns[worker] = parent
+
+    def _await_ready(self, worker: int):
+        conn = self._conns[worker]
+        # Loading the model can take a while; don't hold up the caller's hub meanwhile
+        if not self.blocking_call(conn.poll, self.startup_timeout):
+            raise RuntimeError(f"Inference worker {worker} did not start within {self.startup_timeout}s")
+        status, payload = self.blocking_call(conn.recv)
+        if status != 'ready':
+            raise RuntimeError(f"Inference worker {worker} failed to start: {payload}")
+        self.names = payload
+
+    def _restart(self, worker: int):
+        self.restarts += 1
+        proc = self._procs[worker]
+        if proc is not None and proc.poll() is None:
+            proc.kill()
+        self._conns[worker].close()
+        self._spawn(worker, self._cpu_sets()[worker])
+        self._await_ready(worker)
+
+    def _replace(self, worker: int):
+        """Restart a dead worker in the background; it only rejoins the idle
+        workers once a restart succeeded, retrying with backoff until then"""
+        def run():
+            delay = self.restart_backoff
+            while self._shm is not None:
+                try:
+                    self._restart(worker)
+                except Exception as e:
+                    logger.error(f"Restarting inference worker {worker} failed, retrying in {delay:.0f}s: {str(e)}")
+                    time.sleep(delay)
+                    delay = min(delay * 2, self.restart_backoff_max)
+                    continue
+                logger.info(f"Inference worker {worker} restarted")
+                self._idle.put(worker)
+                return
+
+        threading.Thread(target=run, daemon=True, name=f"inference-restart-{worker}").start()
+
+    def __call__(self, frames: Sequence[np.ndarray]) -> list:
+        """Detections for each frame, run by whichever worker is free"""
+        if self._shm is None:
+            raise RuntimeError("Inference pool is not started")
+
+        if len(frames) > self.slots:
+            raise ValueError(f"Batch of {len(frames)} frames exceeds the {self.slots} shared frame slots")
+        # Take all of a batch's slots at once so concurrent callers cannot deadlock on partial sets
+        with self._slot_lock:
+            slots = [self._free_slots.get() for _ in frames]
+        worker = self._idle.get()
+        alive = True
+        try:
+            views = []
+            for slot, frame in zip(slots, frames):
+                frame = np.ascontiguousarray(frame)
+                if frame.nbytes > self.slot_bytes:
+                    raise ValueError(f"Frame of {frame.nbytes} bytes exceeds the {self.slot_bytes} byte slot size")
+                offset = slot * self.slot_bytes
+                np.ndarray(frame.shape, frame.dtype, buffer=self._shm.buf, offset=offset)[...] = frame
+                views.append((offset, frame.shape, frame.dtype.str))
+
+            with self._lock:
+                self._request_id += 1
+                request_id = self._request_id
+            conn = self._conns[worker]
+            try:
+                conn.send((request_id, views))
+                reply_id, detections, error = self.blocking_call(conn.recv)
+            except (EOFError, OSError) as e:
+                self.failures += 1
+                logger.error(f"Inference worker {worker} died, restarting: {str(e)}")
+                alive = False
+                self._replace(worker)
+                raise RuntimeError(f"Inference worker {worker} died") from e
+
+            self.requests += 1
+            if error is not None:
+                self.failures += 1
+                raise RuntimeError(f"Inference worker {worker} failed: {error}")
+            return detections
+        finally:
+            if alive:
+                self._idle.put(worker)
+            for slot in slots:
+                self._free_slots.put(slot)
+
+    def stop(self):
+        for worker, conn in enumerate(self._conns):
+            if conn is None:
+                continue
+            try:
+                conn.send(None)
+            except OSError:
+                pass
+            conn.close()
+            proc = self._procs[worker]
+            try:
+                proc.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+        self._conns = [None] * self.workers
+        if self._shm is not None:
+            self._shm.close()
+            self._shm.unlink()
+            self._shm = None
+
+    def stats(self) -> dict:
+        return {
+            'workers': self.workers,
+            'alive': sum(1 for proc in self._procs if proc is not None and proc.poll() is None),
+            'idle': self._idle.qsize(),
+            'free_slots': self._free_slots.qsize(),
+            'requests': self.requests,
+            'failures': self.failures,
+            'restarts': self.restarts,
+        }
+
+
+def _worker_main(fd: int, config: dict):
+    conn = Connection(fd)
+    cpus = config.get('cpus')
+    if cpus and hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, cpus)
+
+    shm = SharedMemory(name=config['shm'])
+    # Attaching registers the block with this process's resource tracker,
+    # which would unlink it when the worker exits; the parent owns it
+    resource_tracker.unregister(shm._name, 'shared_memory')
+
+    try:
+        import torch
+        torch.set_num_threads(config['threads'])
+
+        from utils.inference_backends import load_backend
+        backend = load_backend(config['backend'], config['model_dir'], imgsz=config['imgsz'], conf=config['conf'])
+        backend.warmup()
+    except Exception as e:
+        conn.send(('error', str(e)))
+        return
+    conn.send(('ready', dict(backend.names)))
+
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            break
+        if message is None:
+            break
+        request_id, views = message
+        frames = []
+        try:
+            frames = [np.ndarray(shape, np.dtype(dtype), buffer=shm.buf, offset=offset)
+                      for offset, shape, dtype in views]
+            conn.send((request_id, backend.detect(frames), None))
+        except Exception as e:
+            conn.send((request_id, None, str(e)))
+        finally:
+            # Views into the block must be gone before shm.close()
+            del frames
+
+    shm.close()
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--fd', type=int, required=True)
+    parser.add_argument('--config', type=str, required=True)
+
+    args = parser.parse_args()
+    _worker_main(args.fd, json.loads(args.config))
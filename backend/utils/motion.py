@@ -0,0 +1,103 @@
+import cv2
+import numpy as np
+import time
+from typing import Optional, Tuple
+
+
+class MotionGate:
+    """Cheap change detector that decides whether a frame is worth running YOLO on.
+
+    Frames are cropped to the board region, downscaled to a small grayscale
+    thumbnail and compared with the thumbnail of the last frame that was
+    actually inferred. Inference only runs when enough of the board changed
+    (a dart landed or was pulled), for `settle_frames` frames after such a
+    change so trackers get a few looks at the settled board, and as a
+    periodic keep-alive pass.
+    """
+
+    def __init__(self,
+                 downscale_width: int = 96,
+                 pixel_threshold: int = 25,
+                 min_changed_fraction: float = 0.002,
+                 keepalive_interval: float = 2.0,
+                 settle_frames: int = 3):
+        self.downscale_width = downscale_width
+        self.pixel_threshold = pixel_threshold
+        self.min_changed_fraction = min_changed_fraction
+        self.keepalive_interval = keepalive_interval
+        self.settle_frames = settle_frames
+        self._settle_remaining = 0
+
+        self._reference: Optional[np.ndarray] = None
+        self._reference_roi = None
+        self._last_inference = 0.0
+        self.frames_seen = 0
+        self.frames_skipped = 0
+        # Inferred frames by reason: the board changed, or the keep-alive was due
+        self.changes = 0
+        self.keepalives = 0
+        self.last_change = 0.0
+
+    def _thumbnail(self, frame: np.ndarray, roi: Optional[Tuple[int, int, int, int]]) -> np.ndarray:
+        if roi is not None:
+            x, y, w, h = roi
+            frame = frame[max(y, 0):y + h, max(x, 0):x + w]
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+        height, width = gray.shape[:2]
+        scale = self.downscale_width / float(max(width, 1))
+        small = cv2.resize(gray, (self.downscale_width, max(int(height * scale), 1)),
+                           interpolation=cv2.INTER_AREA)
+        # Light blur so sensor noise does not register as change
+        return cv2.GaussianBlur(small, (3, 3), 0)
+
+    def should_infer(self, frame: np.ndarray,
+                     roi: Optional[Tuple[int, int, int, int]] = None,
+                     timestamp: Optional[float] = None) -> bool:
+        """Return True if the board changed since the last inferred frame"""
+        now = time.monotonic() if timestamp is None else timestamp
+        self.frames_seen += 1
+        thumbnail = self._thumbnail(frame, roi)
+
+        if (self._reference is None
+                or roi != self._reference_roi
+                or thumbnail.shape != self._reference.shape):
+            changed = True
+        else:
+            diff = cv2.absdiff(thumbnail, self._reference)
+            self.last_change = float(np.count_nonzero(diff > self.pixel_threshold)) / diff.size
+            changed = self.last_change >= self.min_changed_fraction
+
+        if changed:
+            self.changes += 1
+            self._settle_remaining = self.settle_frames
+        elif self._settle_remaining > 0:
+            self._settle_remaining -= 1
+            changed = True
+
+        if changed or now - self._last_inference >= self.keepalive_interval:
+            if not changed:
+                self.keepalives += 1
+            self._reference = thumbnail
+            self._reference_roi = roi
+            self._last_inference = now
+            return True
+
+        self.frames_skipped += 1
+        return False
+
+    def reset(self):
+        self._reference = None
+
+    @property
+    def skip_ratio(self) -> float:
+        return self.frames_skipped / self.frames_seen if self.frames_seen else 0.0
+
+    def stats(self) -> dict:
+        return {
+            'frames_seen': self.frames_seen,
+            'frames_skipped': self.frames_skipped,
+            'skip_ratio': self.skip_ratio,
+            'changes': self.changes,
+            'keepalives': self.keepalives,
+            'last_change': self.last_change,
+        }
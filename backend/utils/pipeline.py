@@ -0,0 +1,223 @@
+import threading
+import time
+import logging
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class FramePacket:
+    """A single camera frame and everything computed from it as it moves through the pipeline"""
+    camera_idx: int
+    seq: int
+    frame: np.ndarray
+    timestamp: float  # time.monotonic() at capture
+    # Structured detections array (see DETECTION_DTYPE) and what scoring made of it
+    detections: Optional[np.ndarray] = None
+    score: Any = None
+    extras: Dict[str, Any] = field(default_factory=dict)
+
+
+class LatestFrameBuffer:
+    """Bounded buffer where new items push out the oldest unread ones.
+
+    Consumers always see the freshest frames; anything they could not keep
+    up with is dropped and counted instead of queueing up as latency.
+    """
+
+    def __init__(self, maxsize: int = 1):
+        self._items = deque(maxlen=maxsize)
+        self._cond = threading.Condition()
+        self._closed = False
+        self.dropped = 0
+
+    def put(self, item):
+        with self._cond:
+            if len(self._items) == self._items.maxlen:
+                self.dropped += 1
+            self._items.append(item)
+            self._cond.notify()
+
+    def get(self, timeout: Optional[float] = None):
+        """Return the oldest buffered item, or None on timeout/close"""
+        with self._cond:
+            if not self._items and not self._closed:
+                self._cond.wait(timeout)
+            if not self._items:
+                return None
+            return self._items.popleft()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def __len__(self):
+        return len(self._items)
+
+
+class CameraPipeline:
+    """Capture -> inference -> scoring -> emit, each stage in its own worker.
+
+    Stages are joined by LatestFrameBuffers, so a slow stage only ever works
+    on the newest frame and end-to-end latency stays bounded by the slowest
+    stage rather than growing with the backlog. A stage that raises loses
+    only the frame it was working on; `on_error` is called, and the pipeline
+    stopped, only when the camera itself stops delivering frames.
+    """
+
+    def __init__(self,
+                 camera_idx: int,
+                 read_frame: Callable[[], Any],
+                 infer: Optional[Callable[[FramePacket], Optional[FramePacket]]],
+                 score: Callable[[FramePacket], Optional[FramePacket]],
+                 emit: Callable[[FramePacket], None],
+                 on_error: Optional[Callable[[int, str], None]] = None,
+                 scheduler=None,
+                 gate: Optional[Callable[[FramePacket], bool]] = None,
+                 on_capture: Optional[Callable[[FramePacket], None]] = None,
+                 buffer_size: int = 1,
+                 poll_interval: float = 0.5):
+        self.camera_idx = camera_idx
+        self.read_frame = read_frame
+        self.on_error = on_error
+        self.poll_interval = poll_interval
+        self.running = False
+
+        self.infer_buffer = LatestFrameBuffer(buffer_size)
+        self.score_buffer = LatestFrameBuffer(buffer_size)
+        self.emit_buffer = LatestFrameBuffer(buffer_size)
+        self._stages = [
+            ('scoring', self.score_buffer, score, self.emit_buffer),
+            ('emit', self.emit_buffer, emit, None),
+        ]
+        # With a shared scheduler, inference for this camera is batched with
+        # the other cameras instead of running in a worker of its own
+        self.scheduler = scheduler
+        self._scheduler_key = (camera_idx, id(self))
+        if scheduler is None:
+            self._stages.insert(0, ('inference', self.infer_buffer, infer, self.score_buffer))
+        # Frames the gate rejects skip inference and scoring and are emitted
+        # with the most recent results
+        self.gate = gate
+        # Sees every packet as soon as it exists, e.g. to start its trace
+        self.on_capture = on_capture
+        self._last_scored: Optional[FramePacket] = None
+        self.frames_gated = 0
+        self._threads: List[threading.Thread] = []
+        self._seq = 0
+        self.frames_captured = 0
+        self.frames_emitted = 0
+        self.stage_errors = {name: 0 for name, _, _, _ in self._stages}
+        self.logger = logging.getLogger(__name__)
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        if self.scheduler is not None:
+            self.scheduler.register(self._scheduler_key, self.score_buffer.put)
+        self._threads = [threading.Thread(target=self._capture_loop, daemon=True,
+                                          name=f"camera{self.camera_idx}-capture")]
+        for name, inbox, fn, outbox in self._stages:
+            self._threads.append(threading.Thread(
+                target=self._stage_loop, args=(name, inbox, fn, outbox), daemon=True,
+                name=f"camera{self.camera_idx}-{name}"))
+        for thread in self._threads:
+            thread.start()
+        self.logger.info(f"Pipeline started for camera {self.camera_idx}")
+
+    def stop(self):
+        self.running = False
+        if self.scheduler is not None:
+            self.scheduler.unregister(self._scheduler_key)
+        for _, inbox, _, _ in self._stages:
+            inbox.close()
+        self.logger.info(f"Pipeline stopped for camera {self.camera_idx}")
+
+    def join(self, timeout: Optional[float] = None):
+        for thread in self._threads:
+            if thread is not threading.current_thread():
+                thread.join(timeout)
+
+    def _fail(self, message: str):
+        self.logger.warning(message)
+        self.stop()
+        if self.on_error:
+            self.on_error(self.camera_idx, message)
+
+    def _capture_loop(self):
+        while self.running:
+            frame = self.read_frame()
+            if frame is None:
+                self._fail(f"Failed to read frame from camera {self.camera_idx}")
+                return
+            # Sources that know when the frame was taken return (frame, timestamp)
+            timestamp = time.monotonic()
+            if isinstance(frame, tuple):
+                frame, timestamp = frame
+            self._seq += 1
+            self.frames_captured += 1
+            packet = FramePacket(
+                camera_idx=self.camera_idx,
+                seq=self._seq,
+                frame=frame,
+                timestamp=timestamp
+            )
+            if self.on_capture is not None:
+                self.on_capture(packet)
+            if self.gate is not None and not self.gate(packet):
+                self._emit_cached(packet)
+            elif self.scheduler is not None:
+                self.scheduler.submit(self._scheduler_key, packet)
+            else:
+                self.infer_buffer.put(packet)
+
+    def _emit_cached(self, packet: FramePacket):
+        self.frames_gated += 1
+        last = self._last_scored
+        if last is not None:
+            packet.detections = last.detections
+            packet.score = last.score
+        packet.extras['inference_skipped'] = True
+        self.emit_buffer.put(packet)
+
+    def _stage_loop(self, name: str, inbox: LatestFrameBuffer, fn, outbox: Optional[LatestFrameBuffer]):
+        while self.running:
+            packet = inbox.get(timeout=self.poll_interval)
+            if packet is None:
+                continue
+            try:
+                result = fn(packet)
+            except Exception:
+                # A bug or a bad frame, not a camera fault: drop the frame, keep the device
+                self.stage_errors[name] += 1
+                self.logger.exception(f"Error in {name} stage for camera {self.camera_idx}, "
+                                      f"skipping frame {packet.seq}")
+                continue
+            if outbox is self.emit_buffer and result is not None:
+                self._last_scored = result
+            if outbox is not None and result is not None:
+                outbox.put(result)
+            elif outbox is None:
+                self.frames_emitted += 1
+
+    def stats(self) -> dict:
+        return {
+            'camera_idx': self.camera_idx,
+            'running': self.running,
+            'frames_captured': self.frames_captured,
+            'frames_emitted': self.frames_emitted,
+            'frames_gated': self.frames_gated,
+            'stage_errors': dict(self.stage_errors),
+            'dropped': {
+                'inference': self.infer_buffer.dropped,
+                'scoring': self.score_buffer.dropped,
+                'emit': self.emit_buffer.dropped,
+            }
+        }
@@ -0,0 +1,139 @@
+import time
+import logging
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+class SubscriberRateController:
+    """Paces frames to one client from its acknowledgements.
+
+    At most one frame is in flight: the next is only sent once the client
+    acks the previous one (or the ack times out), so a slow client skips
+    frames rather than queueing them in its socket. The target rate follows
+    AIMD: acks that come back well within the send interval raise it
+    additively, slow acks and timeouts cut it multiplicatively. The target
+    never climbs far past the rate the camera pipeline actually produces,
+    and while encoding and emitting a frame takes longer than `emit_budget`
+    the server's send path is the bottleneck, so acks cut the rate however
+    fast they are. Capture-to-emit latency is only reported: most of it is
+    inference, which sending fewer frames to a client does not shorten.
+
+    Clients that do not ack are paced open-loop at `start_fps`.
+    """
+
+    def __init__(self, acks: bool = True, start_fps: float = 10.0, min_fps: float = 1.0,
+                 max_fps: float = 30.0, ack_timeout: float = 2.0, increase: float = 1.0,
+                 decrease: float = 0.7, smoothing: float = 0.2, emit_budget: float = 0.1):
+        self.acks = acks
+        self.min_fps = min_fps
+        self.max_fps = max_fps
+        self.target_fps = min(max(start_fps, min_fps), max_fps)
+        self.ack_timeout = ack_timeout
+        self.increase = increase
+        self.decrease = decrease
+        self.smoothing = smoothing
+        self.emit_budget = emit_budget
+
+        self.in_flight: Optional[int] = None
+        self._sent_at = 0.0
+        self._last_send: Optional[float] = None
+        self._last_frame: Optional[float] = None
+        self._last_delivered: Optional[float] = None
+
+        self.rtt = 0.0
+        self.pipeline_latency = 0.0
+        self.emit_latency = 0.0
+        self.source_fps = 0.0
+        self.delivered_fps = 0.0
+        self.sent = 0
+        self.acked = 0
+        self.skipped = 0
+        self.timeouts = 0
+        self.emit_backoffs = 0
+
+    def _ewma(self, current: float, sample: float) -> float:
+        return sample if current == 0 else current + self.smoothing * (sample - current)
+
+    def should_send(self, capture_timestamp: float, now: Optional[float] = None) -> bool:
+        """Whether this client should get the frame captured at `capture_timestamp`"""
+        now = time.monotonic() if now is None else now
+        if self._last_frame is not None:
+            self.source_fps = self._ewma(self.source_fps, 1.0 / max(capture_timestamp - self._last_frame, 1e-3))
+        self._last_frame = capture_timestamp
+        self.pipeline_latency = self._ewma(self.pipeline_latency, now - capture_timestamp)
+
+        if self.in_flight is not None:
+            if now - self._sent_at < self.ack_timeout:
+                self.skipped += 1
+                return False
+            # Lost or very late ack: back off and stop waiting for it
+            self.timeouts += 1
+            self.in_flight = None
+            self._backoff()
+
+        if self._last_send is not None and now - self._last_send < 1.0 / self.target_fps:
+            self.skipped += 1
+            return False
+        return True
+
+    def on_sent(self, seq: int, now: Optional[float] = None):
+        now = time.monotonic() if now is None else now
+        if not self.acks and self._last_send is not None:
+            # Without acks the best delivery estimate is the send rate
+            self.delivered_fps = self._ewma(self.delivered_fps, 1.0 / max(now - self._last_send, 1e-3))
+        self._last_send = now
+        self.sent += 1
+        if self.acks:
+            self.in_flight = seq
+            self._sent_at = now
+
+    def on_emitted(self, seconds: float):
+        """Record how long the server spent encoding and emitting the last frame sent"""
+        self.emit_latency = self._ewma(self.emit_latency, seconds)
+
+    def on_ack(self, seq: int, now: Optional[float] = None) -> bool:
+        """Record a client ack; False for acks of frames no longer in flight"""
+        now = time.monotonic() if now is None else now
+        if seq != self.in_flight:
+            return False
+        self.in_flight = None
+        self.acked += 1
+
+        rtt = now - self._sent_at
+        self.rtt = self._ewma(self.rtt, rtt)
+        if self._last_delivered is not None:
+            self.delivered_fps = self._ewma(self.delivered_fps, 1.0 / max(now - self._last_delivered, 1e-3))
+        self._last_delivered = now
+
+        interval = 1.0 / self.target_fps
+        if rtt > interval:
+            self._backoff()
+        elif self.emit_latency > self.emit_budget:
+            # Sending itself is slow; fewer sends mean less encode and emit
+            # work competing with capture and inference
+            self.emit_backoffs += 1
+            self._backoff()
+        elif rtt < interval / 2:
+            # Headroom on the client side; only useful if the camera keeps up
+            ceiling = self.max_fps if not self.source_fps else min(self.max_fps, self.source_fps * 1.25)
+            self.target_fps = min(self.target_fps + self.increase, max(ceiling, self.min_fps))
+        return True
+
+    def _backoff(self):
+        self.target_fps = max(self.min_fps, self.target_fps * self.decrease)
+
+    def stats(self) -> dict:
+        return {
+            'target_fps': round(self.target_fps, 2),
+            'delivered_fps': round(self.delivered_fps, 2),
+            'source_fps': round(self.source_fps, 2),
+            'rtt_ms': round(self.rtt * 1000, 1),
+            'pipeline_latency_ms': round(self.pipeline_latency * 1000, 1),
+            'emit_latency_ms': round(self.emit_latency * 1000, 1),
+            'sent': self.sent,
+            'acked': self.acked,
+            'skipped': self.skipped,
+            'timeouts': self.timeouts,
+            'emit_backoffs': self.emit_backoffs,
+        }
@@ -0,0 +1,299 @@
+"""Record camera streams to disk and replay them in place of live cameras.
+
+A recording is a directory with a frame file, an index and a timestamp
+file per camera plus a meta.json describing them:
+
+    meta.json             {"cameras": {"0": {"shape": [h, w, 3], "frames": n, "codec": "jpg"}, ...}}
+    camera0.frames        the encoded frames back to back, memory-mapped on replay
+    camera0.index         n (offset, length) int64 pairs locating each frame
+    camera0.timestamps    n float64 capture times (monotonic seconds)
+
+Frames are stored as JPEG by default (a small fraction of the 0.9 MB a
+raw 640x480 frame takes), as PNG when replays must be pixel exact, or raw
+(codec "raw": n * h * w * 3 uint8, no index) when decode time must not
+show up in a replay. Recordings without a codec entry are raw.
+
+Record from the backend directory with
+
+    python -m utils.recording --out recordings/session1 --cameras 0 1 2 --seconds 30 --codec jpg
+
+and replay by starting the server with DARTOPIA_REPLAY=recordings/session1.
+"""
+import os
+import json
+import time
+import argparse
+import logging
+import threading
+from typing import Dict, List, Optional
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+META_FILE = 'meta.json'
+
+
+def _frames_path(path: str, camera_idx: int) -> str:
+    return os.path.join(path, f'camera{camera_idx}.frames')
+
+
+def _timestamps_path(path: str, camera_idx: int) -> str:
+    return os.path.join(path, f'camera{camera_idx}.timestamps')
+
+
+def _index_path(path: str, camera_idx: int) -> str:
+    return os.path.join(path, f'camera{camera_idx}.index')
+
+
+CODECS = ('jpg', 'png', 'raw')
+
+
+class FrameRecorder:
+    """Appends frames per camera, encoded with `codec` (see the module docstring)"""
+
+    def __init__(self, path: str, codec: str = 'jpg', quality: int = 90):
+        if codec not in CODECS:
+            raise ValueError(f"Unknown codec {codec}, expected one of {CODECS}")
+        self.path = path
+        self.codec = codec
+        self.encode_params = [cv2.IMWRITE_JPEG_QUALITY, quality] if codec == 'jpg' else []
+        os.makedirs(path, exist_ok=True)
+        self.shapes: Dict[int, tuple] = {}
+        self.counts: Dict[int, int] = {}
+        self.bytes_written: Dict[int, int] = {}
+        self._frames = {}
+        self._index = {}
+        self._timestamps = {}
+
+    def write(self, camera_idx: int, frame: np.ndarray, timestamp: float):
+        if camera_idx not in self.shapes:
+            self.shapes[camera_idx] = frame.shape
+            self.counts[camera_idx] = 0
+            self.bytes_written[camera_idx] = 0
+            self._frames[camera_idx] = open(_frames_path(self.path, camera_idx), 'wb')
+            if self.codec != 'raw':
+                self._index[camera_idx] = open(_index_path(self.path, camera_idx), 'wb')
+            self._timestamps[camera_idx] = open(_timestamps_path(self.path, camera_idx), 'wb')
+        if frame.shape != self.shapes[camera_idx]:
+            raise ValueError(f"Camera {camera_idx} frame shape changed from {self.shapes[camera_idx]} to {frame.shape}")
+        frame = np.ascontiguousarray(frame, dtype=np.uint8)
+        if self.codec == 'raw':
+            data = frame.tobytes()
+        else:
+            ok, encoded = cv2.imencode(f'.{self.codec}', frame, self.encode_params)
+            if not ok:
+                raise ValueError(f"Could not encode camera {camera_idx} frame as {self.codec}")
+            data = encoded.tobytes()
+            self._index[camera_idx].write(np.array([self.bytes_written[camera_idx], len(data)], dtype=np.int64).tobytes())
+        self._frames[camera_idx].write(data)
+        self._timestamps[camera_idx].write(np.float64(timestamp).tobytes())
+        self.bytes_written[camera_idx] += len(data)
+        self.counts[camera_idx] += 1
+
+    def close(self):
+        for f in list(self._frames.values()) + list(self._index.values()) + list(self._timestamps.values()):
+            f.close()
+        meta = {'cameras': {str(idx): {'shape': list(self.shapes[idx]), 'frames': self.counts[idx], 'codec': self.codec}
+                            for idx in self.shapes}}
+        with open(os.path.join(self.path, META_FILE), 'w') as f:
+            json.dump(meta, f, indent=2)
+        logger.info(f"Recorded {sum(self.counts.values())} frames from {len(self.shapes)} cameras to {self.path}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _loop_period(timestamps: List[np.ndarray]) -> float:
+    """Length of one pass over a recording: its span plus a typical frame interval"""
+    timestamps = [t for t in timestamps if len(t)]
+    if not timestamps:
+        return 0.0
+    span = max(float(t[-1]) for t in timestamps) - min(float(t[0]) for t in timestamps)
+    intervals = np.concatenate([np.diff(t) for t in timestamps])
+    return span + (float(np.median(intervals)) if len(intervals) else 0.0)
+
+
+class ReplayClock:
+    """Shared start time so cameras replayed in real time stay aligned.
+
+    Looping cameras add `period` per pass to their recorded times instead of
+    restarting the clock, so a camera with fewer frames wrapping early
+    never makes the others wait for a new start.
+    """
+
+    def __init__(self, period: float = 0.0):
+        self.period = period
+        self._start: Optional[float] = None
+        self._origin: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def wait_until(self, recorded_timestamp: float, loops: int = 0):
+        """Sleep until `recorded_timestamp`, on pass `loops` over the recording, is due"""
+        with self._lock:
+            if self._start is None:
+                self._start = time.monotonic()
+                self._origin = recorded_timestamp
+        delay = (recorded_timestamp + loops * self.period - self._origin) - (time.monotonic() - self._start)
+        if delay > 0:
+            time.sleep(delay)
+
+
+class ReplayCapture:
+    """Stands in for cv2.VideoCapture, serving one camera of a recording.
+
+    Encoded frames are decoded on retrieve(), so like a real camera the
+    decode cost lands in the retrieve half of a synchronized round. With `realtime` each grab waits until the frame's recorded time has
+    elapsed since replay began; otherwise frames come as fast as they are
+    read. Once the recording runs out, reads fail like an unplugged camera
+    unless `loop` is set.
+    """
+
+    def __init__(self, path: str, camera_idx: int, realtime: bool = True, loop: bool = False,
+                 clock: Optional[ReplayClock] = None):
+        with open(os.path.join(path, META_FILE)) as f:
+            meta = json.load(f)['cameras'].get(str(camera_idx))
+        self.camera_idx = camera_idx
+        self.realtime = realtime
+        self.loop = loop
+        self.frames: Optional[np.ndarray] = None
+        self.index: Optional[np.ndarray] = None
+        self.shape = (0, 0, 3)
+        self.count = 0
+        self.codec = 'raw'
+        self.timestamps = np.zeros(0)
+        self.position = 0
+        self.loops = 0
+        self._grabbed = -1
+        if meta is not None and meta['frames']:
+            self.count = meta['frames']
+            self.shape = tuple(meta['shape'])
+            self.codec = meta.get('codec', 'raw')
+            if self.codec == 'raw':
+                self.frames = np.memmap(_frames_path(path, camera_idx), dtype=np.uint8, mode='r',
+                                        shape=(self.count, *self.shape))
+            else:
+                self.frames = np.memmap(_frames_path(path, camera_idx), dtype=np.uint8, mode='r')
+                self.index = np.fromfile(_index_path(path, camera_idx), dtype=np.int64).reshape(-1, 2)[:self.count]
+            self.timestamps = np.fromfile(_timestamps_path(path, camera_idx), dtype=np.float64)[:self.count]
+        self.clock = clock or ReplayClock(_loop_period([self.timestamps]))
+
+    def isOpened(self) -> bool:
+        return self.frames is not None
+
+    def grab(self) -> bool:
+        if self.frames is None:
+            return False
+        if self.position >= self.count:
+            if not self.loop:
+                return False
+            self.position = 0
+            self.loops += 1
+        if self.realtime:
+            self.clock.wait_until(self.timestamps[self.position], self.loops)
+        self._grabbed = self.position
+        self.position += 1
+        return True
+
+    def retrieve(self):
+        if self._grabbed < 0 or self.frames is None:
+            return False, None
+        if self.index is None:
+            # Copy out of the memmap so callers may draw on or keep the frame
+            return True, np.array(self.frames[self._grabbed])
+        offset, length = self.index[self._grabbed]
+        frame = cv2.imdecode(self.frames[offset:offset + length], cv2.IMREAD_UNCHANGED)
+        return frame is not None, frame
+
+    def read(self):
+        if not self.grab():
+            return False, None
+        return self.retrieve()
+
+    def get(self, prop_id: int) -> float:
+        if self.frames is None:
+            return 0.0
+        if prop_id == cv2.CAP_PROP_FRAME_WIDTH:
+            return float(self.shape[1])
+        if prop_id == cv2.CAP_PROP_FRAME_HEIGHT:
+            return float(self.shape[0])
+        if prop_id == cv2.CAP_PROP_FRAME_COUNT:
+            return float(self.count)
+        if prop_id == cv2.CAP_PROP_POS_FRAMES:
+            return float(self.position)
+        if prop_id == cv2.CAP_PROP_FPS and len(self.timestamps) > 1:
+            return float((len(self.timestamps) - 1) / (self.timestamps[-1] - self.timestamps[0]))
+        return 0.0
+
+    def set(self, prop_id: int, value: float) -> bool:
+        if prop_id == cv2.CAP_PROP_POS_FRAMES and self.frames is not None:
+            self.position = int(value)
+            return True
+        # Driver settings such as CAP_PROP_BUFFERSIZE have no meaning here
+        return False
+
+    def release(self):
+        self.frames = None
+
+
+class Recording:
+    """A recording on disk, handing out ReplayCaptures that share one clock"""
+
+    def __init__(self, path: str, realtime: bool = True, loop: bool = False):
+        self.path = path
+        self.realtime = realtime
+        self.loop = loop
+        with open(os.path.join(path, META_FILE)) as f:
+            self.meta = json.load(f)
+        # Every camera loops on the same period, the longest camera's span
+        self.clock = ReplayClock(_loop_period([
+            np.fromfile(_timestamps_path(path, int(idx)), dtype=np.float64)[:camera['frames']]
+            for idx, camera in self.meta['cameras'].items() if camera['frames']]))
+
+    @property
+    def camera_indices(self) -> List[int]:
+        return sorted(int(idx) for idx in self.meta['cameras'])
+
+    def capture(self, camera_idx: int) -> ReplayCapture:
+        """Capture factory matching cv2.VideoCapture(camera_idx)"""
+        return ReplayCapture(self.path, camera_idx, realtime=self.realtime, loop=self.loop, clock=self.clock)
+
+
+def record(camera_manager, path: str, seconds: Optional[float] = None, max_frames: Optional[int] = None,
+           codec: str = 'jpg', quality: int = 90):
+    """Record synchronized rounds from every camera of a CameraManager"""
+    started = time.monotonic()
+    rounds = 0
+    with FrameRecorder(path, codec=codec, quality=quality) as recorder:
+        while seconds is None or time.monotonic() - started < seconds:
+            for idx, captured in camera_manager.capture_synchronized().items():
+                if captured is not None:
+                    recorder.write(idx, captured.frame, captured.timestamp)
+            rounds += 1
+            if max_frames is not None and rounds >= max_frames:
+                break
+    return rounds
+
+
+if __name__ == '__main__':
+    from utils.camera import CameraManager
+
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--out', type=str, required=True)
+    parser.add_argument('--cameras', type=int, nargs='+', default=[0, 1, 2])
+    parser.add_argument('--seconds', type=float, default=30.0)
+    parser.add_argument('--codec', choices=CODECS, default='jpg',
+                        help='jpg (default, compact), png (lossless) or raw (no decode cost on replay)')
+    parser.add_argument('--quality', type=int, default=90, help='JPEG quality')
+
+    args = parser.parse_args()
+    manager = CameraManager(args.cameras)
+    try:
+        record(manager, args.out, seconds=args.seconds, codec=args.codec, quality=args.quality)
+    finally:
+        manager.release_all()
@@ -0,0 +1,148 @@
+import time
+import uuid
+import itertools
+import threading
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+
+@dataclass
+class FrameTrace:
+    """Where one frame spent its time, from capture to the clients' screens.
+
+    Spans are (stage, start, end) in time.monotonic() seconds, the clock the
+    capture timestamp uses; gaps between them are time spent queued.
+    """
+    trace_id: str
+    camera_idx: int
+    seq: int
+    capture_timestamp: float
+    spans: List[Tuple[str, float, float]] = field(default_factory=list)
+    emitted_at: Optional[float] = None
+    inference_skipped: bool = False
+    # Per client: what it reported about decoding/rendering the frame
+    clients: Dict[str, dict] = field(default_factory=dict)
+
+    def span(self, stage: str, start: float, end: float):
+        self.spans.append((stage, start, end))
+
+    @property
+    def server_latency(self) -> Optional[float]:
+        return None if self.emitted_at is None else self.emitted_at - self.capture_timestamp
+
+    def to_dict(self) -> dict:
+        def ms(t: float) -> float:
+            return round((t - self.capture_timestamp) * 1000, 3)
+
+        spans, cursor = [], self.capture_timestamp
+        for stage, start, end in sorted(self.spans, key=lambda s: s[1]):
+            spans.append({
+                'stage': stage,
+                'start_ms': ms(start),
+                'duration_ms': round((end - start) * 1000, 3),
+                # Time between the previous stage finishing and this one starting
+                'queued_ms': round(max(0.0, start - cursor) * 1000, 3)
+            })
+            cursor = max(cursor, end)
+        return {
+            'trace_id': self.trace_id,
+            'camera_idx': self.camera_idx,
+            'seq': self.seq,
+            'capture_timestamp': self.capture_timestamp,
+            'inference_skipped': self.inference_skipped,
+            'spans': spans,
+            'server_latency_ms': None if self.emitted_at is None else ms(self.emitted_at),
+            'clients': {client: dict(report) for client, report in self.clients.items()}
+        }
+
+
+class FrameTracer:
+    """Gives every frame a trace and keeps a sample of them for inspection.
+
+    The last `recent` traces stay addressable by ID so client render reports
+    can find their frame. Of the finished ones, every `sample_every`-th per
+    camera is kept in a rolling sample and any frame slower than
+    `slow_threshold` seconds from capture to emit in a rolling list of slow
+    frames, so a jitter spike can be looked at after the fact.
+    """
+
+    def __init__(self, sample_every: int = 50, slow_threshold: float = 0.2,
+                 recent: int = 1024, keep: int = 200):
+        self.sample_every = max(1, sample_every)
+        self.slow_threshold = slow_threshold
+        self.recent_size = recent
+        self._prefix = uuid.uuid4().hex[:8]
+        self._ids = itertools.count(1)
+        self._recent: 'OrderedDict[str, FrameTrace]' = OrderedDict()
+        self.sampled: deque = deque(maxlen=keep)
+        self.slow: deque = deque(maxlen=keep)
+        self._lock = threading.Lock()
+        self.traces_started = 0
+        self.client_reports = 0
+        self.unmatched_reports = 0
+
+    def begin(self, camera_idx: int, seq: int, capture_timestamp: float) -> FrameTrace:
+        trace = FrameTrace(f"{self._prefix}-{next(self._ids):x}", camera_idx, seq, capture_timestamp)
+        with self._lock:
+            self.traces_started += 1
+            self._recent[trace.trace_id] = trace
+            while len(self._recent) > self.recent_size:
+                self._recent.popitem(last=False)
+        return trace
+
+    def finish(self, trace: FrameTrace, emitted_at: Optional[float] = None):
+        trace.emitted_at = time.monotonic() if emitted_at is None else emitted_at
+        with self._lock:
+            if trace.seq % self.sample_every == 0:
+                self.sampled.append(trace)
+            if trace.server_latency > self.slow_threshold:
+                self.slow.append(trace)
+
+    def get(self, trace_id: str) -> Optional[FrameTrace]:
+        with self._lock:
+            trace = self._recent.get(trace_id)
+        if trace is None:
+            trace = next((t for t in list(self.slow) + list(self.sampled) if t.trace_id == trace_id), None)
+        return trace
+
+    def report_client(self, trace_id: str, client: str, now: Optional[float] = None, **timings) -> Optional[FrameTrace]:
+        """Attach a client's report (e.g. decode_ms, render_ms) to a frame's trace.
+
+        The report's arrival time bounds the frame's full trip: capture,
+        server stages, delivery, client work and the report's way back.
+        """
+        now = time.monotonic() if now is None else now
+        trace = self.get(trace_id)
+        if trace is None:
+            self.unmatched_reports += 1
+            return None
+        self.client_reports += 1
+        report = {key: float(value) for key, value in timings.items() if value is not None}
+        report['reported_ms'] = round((now - trace.capture_timestamp) * 1000, 3)
+        if trace.emitted_at is not None:
+            report['emit_to_report_ms'] = round((now - trace.emitted_at) * 1000, 3)
+        trace.clients[str(client)] = report
+        return trace
+
+    def dump(self, camera_idx: Optional[int] = None, slow: bool = False, limit: int = 50) -> List[dict]:
+        """Kept traces, newest first; slowest first when `slow` is set"""
+        with self._lock:
+            traces = list(self.slow if slow else self.sampled)
+        if camera_idx is not None:
+            traces = [t for t in traces if t.camera_idx == camera_idx]
+        if slow:
+            traces.sort(key=lambda t: t.server_latency, reverse=True)
+        else:
+            traces.reverse()
+        return [t.to_dict() for t in traces[:limit]]
+
+    def stats(self) -> dict:
+        return {
+            'traces_started': self.traces_started,
+            'sampled': len(self.sampled),
+            'slow': len(self.slow),
+            'slow_threshold_ms': self.slow_threshold * 1000,
+            'client_reports': self.client_reports,
+            'unmatched_reports': self.unmatched_reports,
+        }